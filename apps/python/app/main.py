@@ -1,20 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from loguru import logger
 import os
-import json
+import math
+import asyncio
 import datetime
+import importlib
 
 from app.config import Settings, get_settings
 from app.messaging.rabbitmq import RabbitMQService
 from app.messaging.nats import NatsService
-from app.utils.schema_generator import update_models
+from app.utils.schema_generator import update_models, watch_schema
+from app.services.token_counter import get_encoding
+from app.utils.metrics import MetricsMiddleware, render_metrics, mark_process_dead
+from app.utils.codec import FastJSONResponse
+from app.utils.http_client import get_http_client, close_http_client
+from app.utils.circuit_breaker import CircuitOpenError, circuit_breaker_states
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Python Service",
     description="FastAPI service for specialized processing and OpenAI streaming",
     version="0.1.0",
+    default_response_class=FastJSONResponse,
 )
 
 # Add CORS middleware
@@ -26,81 +34,168 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Add metrics middleware
+if get_settings().METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Initialize services
 rabbitmq_service = None
 nats_service = None
 
+# Set once startup has finished and cleared on shutdown; drives the readiness probe
+ready = False
+
+# Startup work that continues in the background
+background_tasks = set()
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """Fail fast with 503 while a dependency's circuit breaker is open."""
+    return FastJSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+def run_in_background(awaitable):
+    """Run startup work after the app is serving, keeping a reference until it is done."""
+    task = asyncio.ensure_future(awaitable)
+    background_tasks.add(task)
+    task.add_done_callback(finish_background_task)
+    return task
+
+def finish_background_task(task: asyncio.Future):
+    """Forget a finished background task, retrieving its exception so that it is logged once."""
+    background_tasks.discard(task)
+    if task.cancelled():
+        return
+    # A gather whose children were cancelled at shutdown finishes with CancelledError as its exception
+    error = task.exception()
+    if error is not None and not isinstance(error, asyncio.CancelledError):
+        logger.error(f"Background startup work failed: {error!r}")
+
+def warm_up_openai(model: str):
+    """Import the OpenAI service and load the model's token encoding."""
+    importlib.import_module("app.services.openai_service")
+    get_encoding(model)
+
+async def connect_service(service, name: str):
+    """Connect a broker once; if it is down, keep retrying in the background."""
+    try:
+        await service.connect()
+        logger.info(f"{name} service initialized")
+    except Exception as e:
+        logger.error(f"Failed to initialize {name} service, reconnecting in the background: {e}")
+        service.start_reconnect()
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize services on startup."""
-    global rabbitmq_service, nats_service
+    """Initialize services on startup.
+    
+    Only the work needed to serve requests is awaited: brokers are connected concurrently for
+    at most STARTUP_CONNECT_TIMEOUT_SECONDS before startup carries on with them connecting in the
+    background, and schema generation and the OpenAI client are deferred.
+    """
+    global rabbitmq_service, nats_service, ready
     
     settings = get_settings()
     logger.info("Starting Python service...")
     
-    # Initialize RabbitMQ service
+    # Create the shared outbound HTTP connection pool
+    get_http_client()
+    
+    rabbitmq_service = RabbitMQService(settings)
+    app.state.rabbitmq_service = rabbitmq_service
+    nats_service = NatsService(settings)
+    
+    # Answer test requests; handlers are subscribed on connect and restored after a reconnect.
+    # Requests are spread over every process in the RPC queue group.
+    @nats_service.handler("test.message")
+    async def handle_test_message(data):
+        logger.info(f"Received test request: {data}")
+        return {
+            "id": data.get("id") if isinstance(data, dict) else None,
+            "received": True,
+            "message": "Hello from Python!",
+            "timestamp": datetime.datetime.now().isoformat(),
+            "original": data
+        }
+    
+    # Keep the task store in sync with transitions reported by workers and other API processes
+    await nats_service.subscribe("task.*", handle_task_status)
+    
+    # Connect both brokers at once; requests fail fast (503) until a broker is connected
+    connecting = asyncio.gather(
+        connect_service(rabbitmq_service, "RabbitMQ"),
+        connect_service(nats_service, "NATS")
+    )
     try:
-        rabbitmq_service = RabbitMQService(settings)
-        await rabbitmq_service.connect()
-        logger.info("RabbitMQ service initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize RabbitMQ service: {e}")
-        # Continue even if RabbitMQ fails - we'll handle reconnection logic
+        await asyncio.wait_for(asyncio.shield(connecting), settings.STARTUP_CONNECT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("Brokers still connecting, continuing startup")
+        run_in_background(connecting)
     
-    # Initialize NATS service
+    # Load persisted tasks and emit status transitions over NATS
     try:
-        nats_service = NatsService(settings)
-        await nats_service.connect()
-        logger.info("NATS service initialized")
-        
-        # Set up test message handler
-        async def handle_test_message(msg):
-            try:
-                # Decode and parse message
-                subject = msg.subject
-                data = json.loads(msg.data.decode())
-                
-                logger.info(f"Received test message on {subject}: {data}")
-                
-                # Send a response back
-                response = {
-                    "id": data.get("id"),
-                    "received": True,
-                    "message": "Hello from Python!",
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "original": data
-                }
-                
-                await nats_service.publish("test.response", response)
-                logger.info(f"Sent response for test message {data.get('id')}")
-                
-            except Exception as e:
-                logger.error(f"Error handling test message: {e}")
-        
-        # Subscribe to test messages
-        await nats_service.subscribe("test.message", handle_test_message)
-        logger.info("Subscribed to NATS test messages")
-        
+        await tasks.task_store.load()
+        tasks.task_store.add_listener(publish_task_status)
     except Exception as e:
-        logger.error(f"Failed to initialize NATS service: {e}")
-        # Continue even if NATS fails - we'll handle reconnection logic
+        logger.error(f"Failed to initialize task store: {e}")
     
-    # Generate models from NestJS OpenAPI schema only if they don't exist
-    try:
+    # The production image generates the models from the committed schema at build time
+    # (python -m app.utils.schema_generator in the Dockerfile). "startup" makes every worker check the
+    # backend's schema before serving; otherwise the watcher checks it after startup and reloads the
+    # models in place when it changes
+    if settings.SCHEMA_GENERATION_MODE == "startup":
         logger.info("Checking for NestJS OpenAPI models...")
-        models_updated = await update_models(force=False)
-        if models_updated:
-            logger.info("Models are up to date")
-        else:
+        if not await update_models():
             logger.warning("Failed to check/generate models, using existing models if available")
+    if settings.SCHEMA_GENERATION_MODE != "off":
+        run_in_background(watch_schema(settings.SCHEMA_WATCH_INTERVAL_SECONDS))
+    
+    # Import the OpenAI SDK and load the tokenizer off the event loop so the first completion does not pay for them
+    run_in_background(asyncio.to_thread(warm_up_openai, settings.OPENAI_MODEL))
+    
+    ready = True
+    logger.info("Python service ready")
+
+async def publish_task_status(record):
+    """Publish a task status transition so clients don't have to poll the API."""
+    if nats_service and nats_service.is_connected:
+        data = {"type": record.type, "result": record.result, "error": record.error}
+        if record.status == "queued":
+            data["input"] = record.data
+        await nats_service.publish_task_status(record.id, record.status, data)
+
+async def handle_task_status(msg):
+    """Apply a task status update published by a worker or another API process."""
+    try:
+        message = nats_service.decode_message(msg)
+        data = message.get("data") or {}
+        await tasks.task_store.apply_update(
+            message["taskId"],
+            message["status"],
+            task_type=data.get("type"),
+            data=data.get("input"),
+            result=data.get("result"),
+            error=data.get("error")
+        )
     except Exception as e:
-        logger.error(f"Error checking/generating models: {e}")
+        logger.error(f"Error handling task status update: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
+    global ready
+    ready = False
     logger.info("Shutting down Python service...")
     
+    pending = list(background_tasks)
+    for task in pending:
+        task.cancel()
+    # Wait for the cancellations so that nothing is left running or unretrieved at exit
+    await asyncio.gather(*pending, return_exceptions=True)
+    
     # Close RabbitMQ connection
     if rabbitmq_service:
         await rabbitmq_service.close()
@@ -110,6 +205,17 @@ async def shutdown_event():
     if nats_service:
         await nats_service.close()
         logger.info("NATS connection closed")
+    
+    # Close OpenAI service resources, the stream replay backend and the shared HTTP connection pool
+    await openai.close_openai_service()
+    await openai.stream_registry.close()
+    await close_http_client()
+    
+    # Close task store backend
+    await tasks.task_store.close()
+    
+    # Release this worker's live metric samples
+    mark_process_dead()
 
 @app.get("/")
 async def root():
@@ -119,15 +225,38 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
+    breakers = circuit_breaker_states()
     health = {
-        "status": "healthy",
+        "status": "healthy" if all(b["state"] == "closed" for b in breakers.values()) else "degraded",
         "services": {
             "rabbitmq": "connected" if rabbitmq_service and rabbitmq_service.is_connected else "disconnected",
             "nats": "connected" if nats_service and nats_service.is_connected else "disconnected",
-        }
+        },
+        "circuit_breakers": breakers
     }
     return health
 
+@app.get("/health/live")
+async def liveness_probe():
+    """Liveness probe: the process is up and its event loop is responsive."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """Readiness probe: startup has finished, so the process can take traffic.
+    
+    Broker outages do not make the process unready; affected requests fail fast with 503 instead.
+    """
+    if not ready:
+        return FastJSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics endpoint."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # Import and include routers
 # This will be expanded as we implement more features
 from app.routers import tasks
@@ -135,4 +264,9 @@ app.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
 
 # Import and include OpenAI router
 from app.routers import openai
-app.include_router(openai.router, prefix="/openai", tags=["openai"]) 
\ No newline at end of file
+app.include_router(openai.router, prefix="/openai", tags=["openai"])
+
+# Mount the mock OpenAI upstream for offline load testing
+if get_settings().OPENAI_MOCK_ENABLED:
+    from app.routers import mock_openai
+    app.include_router(mock_openai.create_router(get_settings()), prefix="/mock/openai", tags=["mock"]) 
\ No newline at end of file
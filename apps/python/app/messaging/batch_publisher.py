@@ -0,0 +1,123 @@
+"""
+Batching publisher for the Python service.
+This module collects outgoing RabbitMQ messages over a small time or size window and publishes
+each batch pipelined on a confirm-mode channel, resolving one future per message on broker ack.
+"""
+
+import asyncio
+from typing import List, Optional, Tuple
+
+from aio_pika import Message
+from aio_pika.abc import AbstractChannel, AbstractConnection, AbstractExchange
+from loguru import logger
+
+# A queued publish: routing key, message and the future resolved on broker ack
+PendingPublish = Tuple[str, Message, asyncio.Future]
+
+
+class BatchPublisher:
+    """Publishes messages in pipelined batches on a dedicated confirm-mode channel."""
+
+    def __init__(self, exchange_name: str, batch_size: int = 100, batch_window: float = 0.002):
+        """
+        Initialize the batch publisher.
+
+        Args:
+            exchange_name: Name of the (already declared) exchange to publish to
+            batch_size: Maximum number of messages per batch
+            batch_window: Seconds to wait for more messages once a batch has started
+        """
+        self.exchange_name = exchange_name
+        self.batch_size = max(1, batch_size)
+        self.batch_window = max(0.0, batch_window)
+        self.channel: Optional[AbstractChannel] = None
+        self.exchange: Optional[AbstractExchange] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, connection: AbstractConnection):
+        """Open the confirm channel and start the flush loop."""
+        self.channel = await connection.channel(publisher_confirms=True)
+        self.exchange = await self.channel.get_exchange(self.exchange_name)
+        # Bounded so that producers feel backpressure when the broker falls behind
+        self._queue = asyncio.Queue(maxsize=self.batch_size * 8)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Batch publisher started (batch_size={self.batch_size}, "
+            f"window={self.batch_window * 1000:.1f}ms)"
+        )
+
+    async def stop(self):
+        """Flush queued messages and close the channel."""
+        if self._task:
+            # The sentinel is queued behind pending messages, so they are flushed first
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        if self.channel and not self.channel.is_closed:
+            await self.channel.close()
+        self.channel = None
+        self.exchange = None
+
+    async def enqueue(self, routing_key: str, message: Message) -> asyncio.Future:
+        """Queue a message and return a future that resolves when the broker acks it."""
+        if self._task is None:
+            raise RuntimeError("Batch publisher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((routing_key, message, future))
+        return future
+
+    async def publish(self, routing_key: str, message: Message):
+        """Queue a message and wait for the broker ack."""
+        await (await self.enqueue(routing_key, message))
+
+    def _drain(self, batch: List[PendingPublish]) -> bool:
+        """Move queued messages into the batch without waiting.
+
+        Returns:
+            False once the stop sentinel has been reached
+        """
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return True
+            if item is None:
+                return False
+            batch.append(item)
+        return True
+
+    async def _run(self):
+        """Collect batches and flush them until the stop sentinel arrives."""
+        running = True
+        while running:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch: List[PendingPublish] = [item]
+            running = self._drain(batch)
+            if running and len(batch) < self.batch_size and self.batch_window:
+                await asyncio.sleep(self.batch_window)
+                running = self._drain(batch)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingPublish]):
+        """Publish a batch without waiting between messages, then settle each future."""
+        # Confirms are awaited together, so the whole batch shares one round trip
+        results = await asyncio.gather(
+            *(self.exchange.publish(message, routing_key=routing_key) for routing_key, message, _ in batch),
+            return_exceptions=True
+        )
+        failures = 0
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                failures += 1
+                future.set_exception(result)
+            else:
+                future.set_result(None)
+        if failures:
+            logger.error(f"Broker rejected {failures} of {len(batch)} messages in batch")
+        else:
+            logger.debug(f"Published batch of {len(batch)} messages")
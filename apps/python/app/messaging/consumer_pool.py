@@ -0,0 +1,202 @@
+"""
+Consumer pool for the Python service.
+This module provides a worker pool that drains per-task-type lanes with bounded concurrency,
+so one slow task type cannot stall every other type sharing the same queue. Lanes are grouped by
+tenant and tenants are served by weighted fair scheduling, so one tenant's backlog cannot starve
+the others.
+"""
+
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.utils.metrics import RABBITMQ_TASKS_IN_FLIGHT
+
+# Tenant of items submitted without one
+DEFAULT_TENANT = "default"
+
+# A queued item: (negated priority, submission order, item), so higher priorities come first
+QueuedItem = Tuple[int, int, Any]
+
+
+class ConsumerPool:
+    """Pool of worker coroutines that pull items from per-lane queues.
+
+    Each lane (a task type) may have a concurrency limit. Items are queued per tenant and lane;
+    workers pick the tenant with smooth weighted round-robin, then that tenant's lanes
+    round-robin, skipping lanes that are at their limit, so a saturated lane only holds its own
+    share of the pool. Within a lane, higher-priority items run first. ``offer`` also bounds how
+    many items a limited lane may keep waiting, so its deliveries cannot take up the whole
+    prefetch window.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[str, Any], Awaitable[None]],
+        size: int,
+        default_limit: int = 0,
+        weights: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize the consumer pool.
+
+        Args:
+            execute: Coroutine function called with (lane, item) for every item
+            size: Number of worker coroutines
+            default_limit: Concurrency limit for lanes without an explicit limit (0 = unlimited)
+            weights: Scheduling weight per tenant (tenants not listed have weight 1)
+        """
+        self.execute = execute
+        self.size = max(1, size)
+        self.default_limit = default_limit
+        self.limits: Dict[str, int] = {}
+        self.weights: Dict[str, int] = dict(weights or {})
+        # Tenant -> lane -> queued items; empty lanes and tenants are removed
+        self._tenants: Dict[str, Dict[str, List[QueuedItem]]] = {}
+        self._lane_cursor: Dict[str, int] = defaultdict(int)
+        self._current_weight: Dict[str, int] = defaultdict(int)
+        self._sequence = itertools.count()
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._condition = asyncio.Condition()
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the worker coroutines are running."""
+        return bool(self._workers)
+
+    @property
+    def pending(self) -> int:
+        """Number of items waiting for a worker."""
+        return sum(len(items) for lanes in self._tenants.values() for items in lanes.values())
+
+    def set_limit(self, lane: str, limit: Optional[int]):
+        """Set the concurrency limit of a lane (None or 0 = default/unlimited)."""
+        if limit:
+            self.limits[lane] = limit
+        else:
+            self.limits.pop(lane, None)
+
+    def set_weight(self, tenant: str, weight: int):
+        """Set the scheduling weight of a tenant."""
+        self.weights[tenant] = max(1, weight)
+
+    def _limit(self, lane: str) -> int:
+        return self.limits.get(lane, self.default_limit)
+
+    def _has_capacity(self, lane: str) -> bool:
+        limit = self._limit(lane)
+        return limit <= 0 or self._in_flight[lane] < limit
+
+    def _ready_lanes(self, tenant: str) -> List[str]:
+        return [lane for lane in self._tenants[tenant] if self._has_capacity(lane)]
+
+    def _next_ready(self) -> Optional[Tuple[str, str]]:
+        """Return the (tenant, lane) to serve next, or None if nothing is ready."""
+        ready = {tenant: lanes for tenant in self._tenants if (lanes := self._ready_lanes(tenant))}
+        if not ready:
+            return None
+
+        # Smooth weighted round-robin: every ready tenant earns its weight, the richest is served
+        # and pays the total, which interleaves tenants in proportion to their weights
+        total = 0
+        for tenant in ready:
+            weight = self.weights.get(tenant, 1)
+            self._current_weight[tenant] += weight
+            total += weight
+        tenant = max(ready, key=lambda name: self._current_weight[name])
+        self._current_weight[tenant] -= total
+
+        lanes = ready[tenant]
+        cursor = self._lane_cursor[tenant] % len(lanes)
+        self._lane_cursor[tenant] = cursor + 1
+        return tenant, lanes[cursor]
+
+    def _pop(self, tenant: str, lane: str) -> Any:
+        lanes = self._tenants[tenant]
+        _, _, item = heapq.heappop(lanes[lane])
+        self._queued[lane] -= 1
+        if not lanes[lane]:
+            del lanes[lane]
+            if not lanes:
+                del self._tenants[tenant]
+                self._lane_cursor.pop(tenant, None)
+                self._current_weight.pop(tenant, None)
+        return item
+
+    def _push(self, lane: str, item: Any, tenant: str, priority: int):
+        items = self._tenants.setdefault(tenant, {}).setdefault(lane, [])
+        heapq.heappush(items, (-priority, next(self._sequence), item))
+        self._queued[lane] += 1
+        self._condition.notify()
+
+    async def submit(self, lane: str, item: Any, tenant: str = DEFAULT_TENANT, priority: int = 0):
+        """Queue an item on a tenant's lane and wake a worker."""
+        async with self._condition:
+            self._push(lane, item, tenant, priority)
+
+    async def offer(self, lane: str, item: Any, tenant: str = DEFAULT_TENANT, priority: int = 0) -> bool:
+        """Queue an item unless its lane is limited and already has ``limit`` items waiting.
+
+        Returns:
+            Whether the item was queued; a rejected item should be handed back to its source
+        """
+        async with self._condition:
+            limit = self._limit(lane)
+            if limit > 0 and self._queued[lane] >= limit:
+                return False
+            self._push(lane, item, tenant, priority)
+            return True
+
+    async def _worker(self, index: int):
+        """Worker loop: take the next ready item and execute it."""
+        while True:
+            async with self._condition:
+                selected = self._next_ready()
+                while selected is None:
+                    await self._condition.wait()
+                    selected = self._next_ready()
+                tenant, lane = selected
+                item = self._pop(tenant, lane)
+                self._in_flight[lane] += 1
+
+            RABBITMQ_TASKS_IN_FLIGHT.labels(lane).inc()
+            try:
+                await self.execute(lane, item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Consumer worker {index} failed on lane {lane}: {e}")
+            finally:
+                RABBITMQ_TASKS_IN_FLIGHT.labels(lane).dec()
+                async with self._condition:
+                    self._in_flight[lane] -= 1
+                    # A slot freed up on this lane; other workers may be waiting for it
+                    self._condition.notify_all()
+
+    def start(self):
+        """Start the worker coroutines."""
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.size)]
+        logger.info(f"Started consumer pool with {self.size} workers")
+
+    async def stop(self):
+        """Cancel the worker coroutines.
+
+        Items still queued were never acknowledged, so the broker redelivers them.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._tenants.clear()
+        self._queued.clear()
+        self._lane_cursor.clear()
+        self._current_weight.clear()
+        logger.info("Consumer pool stopped")
@@ -1,12 +1,49 @@
 import nats
 from nats.aio.client import Client as NATS
+from nats.js.api import ConsumerConfig, DeliverPolicy, StreamConfig
+from nats.js.client import JetStreamContext
+from nats.js.errors import NotFoundError
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_exponential
-import json
+import time
 import asyncio
-from typing import Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
 
 from app.config import Settings
+from app.utils import codec
+from app.utils.circuit_breaker import CircuitOpenError, get_circuit_breaker, reconnect_forever
+from app.utils.metrics import (
+    NATS_MESSAGES_PUBLISHED,
+    NATS_MESSAGES_RECEIVED,
+    NATS_CALLBACK_DURATION,
+    NATS_DELIVERY_LAG,
+    NATS_REQUEST_DURATION,
+)
+
+# Reply headers that carry a handler error back to the requester (NATS service API convention)
+SERVICE_ERROR_HEADER = "Nats-Service-Error"
+SERVICE_ERROR_CODE_HEADER = "Nats-Service-Error-Code"
+
+# Header stamped by ``NatsService.publish`` with the wall-clock publish time, for delivery lag
+PUBLISHED_AT_HEADER = "Published-At"
+
+class RPCError(Exception):
+    """Raised by ``NatsService.request`` when the remote handler failed."""
+    
+    def __init__(self, subject: str, message: str, code: str = "500"):
+        super().__init__(f"Request to {subject} failed ({code}): {message}")
+        self.subject = subject
+        self.code = code
+
+def subject_matches(subject: str, pattern: str) -> bool:
+    """Whether a subject falls under a NATS subject pattern (``*`` one token, ``>`` the rest)."""
+    tokens = subject.split(".")
+    parts = pattern.split(".")
+    for index, part in enumerate(parts):
+        if part == ">":
+            return len(tokens) > index
+        if index >= len(tokens) or (part != "*" and part != tokens[index]):
+            return False
+    return len(tokens) == len(parts)
 
 class NatsService:
     """Service for interacting with NATS."""
@@ -16,66 +53,426 @@ class NatsService:
         self.settings = settings
         self.client = NATS()
         self.is_connected = False
+        # Subscriptions (subject, callback, options) are kept so that they can be restored on a new connection
+        self.subscriptions: List[Tuple[str, Callable[[Any], Awaitable[None]], Dict[str, Any]]] = []
+        self._background: Set[asyncio.Task] = set()
+        # JetStream mode: these subjects are persisted in a stream and consumed with pull consumers
+        self.js: Optional[JetStreamContext] = None
+        self.jetstream_subjects: List[str] = []
+        if settings.NATS_JETSTREAM_ENABLED:
+            self.jetstream_subjects = [s.strip() for s in settings.NATS_JETSTREAM_SUBJECTS.split(",") if s.strip()]
+        self._pull_tasks: List[asyncio.Task] = []
+        # Publishes fail fast while the server is unreachable
+        self.breaker = get_circuit_breaker("nats")
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
     
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=1, max=60))
     async def connect(self):
-        """Connect to NATS with retry logic."""
+        """Connect to NATS once; use ``start_reconnect`` to keep retrying in the background."""
         logger.info(f"Connecting to NATS at {self.settings.NATS_URL}")
         
+        await self._stop_pull_consumers()
         try:
-            # Connect to NATS
-            await self.client.connect(self.settings.NATS_URL)
+            # The client retries a few times by itself, for the first connect and after a
+            # connection loss; beyond that the connection is closed and reconnect_forever takes over
+            self.client = NATS()
+            await self.client.connect(
+                self.settings.NATS_URL,
+                max_reconnect_attempts=self.settings.NATS_MAX_RECONNECT_ATTEMPTS,
+                disconnected_cb=self._on_disconnected,
+                reconnected_cb=self._on_reconnected,
+                closed_cb=self._on_closed
+            )
+            if self.jetstream_subjects:
+                await self._setup_jetstream()
             self.is_connected = True
+            self.breaker.reset()
             logger.info("Successfully connected to NATS")
         except Exception as e:
             self.is_connected = False
+            self.breaker.trip()
             logger.error(f"Failed to connect to NATS: {e}")
+            # A client that connected before a later step failed would otherwise stay open
+            await self._discard_client()
             raise
+        
+        for subject, callback, options in self.subscriptions:
+            await self._subscribe(subject, callback, **options)
+    
+    def _full_subject(self, subject: str) -> str:
+        """Prefix a subject with the configured prefix."""
+        return f"{self.settings.NATS_SUBJECT_PREFIX}.{subject}"
+    
+    def uses_jetstream(self, subject: str) -> bool:
+        """Whether a subject is published and consumed through JetStream."""
+        return any(subject_matches(subject, pattern) for pattern in self.jetstream_subjects)
+    
+    async def _setup_jetstream(self):
+        """Create the stream for the JetStream subjects, or update it if it exists."""
+        self.js = self.client.jetstream()
+        config = StreamConfig(
+            name=self.settings.NATS_JETSTREAM_STREAM,
+            subjects=[self._full_subject(subject) for subject in self.jetstream_subjects],
+            max_age=self.settings.NATS_JETSTREAM_MAX_AGE_SECONDS
+        )
+        try:
+            await self.js.update_stream(config)
+        except NotFoundError:
+            await self.js.add_stream(config)
+        logger.info(f"JetStream stream {config.name} ready for {config.subjects}")
+    
+    def start_reconnect(self) -> asyncio.Task:
+        """Retry connecting in the background; the returned task finishes once connected."""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(
+                reconnect_forever(self.breaker, self.connect, self.settings.RECONNECT_MAX_DELAY_SECONDS)
+            )
+        return self._reconnect_task
+    
+    async def _on_disconnected(self):
+        if not self._closing:
+            logger.warning("NATS connection lost")
+            self.is_connected = False
+            self.breaker.trip()
+    
+    async def _on_reconnected(self):
+        logger.info("NATS connection restored")
+        self.is_connected = True
+        self.breaker.reset()
+    
+    async def _discard_client(self):
+        """Close the current client without treating it as a lost connection."""
+        client, self.client = self.client, NATS()
+        self.js = None
+        if not client.is_closed:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close NATS client: {e}")
+    
+    async def _on_closed(self):
+        self.is_connected = False
+        # A discarded client has already been replaced by one that is not closed
+        if not self._closing and self.client.is_closed:
+            # The client gave up reconnecting by itself
+            self.breaker.trip()
+            self.start_reconnect()
+    
+    def ensure_available(self):
+        """Raise CircuitOpenError while NATS is unreachable."""
+        self.breaker.check()
+        if not self.is_connected:
+            raise CircuitOpenError(self.breaker.name, self.breaker.reset_timeout)
     
     async def close(self):
         """Close NATS connection."""
-        if self.client:
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        await self._stop_pull_consumers()
+        if self.client and self.client.is_connected:
             await self.client.close()
-            self.is_connected = False
-            logger.info("NATS connection closed")
+        self.is_connected = False
+        logger.info("NATS connection closed")
     
     async def publish(self, subject: str, message_data: Dict[str, Any]):
-        """Publish a message to NATS."""
-        if not self.is_connected:
-            logger.warning("Cannot publish message: not connected to NATS")
-            return
+        """Publish a message to NATS.
+        
+        JetStream subjects are published with an acknowledgement, so this returns once the
+        message has been persisted in the stream.
+        
+        Raises:
+            CircuitOpenError: NATS is unreachable
+        """
+        self.ensure_available()
         
         # Prefix subject with configured prefix
-        full_subject = f"{self.settings.NATS_SUBJECT_PREFIX}.{subject}"
+        full_subject = self._full_subject(subject)
         
         try:
-            # Convert message data to JSON and encode
-            message = json.dumps(message_data).encode()
+            message, headers = self._encode(message_data)
+            headers = {**(headers or {}), PUBLISHED_AT_HEADER: repr(time.time())}
             
             # Publish message
-            await self.client.publish(full_subject, message)
+            async with self.breaker.guard():
+                if self.js and self.uses_jetstream(subject):
+                    await self.js.publish(full_subject, message, headers=headers)
+                else:
+                    await self.client.publish(full_subject, message, headers=headers)
+            NATS_MESSAGES_PUBLISHED.labels(full_subject).inc()
             logger.debug(f"Published message to {full_subject}: {message_data}")
         except Exception as e:
             logger.error(f"Failed to publish message: {e}")
             raise
     
-    async def subscribe(self, subject: str, callback):
-        """Subscribe to a subject."""
-        if not self.is_connected:
-            logger.warning("Cannot subscribe: not connected to NATS")
-            return
+    def _encode(self, message_data: Any) -> Tuple[bytes, Optional[Dict[str, str]]]:
+        """Encode message data with the configured codec and return the payload and headers."""
+        content_type = self.settings.MESSAGING_CONTENT_TYPE
+        message = codec.encode(message_data, content_type)
+        
+        # Only non-JSON payloads need a header; receivers default to JSON
+        headers = None
+        if codec.get_codec(content_type).content_type != codec.JSON_CONTENT_TYPE:
+            headers = {"Content-Type": content_type}
+        return message, headers
+    
+    async def request(self, subject: str, data: Any, timeout: Optional[float] = None) -> Any:
+        """Send a request to the handler of a subject and return its decoded reply.
+        
+        Args:
+            subject: The subject, relative to the prefix
+            data: The request data
+            timeout: Seconds to wait for the reply (defaults to NATS_RPC_TIMEOUT_SECONDS)
+        
+        Raises:
+            CircuitOpenError: NATS is unreachable
+            nats.errors.NoRespondersError: No handler is subscribed (raised immediately)
+            nats.errors.TimeoutError: No reply within the timeout
+            RPCError: The handler failed
+        """
+        self.ensure_available()
+        full_subject = self._full_subject(subject)
+        payload, headers = self._encode(data)
         
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            reply = await self.client.request(
+                full_subject,
+                payload,
+                timeout=timeout or self.settings.NATS_RPC_TIMEOUT_SECONDS,
+                headers=headers
+            )
+            if reply.headers and SERVICE_ERROR_HEADER in reply.headers:
+                raise RPCError(
+                    full_subject,
+                    reply.headers[SERVICE_ERROR_HEADER],
+                    reply.headers.get(SERVICE_ERROR_CODE_HEADER, "500")
+                )
+            outcome = "success"
+            return self.decode_message(reply)
+        except nats.errors.NoRespondersError:
+            outcome = "no_responders"
+            raise
+        except nats.errors.TimeoutError:
+            outcome = "timeout"
+            raise
+        finally:
+            NATS_REQUEST_DURATION.labels(full_subject, outcome).observe(time.perf_counter() - start)
+    
+    def handler(self, subject: str, concurrency: Optional[int] = None, queue: Optional[str] = None):
+        """Decorator that serves requests on a subject with the decorated coroutine function.
+        
+        The function receives the decoded request and its return value is sent to the requester's
+        reply inbox; an exception is reported back as an RPCError. Handlers join a queue group, so
+        each request is served by one of the processes and pods subscribed to the subject.
+        
+        Args:
+            subject: The subject, relative to the prefix
+            concurrency: Requests handled at once by this process (defaults to NATS_RPC_CONCURRENCY)
+            queue: Queue group (defaults to NATS_RPC_QUEUE_GROUP)
+        """
+        def decorator(fn: Callable[[Any], Awaitable[Any]]):
+            async def serve(msg):
+                try:
+                    result = await fn(self.decode_message(msg))
+                except Exception as e:
+                    logger.error(f"Error handling request on {msg.subject}: {e}")
+                    if msg.reply:
+                        await self.client.publish(
+                            msg.reply,
+                            b"",
+                            headers={SERVICE_ERROR_HEADER: str(e), SERVICE_ERROR_CODE_HEADER: "500"}
+                        )
+                    return
+                if msg.reply:
+                    payload, headers = self._encode(result)
+                    await self.client.publish(msg.reply, payload, headers=headers)
+            
+            options = {
+                "queue": queue or self.settings.NATS_RPC_QUEUE_GROUP,
+                "concurrency": concurrency or self.settings.NATS_RPC_CONCURRENCY,
+            }
+            self.subscriptions.append((subject, serve, options))
+            if self.is_connected:
+                task = asyncio.create_task(self._subscribe(subject, serve, **options))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+            return fn
+        return decorator
+    
+    @staticmethod
+    def published_at(msg) -> Optional[float]:
+        """Return the wall-clock time a message was published, if the publisher stamped it."""
+        value = msg.headers.get(PUBLISHED_AT_HEADER) if msg.headers else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def decode_message(msg) -> Any:
+        """Decode a received message using the codec named in its Content-Type header."""
+        content_type = msg.headers.get("Content-Type") if msg.headers else None
+        return codec.decode(msg.data, content_type)
+    
+    async def subscribe(
+        self,
+        subject: str,
+        callback,
+        durable: Optional[str] = None,
+        queue: Optional[str] = None,
+        concurrency: int = 1
+    ):
+        """Subscribe to a subject.
+        
+        The subscription is also made on every later connection, so it may be registered before
+        the service has connected.
+        
+        Args:
+            subject: The subject, relative to the prefix
+            callback: Coroutine function called with each message
+            durable: For JetStream subjects, the name of a durable consumer that keeps its position
+                across restarts; without it an ephemeral consumer receives only new messages
+            queue: Queue group; each message goes to one member of the group
+            concurrency: Messages handled at once (1 = in order, one at a time)
+        """
+        options = {"durable": durable, "queue": queue, "concurrency": concurrency}
+        self.subscriptions.append((subject, callback, options))
+        if self.is_connected:
+            await self._subscribe(subject, callback, **options)
+    
+    async def _subscribe(
+        self,
+        subject: str,
+        callback,
+        durable: Optional[str] = None,
+        queue: Optional[str] = None,
+        concurrency: int = 1
+    ):
+        """Subscribe to a subject on the current connection."""
         # Prefix subject with configured prefix
-        full_subject = f"{self.settings.NATS_SUBJECT_PREFIX}.{subject}"
+        full_subject = self._full_subject(subject)
+        
+        async def instrumented_callback(msg):
+            NATS_MESSAGES_RECEIVED.labels(full_subject).inc()
+            published_at = self.published_at(msg)
+            if published_at is not None:
+                # Wall clocks of different hosts may disagree slightly; never record a negative lag
+                NATS_DELIVERY_LAG.labels(full_subject).observe(max(0.0, time.time() - published_at))
+            start = time.perf_counter()
+            try:
+                await callback(msg)
+            finally:
+                NATS_CALLBACK_DURATION.labels(full_subject).observe(time.perf_counter() - start)
         
         try:
-            # Subscribe to subject
-            await self.client.subscribe(full_subject, cb=callback)
+            if self.js and self.uses_jetstream(subject):
+                await self._pull_subscribe(full_subject, instrumented_callback, durable)
+            else:
+                # Subscribe to subject
+                if concurrency > 1:
+                    instrumented_callback = self._bounded(instrumented_callback, concurrency)
+                await self.client.subscribe(full_subject, queue=queue or "", cb=instrumented_callback)
             logger.info(f"Subscribed to {full_subject}")
         except Exception as e:
             logger.error(f"Failed to subscribe to {full_subject}: {e}")
             raise
     
+    def _bounded(self, callback, concurrency: int):
+        """Run a subscription's callbacks concurrently, at most ``concurrency`` at a time.
+        
+        The returned callback waits for a free slot before starting the next message, so excess
+        messages stay in the subscription's bounded pending buffer.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(msg):
+            try:
+                await callback(msg)
+            except Exception as e:
+                logger.error(f"Error handling message on {msg.subject}: {e}")
+            finally:
+                semaphore.release()
+        
+        async def dispatch(msg):
+            await semaphore.acquire()
+            task = asyncio.create_task(run(msg))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        
+        return dispatch
+    
+    async def _pull_subscribe(self, full_subject: str, callback, durable: Optional[str]):
+        """Create a pull consumer for a JetStream subject and start fetching from it."""
+        config = ConsumerConfig(
+            deliver_policy=DeliverPolicy.ALL if durable else DeliverPolicy.NEW,
+            ack_wait=self.settings.NATS_JETSTREAM_ACK_WAIT_SECONDS,
+            # Ephemeral consumers are removed by the server once nobody fetches from them
+            inactive_threshold=None if durable else self.settings.NATS_JETSTREAM_EPHEMERAL_INACTIVE_SECONDS
+        )
+        subscription = await self.js.pull_subscribe(
+            full_subject,
+            durable=durable,
+            stream=self.settings.NATS_JETSTREAM_STREAM,
+            config=config
+        )
+        self._pull_tasks.append(asyncio.create_task(self._pull_loop(subscription, callback)))
+    
+    async def _pull_loop(self, subscription: JetStreamContext.PullSubscription, callback):
+        """Fetch messages in batches and process them with bounded concurrency.
+        
+        Only as many messages are fetched as there are free processing slots, so a slow
+        subscriber leaves its backlog in the stream instead of in memory.
+        """
+        concurrency = max(1, self.settings.NATS_PULL_CONCURRENCY)
+        in_flight: Set[asyncio.Task] = set()
+        try:
+            while True:
+                free = concurrency - len(in_flight)
+                if free <= 0:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    messages = await subscription.fetch(
+                        min(self.settings.NATS_PULL_BATCH_SIZE, free),
+                        timeout=self.settings.NATS_PULL_MAX_WAIT_SECONDS
+                    )
+                except nats.errors.TimeoutError:
+                    continue
+                except Exception as e:
+                    logger.warning(f"JetStream fetch failed: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for msg in messages:
+                    task = asyncio.create_task(self._process_jetstream_message(msg, callback))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+        finally:
+            for task in in_flight:
+                task.cancel()
+    
+    async def _process_jetstream_message(self, msg, callback):
+        """Run the callback for a JetStream message and acknowledge it (negatively on failure)."""
+        try:
+            try:
+                await callback(msg)
+            except Exception as e:
+                logger.error(f"Error handling JetStream message on {msg.subject}: {e}")
+                await msg.nak()
+                return
+            await msg.ack()
+        except Exception as e:
+            # The message is redelivered after the ack wait
+            logger.warning(f"Failed to acknowledge JetStream message on {msg.subject}: {e}")
+    
+    async def _stop_pull_consumers(self):
+        """Stop fetching from the pull consumers of the current connection."""
+        for task in self._pull_tasks:
+            task.cancel()
+        await asyncio.gather(*self._pull_tasks, return_exceptions=True)
+        self._pull_tasks = []
+    
     async def publish_task_status(self, task_id: str, status: str, data: Optional[Dict[str, Any]] = None):
         """Publish a task status update."""
         message = {
@@ -2,12 +2,49 @@ import aio_pika
 from aio_pika import connect_robust, ExchangeType, Message
 from aio_pika.abc import AbstractIncomingMessage
 from loguru import logger
-from tenacity import retry, stop_after_attempt, wait_exponential
-import json
+import time
 import asyncio
-from typing import Callable, Dict, Any, Optional
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional, Tuple
 
 from app.config import Settings
+from app.utils import codec
+from app.messaging.batch_publisher import BatchPublisher
+from app.messaging.consumer_pool import DEFAULT_TENANT, ConsumerPool
+from app.utils.circuit_breaker import CircuitOpenError, get_circuit_breaker, reconnect_forever
+from app.utils.metrics import RABBITMQ_TASK_DURATION, RABBITMQ_TASK_RETRIES, RABBITMQ_TASKS_DEFERRED, RABBITMQ_DEAD_LETTERS
+
+# Headers that track a message's failures across retries and in the dead-letter queue
+RETRY_COUNT_HEADER = "x-retry-count"
+LAST_ERROR_HEADER = "x-last-error"
+DEAD_LETTER_REASON_HEADER = "x-dead-letter-reason"
+
+# Header that assigns a task to a tenant for fair scheduling
+TENANT_HEADER = "x-tenant"
+
+# Dead-letter reasons
+EXHAUSTED = "exhausted"
+POISON = "poison"
+
+# Called with (task type, task data, error) when a task is dead-lettered; type and data are None
+# when the message could not be decoded
+DeadLetterListener = Callable[[Optional[str], Optional[Dict[str, Any]], str], Awaitable[None]]
+
+def parse_weights(value: str) -> Dict[str, int]:
+    """Parse ``"tenant=weight,..."`` into a weight per tenant."""
+    weights: Dict[str, int] = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip() and weight.strip():
+            weights[name.strip()] = max(1, int(weight))
+    return weights
+
+class PoisonMessageError(ValueError):
+    """Raised for a message that can never be handled (undecodable, no type, or no handler)."""
+    
+    def __init__(self, reason: str, task_type: Optional[str] = None, data: Optional[Dict[str, Any]] = None):
+        super().__init__(reason)
+        self.task_type = task_type
+        self.data = data
 
 class RabbitMQService:
     """Service for interacting with RabbitMQ."""
@@ -18,13 +55,28 @@ class RabbitMQService:
         self.connection = None
         self.channel = None
         self.exchange = None
+        self.shared_exchange = None
         self.queue = None
+        self.work_queue = None
         self.is_connected = False
         self.task_handlers: Dict[str, Callable] = {}
+        self.consumer_pool = ConsumerPool(
+            self._execute_pooled_task,
+            size=settings.RABBITMQ_WORKER_POOL_SIZE,
+            default_limit=settings.RABBITMQ_TASK_CONCURRENCY,
+            weights=parse_weights(settings.RABBITMQ_TENANT_WEIGHTS)
+        )
+        self.consumer_channels: List[aio_pika.abc.AbstractChannel] = []
+        self.dead_letter_exchange = None
+        self.publisher: Optional[BatchPublisher] = None
+        self.dead_letter_listeners: List[DeadLetterListener] = []
+        # Publishes fail fast while the broker is unreachable
+        self.breaker = get_circuit_breaker("rabbitmq")
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
     
-    @retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=1, max=60))
     async def connect(self):
-        """Connect to RabbitMQ with retry logic."""
+        """Connect to RabbitMQ once; use ``start_reconnect`` to keep retrying in the background."""
         logger.info(f"Connecting to RabbitMQ at {self.settings.RABBITMQ_URL}")
         
         try:
@@ -33,10 +85,11 @@ class RabbitMQService:
             
             # Create channel
             self.channel = await self.connection.channel()
-            await self.channel.set_qos(prefetch_count=10)
+            await self.channel.set_qos(prefetch_count=self.settings.RABBITMQ_PREFETCH_COUNT)
             
-            # Declare exchange
-            self.exchange = await self.channel.declare_exchange(
+            # Declare exchange; it and the queue are shared with other services, so their
+            # declarations must not change
+            self.shared_exchange = await self.channel.declare_exchange(
                 self.settings.RABBITMQ_EXCHANGE,
                 ExchangeType.DIRECT,
                 durable=True
@@ -50,41 +103,257 @@ class RabbitMQService:
             
             # Bind queue to exchange
             await self.queue.bind(
-                self.exchange,
+                self.shared_exchange,
                 routing_key=self.settings.RABBITMQ_ROUTING_KEY
             )
             
+            # Tasks are published to a separate topic exchange as "<routing key>.<tenant>.<task type>"
+            # and reach the work queue: the priority queue when priorities are on, else the task queue
+            self.exchange = await self.channel.declare_exchange(
+                self.settings.RABBITMQ_ROUTED_EXCHANGE,
+                ExchangeType.TOPIC,
+                durable=True
+            )
+            self.work_queue = self.queue
+            if self.work_queue_name != self.settings.RABBITMQ_QUEUE:
+                self.work_queue = await self.channel.declare_queue(
+                    self.work_queue_name,
+                    durable=True,
+                    arguments=self._queue_arguments(self.work_queue_name)
+                )
+            await self.work_queue.bind(
+                self.exchange,
+                routing_key=f"{self.settings.RABBITMQ_ROUTING_KEY}.#"
+            )
+            
+            await self._declare_dead_lettering()
+            
+            # Start the batching publisher on its own confirm-mode channel
+            if self.settings.RABBITMQ_PUBLISH_BATCHING:
+                self.publisher = BatchPublisher(
+                    self.settings.RABBITMQ_ROUTED_EXCHANGE,
+                    batch_size=self.settings.RABBITMQ_PUBLISH_BATCH_SIZE,
+                    batch_window=self.settings.RABBITMQ_PUBLISH_BATCH_WINDOW_MS / 1000
+                )
+                await self.publisher.start(self.connection)
+            
+            # The robust connection reconnects by itself once established; track its state
+            self.connection.close_callbacks.add(self._on_connection_closed)
+            self.connection.reconnect_callbacks.add(self._on_reconnected)
+            
             self.is_connected = True
+            self.breaker.reset()
             logger.info("Successfully connected to RabbitMQ")
         except Exception as e:
             self.is_connected = False
+            self.breaker.trip()
             logger.error(f"Failed to connect to RabbitMQ: {e}")
+            # A connection opened before a later step failed would otherwise stay open, and the
+            # robust connection would keep reconnecting it in the background
+            await self._discard_connection()
             raise
     
+    async def _discard_connection(self):
+        """Stop the publisher and close the connection of a failed connect attempt."""
+        publisher, self.publisher = self.publisher, None
+        if publisher is not None:
+            try:
+                await publisher.stop()
+            except Exception as e:
+                logger.warning(f"Failed to stop batch publisher: {e}")
+        connection, self.connection = self.connection, None
+        self.channel = None
+        if connection is not None and not connection.is_closed:
+            connection.close_callbacks.discard(self._on_connection_closed)
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.warning(f"Failed to close RabbitMQ connection: {e}")
+    
+    @property
+    def work_queue_name(self) -> str:
+        """Queue the routed exchange delivers tasks to, and that retries and requeues return to."""
+        if self.settings.RABBITMQ_MAX_PRIORITY > 0:
+            return self.settings.RABBITMQ_PRIORITY_QUEUE
+        return self.settings.RABBITMQ_QUEUE
+    
+    @property
+    def consumed_queue_names(self) -> List[str]:
+        """Queues the consumers read: the work queue, and the shared task queue other services publish to."""
+        return list(dict.fromkeys([self.work_queue_name, self.settings.RABBITMQ_QUEUE]))
+    
+    def _queue_arguments(self, name: str) -> Dict[str, Any]:
+        """Arguments of a consumed queue; every declaration must pass the same ones."""
+        if name == self.settings.RABBITMQ_PRIORITY_QUEUE and self.settings.RABBITMQ_MAX_PRIORITY > 0:
+            return {"x-max-priority": self.settings.RABBITMQ_MAX_PRIORITY}
+        return {}
+    
+    def task_routing_key(self, task_type: str, tenant: Optional[str] = None) -> str:
+        """Return the routing key of a task, so dedicated queues can be bound per tenant or type."""
+        return f"{self.settings.RABBITMQ_ROUTING_KEY}.{tenant or DEFAULT_TENANT}.{task_type}"
+    
+    async def _declare_dead_lettering(self):
+        """Declare the retry queues and the dead-letter exchange and queue.
+        
+        A failed task is parked in the retry queue for its attempt, whose messages all carry the
+        same per-message TTL, so no message waits behind a longer delay. When the TTL expires the
+        broker dead-letters the message back to the task queue. Tasks that exhaust their attempts
+        and poison messages go to the dead-letter exchange and stay in the dead-letter queue until
+        they are requeued. Tasks deferred by the consumer pool wait in the deferred queue the same
+        way.
+        """
+        for name in [self._deferred_queue_name] + [
+            self._retry_queue_name(retry) for retry in range(1, self.settings.RABBITMQ_MAX_ATTEMPTS)
+        ]:
+            await self.channel.declare_queue(
+                name,
+                durable=True,
+                arguments={
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": self.work_queue_name,
+                }
+            )
+        
+        dead_letter_exchange = await self.channel.declare_exchange(
+            self.settings.RABBITMQ_DEAD_LETTER_EXCHANGE,
+            ExchangeType.DIRECT,
+            durable=True
+        )
+        dead_letter_queue = await self.channel.declare_queue(
+            self.settings.RABBITMQ_DEAD_LETTER_QUEUE,
+            durable=True
+        )
+        await dead_letter_queue.bind(dead_letter_exchange, routing_key=self.settings.RABBITMQ_QUEUE)
+        self.dead_letter_exchange = dead_letter_exchange
+    
+    def _retry_queue_name(self, retry: int) -> str:
+        return f"{self.work_queue_name}.retry.{retry}"
+    
+    @property
+    def _deferred_queue_name(self) -> str:
+        return f"{self.work_queue_name}.deferred"
+    
+    def _retry_delay(self, retry: int) -> float:
+        """Delay in seconds before the given retry (exponential, capped)."""
+        delay_ms = self.settings.RABBITMQ_RETRY_BASE_DELAY_MS * 2 ** (retry - 1)
+        return min(delay_ms, self.settings.RABBITMQ_RETRY_MAX_DELAY_MS) / 1000
+    
+    def start_reconnect(self) -> asyncio.Task:
+        """Retry connecting in the background; the returned task finishes once connected."""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(
+                reconnect_forever(self.breaker, self.connect, self.settings.RECONNECT_MAX_DELAY_SECONDS)
+            )
+        return self._reconnect_task
+    
+    def _on_connection_closed(self, sender: Any, exc: Optional[BaseException] = None):
+        if self._closing:
+            return
+        logger.warning(f"RabbitMQ connection lost: {exc}")
+        self.is_connected = False
+        self.breaker.trip()
+    
+    def _on_reconnected(self, sender: Any):
+        logger.info("RabbitMQ connection restored")
+        self.is_connected = True
+        self.breaker.reset()
+    
+    def ensure_available(self):
+        """Raise CircuitOpenError while RabbitMQ is unreachable."""
+        self.breaker.check()
+        if not self.is_connected:
+            raise CircuitOpenError(self.breaker.name, self.breaker.reset_timeout)
+    
     async def close(self):
         """Close RabbitMQ connection."""
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        await self.stop_consumer_pool()
+        if self.publisher:
+            await self.publisher.stop()
+            self.publisher = None
         if self.connection:
             await self.connection.close()
             self.is_connected = False
             logger.info("RabbitMQ connection closed")
     
-    async def publish(self, routing_key: str, message_data: Dict[str, Any]):
-        """Publish a message to RabbitMQ."""
-        if not self.is_connected:
-            logger.warning("Cannot publish message: not connected to RabbitMQ")
-            return
+    def _build_message(
+        self,
+        message_data: Dict[str, Any],
+        priority: Optional[int] = None,
+        tenant: Optional[str] = None
+    ) -> Message:
+        """Serialize message data into an AMQP message."""
+        content_type = self.settings.MESSAGING_CONTENT_TYPE
+        if priority is not None:
+            priority = max(0, min(priority, self.settings.RABBITMQ_MAX_PRIORITY))
+        return Message(
+            body=codec.encode(message_data, content_type),
+            content_type=content_type,
+            priority=priority,
+            headers={TENANT_HEADER: tenant} if tenant else None
+        )
+    
+    async def publish(
+        self,
+        routing_key: str,
+        message_data: Dict[str, Any],
+        priority: Optional[int] = None,
+        tenant: Optional[str] = None
+    ):
+        """Publish a message to RabbitMQ.
+        
+        Args:
+            routing_key: The routing key (see ``task_routing_key`` for tasks)
+            message_data: The message data
+            priority: Message priority, 0 up to RABBITMQ_MAX_PRIORITY (higher is delivered first)
+            tenant: Tenant the consumer pool schedules the task under
+        
+        Raises:
+            CircuitOpenError: RabbitMQ is unreachable
+        """
+        self.ensure_available()
         
         try:
-            message = Message(
-                body=json.dumps(message_data).encode(),
-                content_type="application/json"
-            )
-            await self.exchange.publish(message, routing_key=routing_key)
+            message = self._build_message(message_data, priority, tenant)
+            async with self.breaker.guard():
+                if self.publisher:
+                    # Concurrent publishers share batches and broker confirms
+                    await self.publisher.publish(routing_key, message)
+                else:
+                    await self.exchange.publish(message, routing_key=routing_key)
             logger.debug(f"Published message to {routing_key}: {message_data}")
         except Exception as e:
             logger.error(f"Failed to publish message: {e}")
             raise
     
+    async def publish_many(self, messages: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Publish several messages, pipelined, and wait until the broker has confirmed all of them.
+        
+        Args:
+            messages: (routing_key, message_data) pairs
+        
+        Raises:
+            CircuitOpenError: RabbitMQ is unreachable
+        """
+        self.ensure_available()
+        
+        try:
+            built = [(routing_key, self._build_message(data)) for routing_key, data in messages]
+            async with self.breaker.guard():
+                if self.publisher:
+                    futures = [await self.publisher.enqueue(routing_key, message) for routing_key, message in built]
+                    await asyncio.gather(*futures)
+                else:
+                    await asyncio.gather(
+                        *(self.exchange.publish(message, routing_key=routing_key) for routing_key, message in built)
+                    )
+            logger.debug(f"Published {len(built)} messages")
+        except Exception as e:
+            logger.error(f"Failed to publish messages: {e}")
+            raise
+    
     async def consume(self, callback: Callable[[AbstractIncomingMessage], None]):
         """Start consuming messages from the queue."""
         if not self.is_connected:
@@ -92,43 +361,318 @@ class RabbitMQService:
             return
         
         try:
-            await self.queue.consume(callback)
-            logger.info(f"Started consuming messages from queue {self.settings.RABBITMQ_QUEUE}")
+            for name in self.consumed_queue_names:
+                queue = await self.channel.declare_queue(name, durable=True, arguments=self._queue_arguments(name))
+                await queue.consume(callback)
+                logger.info(f"Started consuming messages from queue {name}")
         except Exception as e:
             logger.error(f"Failed to start consuming messages: {e}")
             raise
     
-    def register_task_handler(self, task_type: str, handler: Callable):
-        """Register a handler for a specific task type."""
+    async def start_consumer_pool(self):
+        """Consume the queue on several channels and dispatch tasks to the consumer pool.
+        
+        Each channel gets its own prefetch window, and the pool's workers run handlers
+        concurrently, honouring the per-task-type limits set in ``register_task_handler``.
+        """
+        if not self.is_connected:
+            logger.warning("Cannot start consumer pool: not connected to RabbitMQ")
+            return
+        if self.consumer_pool.is_running:
+            return
+        
+        try:
+            self.consumer_pool.start()
+            for _ in range(max(1, self.settings.RABBITMQ_CONSUMER_CHANNELS)):
+                channel = await self.connection.channel()
+                await channel.set_qos(prefetch_count=self.settings.RABBITMQ_PREFETCH_COUNT)
+                for name in self.consumed_queue_names:
+                    queue = await channel.declare_queue(name, durable=True, arguments=self._queue_arguments(name))
+                    await queue.consume(self._dispatch_message)
+                self.consumer_channels.append(channel)
+            logger.info(
+                f"Consumer pool consuming {', '.join(self.consumed_queue_names)} on "
+                f"{len(self.consumer_channels)} channels with {self.consumer_pool.size} workers"
+            )
+        except Exception as e:
+            logger.error(f"Failed to start consumer pool: {e}")
+            await self.stop_consumer_pool()
+            raise
+    
+    async def stop_consumer_pool(self):
+        """Stop the consumer pool and close its channels."""
+        for channel in self.consumer_channels:
+            try:
+                await channel.close()
+            except Exception as e:
+                logger.warning(f"Failed to close consumer channel: {e}")
+        self.consumer_channels = []
+        if self.consumer_pool.is_running:
+            await self.consumer_pool.stop()
+    
+    def register_task_handler(self, task_type: str, handler: Callable, concurrency: Optional[int] = None):
+        """Register a handler for a specific task type.
+        
+        Args:
+            task_type: The task type the handler processes
+            handler: Coroutine function called with the task payload
+            concurrency: Maximum concurrent executions of this task type in the consumer pool
+                (defaults to RABBITMQ_TASK_CONCURRENCY)
+        """
         self.task_handlers[task_type] = handler
+        self.consumer_pool.set_limit(task_type, concurrency)
         logger.info(f"Registered handler for task type: {task_type}")
     
-    async def process_message(self, message: AbstractIncomingMessage):
-        """Process an incoming message."""
-        async with message.process():
+    def add_dead_letter_listener(self, listener: DeadLetterListener):
+        """Register a coroutine function called whenever a task is dead-lettered."""
+        self.dead_letter_listeners.append(listener)
+    
+    def _parse_task(self, message: AbstractIncomingMessage) -> Tuple[str, Dict[str, Any]]:
+        """Decode a message and return its task type and payload.
+        
+        Raises:
+            PoisonMessageError: The message cannot be handled
+        """
+        try:
+            # The message's content type selects the codec, so producers can negotiate MessagePack
+            data = codec.decode(message.body, message.content_type)
+        except codec.DecodeError:
+            raise PoisonMessageError(f"Failed to decode message body: {message.body[:200]!r}")
+        
+        # Extract task type
+        task_type = data.get("type") if isinstance(data, dict) else None
+        if not task_type:
+            raise PoisonMessageError(f"Received message without task type: {data}")
+        
+        # Find handler for task type
+        if task_type not in self.task_handlers:
+            raise PoisonMessageError(f"No handler registered for task type: {task_type}", task_type, data)
+        
+        return task_type, data
+    
+    async def _execute_task(self, message: AbstractIncomingMessage, task_type: str, data: Dict[str, Any]):
+        """Run the handler for a task, then acknowledge the message or schedule a retry."""
+        handler = self.task_handlers[task_type]
+        logger.info(f"Processing task of type {task_type}")
+        start = time.perf_counter()
+        try:
+            await handler(data)
+        except asyncio.CancelledError:
+            # Shutting down: hand the task back to the queue
+            await self._settle(message.nack(requeue=True))
+            raise
+        except Exception as e:
+            RABBITMQ_TASK_DURATION.labels(task_type, "error").observe(time.perf_counter() - start)
+            logger.error(f"Error processing task of type {task_type}: {e}")
+            await self._retry_or_dead_letter(message, task_type, data, e)
+            return
+        RABBITMQ_TASK_DURATION.labels(task_type, "success").observe(time.perf_counter() - start)
+        logger.info(f"Successfully processed task of type {task_type}")
+        await self._settle(message.ack())
+    
+    @staticmethod
+    async def _settle(operation: Awaitable[None]):
+        """Ack or nack a message; if the channel is gone the broker redelivers it anyway."""
+        try:
+            await operation
+        except Exception as e:
+            logger.warning(f"Failed to settle message: {e}")
+    
+    def _forward(self, message: AbstractIncomingMessage, headers: Dict[str, Any], expiration: Optional[float] = None) -> Message:
+        """Copy a received message with new headers, e.g. to park it in a retry or dead-letter queue."""
+        return Message(
+            body=message.body,
+            headers=headers,
+            content_type=message.content_type,
+            content_encoding=message.content_encoding,
+            delivery_mode=message.delivery_mode,
+            priority=message.priority,
+            correlation_id=message.correlation_id,
+            message_id=message.message_id,
+            expiration=expiration
+        )
+    
+    async def _retry_or_dead_letter(
+        self,
+        message: AbstractIncomingMessage,
+        task_type: str,
+        data: Dict[str, Any],
+        error: Exception
+    ):
+        """Park a failed task in its retry queue, or dead-letter it once its attempts are used up.
+        
+        The original message is acknowledged only after the broker has confirmed the copy, so a
+        task is never lost; if the copy cannot be published the message is requeued instead.
+        """
+        headers = dict(message.headers or {})
+        retry = int(headers.get(RETRY_COUNT_HEADER) or 0) + 1
+        headers[RETRY_COUNT_HEADER] = retry
+        headers[LAST_ERROR_HEADER] = str(error)[:1000]
+        
+        if retry >= self.settings.RABBITMQ_MAX_ATTEMPTS:
+            logger.error(f"Task of type {task_type} failed {retry} times, dead-lettering it")
+            await self._dead_letter(message, headers, EXHAUSTED, task_type, data)
+            return
+        
+        delay = self._retry_delay(retry)
+        try:
+            await self.channel.default_exchange.publish(
+                self._forward(message, headers, expiration=delay),
+                routing_key=self._retry_queue_name(retry)
+            )
+        except Exception as e:
+            logger.error(f"Failed to schedule retry, requeueing the task: {e}")
+            await self._settle(message.nack(requeue=True))
+            return
+        RABBITMQ_TASK_RETRIES.labels(task_type).inc()
+        logger.info(f"Retrying task of type {task_type} in {delay:.1f}s (retry {retry})")
+        await self._settle(message.ack())
+    
+    async def _dead_letter(
+        self,
+        message: AbstractIncomingMessage,
+        headers: Dict[str, Any],
+        reason: str,
+        task_type: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None
+    ):
+        """Move a message to the dead-letter queue without blocking the consumer."""
+        headers[DEAD_LETTER_REASON_HEADER] = reason
+        try:
+            await self.dead_letter_exchange.publish(
+                self._forward(message, headers),
+                routing_key=self.settings.RABBITMQ_QUEUE
+            )
+        except Exception as e:
+            logger.error(f"Failed to dead-letter message, requeueing it: {e}")
+            await self._settle(message.nack(requeue=True))
+            return
+        RABBITMQ_DEAD_LETTERS.labels(reason).inc()
+        await self._settle(message.ack())
+        
+        error = str(headers.get(LAST_ERROR_HEADER, ""))
+        for listener in self.dead_letter_listeners:
             try:
-                # Parse message body
-                body = message.body.decode()
-                data = json.loads(body)
-                
-                # Extract task type
-                task_type = data.get("type")
-                if not task_type:
-                    logger.warning(f"Received message without task type: {data}")
-                    return
-                
-                # Find handler for task type
-                handler = self.task_handlers.get(task_type)
-                if not handler:
-                    logger.warning(f"No handler registered for task type: {task_type}")
-                    return
-                
-                # Process task
-                logger.info(f"Processing task of type {task_type}")
-                await handler(data)
-                logger.info(f"Successfully processed task of type {task_type}")
-            except json.JSONDecodeError:
-                logger.error(f"Failed to decode message body: {message.body}")
+                await listener(task_type, data, error)
             except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                # In a production system, you might want to send this to a dead-letter queue 
\ No newline at end of file
+                logger.error(f"Dead-letter listener failed: {e}")
+    
+    async def _dead_letter_poison(self, message: AbstractIncomingMessage, error: PoisonMessageError):
+        """Move a message that can never be handled aside instead of retrying it."""
+        logger.error(f"Dead-lettering poison message: {error}")
+        headers = dict(message.headers or {})
+        headers[LAST_ERROR_HEADER] = str(error)[:1000]
+        await self._dead_letter(message, headers, POISON, error.task_type, error.data)
+    
+    async def dead_letter_count(self) -> int:
+        """Return the number of messages in the dead-letter queue."""
+        self.ensure_available()
+        queue = await self.channel.declare_queue(self.settings.RABBITMQ_DEAD_LETTER_QUEUE, durable=True)
+        return queue.declaration_result.message_count
+    
+    async def requeue_dead_letters(self, limit: int = 100) -> List[Any]:
+        """Move up to ``limit`` messages from the dead-letter queue back to the task queue.
+        
+        Requeued messages get a fresh set of attempts.
+        
+        Returns:
+            The decoded payloads of the requeued messages (None for undecodable ones)
+        
+        Raises:
+            CircuitOpenError: RabbitMQ is unreachable
+        """
+        self.ensure_available()
+        requeued: List[Any] = []
+        # A dedicated channel keeps unacknowledged gets separate from the consumers' prefetch
+        channel = await self.connection.channel()
+        try:
+            queue = await channel.declare_queue(self.settings.RABBITMQ_DEAD_LETTER_QUEUE, durable=True)
+            while len(requeued) < limit:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                headers = {
+                    key: value for key, value in (message.headers or {}).items()
+                    if key not in (RETRY_COUNT_HEADER, LAST_ERROR_HEADER, DEAD_LETTER_REASON_HEADER)
+                }
+                await channel.default_exchange.publish(
+                    self._forward(message, headers),
+                    routing_key=self.work_queue_name
+                )
+                await message.ack()
+                try:
+                    requeued.append(codec.decode(message.body, message.content_type))
+                except codec.DecodeError:
+                    requeued.append(None)
+        finally:
+            await channel.close()
+        logger.info(f"Requeued {len(requeued)} dead-lettered messages")
+        return requeued
+    
+    async def _count_redelivery(self, message: AbstractIncomingMessage, task_type: str, data: Dict[str, Any]) -> bool:
+        """Count a broker redelivery as a failed attempt; return True if the message was handled.
+        
+        A message comes back redelivered when its delivery was never acknowledged: the worker
+        crashed or was killed while handling it, or the channel dropped. Its retry count header was
+        not bumped, so it is parked for a retry (or dead-lettered) like a failure; otherwise a
+        message that kills its worker would be redelivered forever.
+        """
+        if not message.redelivered:
+            return False
+        error = RuntimeError("Delivery was not acknowledged (worker crashed or connection lost)")
+        logger.warning(f"Task of type {task_type} was redelivered, counting it as a failed attempt")
+        await self._retry_or_dead_letter(message, task_type, data, error)
+        return True
+    
+    async def _defer(self, message: AbstractIncomingMessage, task_type: str):
+        """Hand a task back for later without counting an attempt.
+        
+        The task is parked in the deferred queue for ``RABBITMQ_DEFER_DELAY_MS`` and then returns
+        to the task queue, which frees its prefetch slot for other task types. A plain requeue
+        would come straight back and be marked as redelivered.
+        """
+        try:
+            await self.channel.default_exchange.publish(
+                self._forward(message, dict(message.headers or {}), expiration=self.settings.RABBITMQ_DEFER_DELAY_MS / 1000),
+                routing_key=self._deferred_queue_name
+            )
+        except Exception as e:
+            logger.error(f"Failed to defer task, requeueing it: {e}")
+            await self._settle(message.nack(requeue=True))
+            return
+        RABBITMQ_TASKS_DEFERRED.labels(task_type).inc()
+        logger.debug(f"Deferred task of type {task_type}: its lane is full")
+        await self._settle(message.ack())
+    
+    async def _dispatch_message(self, message: AbstractIncomingMessage):
+        """Route an incoming message to its tenant's task type lane in the consumer pool.
+        
+        A task type with a concurrency limit keeps at most that many tasks waiting in the pool;
+        further tasks are deferred, so a slow task type cannot hold every prefetched delivery.
+        """
+        try:
+            task_type, data = self._parse_task(message)
+        except PoisonMessageError as e:
+            await self._dead_letter_poison(message, e)
+            return
+        if await self._count_redelivery(message, task_type, data):
+            return
+        tenant = (message.headers or {}).get(TENANT_HEADER) or data.get("tenant") or DEFAULT_TENANT
+        if not await self.consumer_pool.offer(task_type, (message, data), tenant=str(tenant), priority=message.priority or 0):
+            await self._defer(message, task_type)
+    
+    async def _execute_pooled_task(self, task_type: str, item: Tuple[AbstractIncomingMessage, Dict[str, Any]]):
+        """Consumer pool callback."""
+        message, data = item
+        await self._execute_task(message, task_type, data)
+    
+    async def process_message(self, message: AbstractIncomingMessage):
+        """Process an incoming message inline."""
+        try:
+            task_type, data = self._parse_task(message)
+        except PoisonMessageError as e:
+            await self._dead_letter_poison(message, e)
+            return
+        if await self._count_redelivery(message, task_type, data):
+            return
+        await self._execute_task(message, task_type, data)
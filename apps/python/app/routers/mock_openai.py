@@ -0,0 +1,165 @@
+"""
+Mock OpenAI router for the Python service.
+This module provides an OpenAI-compatible chat-completions endpoint, with SSE streaming, that
+answers after a configurable time to first token, emits tokens at a configurable rate and injects
+server errors and 429 rate limits at configurable rates. It lets streaming, coalescing, caching
+and rate limiting be load-tested without network access.
+
+It is mounted at ``/mock/openai`` when OPENAI_MOCK_ENABLED is set; point the service at it with
+OPENAI_BASE_URL=http://localhost:8000/mock/openai/v1. To keep the mock's load off the service
+under test, run it as its own process: ``python -m app.routers.mock_openai --port 8100``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from loguru import logger
+
+from app.config import Settings, get_settings
+
+
+class MockUpstream:
+    """Simulated upstream behaviour configured from settings."""
+
+    def __init__(self, settings: Settings):
+        """Initialize the mock from the OPENAI_MOCK_* settings."""
+        self.ttft = settings.OPENAI_MOCK_TTFT_MS / 1000
+        self.interval = 1.0 / settings.OPENAI_MOCK_TOKENS_PER_SECOND if settings.OPENAI_MOCK_TOKENS_PER_SECOND > 0 else 0.0
+        self.tokens = settings.OPENAI_MOCK_TOKENS
+        self.error_rate = settings.OPENAI_MOCK_ERROR_RATE
+        self.rate_limit_rate = settings.OPENAI_MOCK_RATE_LIMIT_RATE
+        self.retry_after = settings.OPENAI_MOCK_RETRY_AFTER_SECONDS
+        # A fixed seed makes the sequence of injected failures reproducible
+        self.random = random.Random(settings.OPENAI_MOCK_SEED or None)
+
+    def completion_tokens(self, body: Dict[str, Any]) -> int:
+        """Number of tokens to produce, capped by the request's max_tokens."""
+        max_tokens = body.get("max_tokens")
+        return min(self.tokens, max_tokens) if max_tokens else self.tokens
+
+    def injected_failure(self) -> Optional[JSONResponse]:
+        """Return a 429 or 500 response according to the configured rates, or None."""
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse(
+                status_code=429,
+                content={"error": {
+                    "message": "Rate limit reached (mock)",
+                    "type": "requests",
+                    "code": "rate_limit_exceeded",
+                }},
+                headers={"retry-after": str(self.retry_after)},
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Internal server error (mock)", "type": "server_error", "code": None}},
+            )
+        return None
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    """Rough prompt size: one token per four characters of message content."""
+    return sum(len(str(message.get("content") or "")) for message in body.get("messages", [])) // 4 + 1
+
+
+def create_router(settings: Settings) -> APIRouter:
+    """Create the mock's router; routes are relative to the OpenAI base URL's parent."""
+    router = APIRouter()
+    mock = MockUpstream(settings)
+
+    async def stream(completion_id: str, model: str, tokens: int) -> AsyncIterator[str]:
+        await asyncio.sleep(mock.ttft)
+        for index in range(tokens):
+            if index:
+                await asyncio.sleep(mock.interval)
+            delta = {"content": f"tok{index} "}
+            if index == 0:
+                delta["role"] = "assistant"
+            yield _chunk(completion_id, model, delta)
+        yield _chunk(completion_id, model, {}, "stop")
+        yield "data: [DONE]\n\n"
+
+    @router.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        """Answer a chat completion like the OpenAI API, streaming if requested."""
+        body = await request.json()
+        failure = mock.injected_failure()
+        if failure is not None:
+            return failure
+
+        model = body.get("model", "mock")
+        tokens = mock.completion_tokens(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if body.get("stream"):
+            return StreamingResponse(stream(completion_id, model, tokens), media_type="text/event-stream")
+
+        await asyncio.sleep(mock.ttft + mock.interval * max(0, tokens - 1))
+        prompt_tokens = _prompt_tokens(body)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(f"tok{i} " for i in range(tokens))},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": tokens,
+                "total_tokens": prompt_tokens + tokens,
+            },
+        })
+
+    @router.get("/v1/models")
+    async def list_models():
+        """List the configured model, for clients that probe the API."""
+        return {"object": "list", "data": [{"id": settings.OPENAI_MODEL, "object": "model", "owned_by": "mock"}]}
+
+    return router
+
+
+def create_mock_app(settings: Settings) -> FastAPI:
+    """Create a standalone app serving the mock at the root (base URL ``http://host:port/v1``)."""
+    app = FastAPI(title="Mock OpenAI upstream")
+    app.include_router(create_router(settings))
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI upstream (configured by OPENAI_MOCK_* settings)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    settings = get_settings()
+    logger.info(
+        f"Mock OpenAI upstream on http://{args.host}:{args.port}/v1 "
+        f"(ttft={settings.OPENAI_MOCK_TTFT_MS}ms, {settings.OPENAI_MOCK_TOKENS_PER_SECOND} tokens/s)"
+    )
+    uvicorn.run(create_mock_app(settings), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
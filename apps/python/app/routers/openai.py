@@ -6,11 +6,18 @@ This module provides endpoints for interacting with the OpenAI API.
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
-from sse_starlette.sse import EventSourceResponse
-from app.services.openai_service import OpenAIService
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Literal, AsyncGenerator, Tuple
+from sse_starlette.sse import EventSourceResponse, ServerSentEvent
+from app.services.stream_registry import StreamGapError, create_stream_registry
+from app.services.model_router import UnknownModelError
+from app.services.token_counter import ContextLengthError
 from app.config import get_settings
+from app.utils import codec
+from app.utils.circuit_breaker import CircuitOpenError
+from app.utils.streaming import coalesce_chunks
 from loguru import logger
+from contextlib import aclosing
+import asyncio
 
 # Create router
 router = APIRouter()
@@ -18,8 +25,27 @@ router = APIRouter()
 # Get settings
 settings = get_settings()
 
-# Create OpenAI service
-openai_service = OpenAIService()
+if TYPE_CHECKING:
+    from app.services.openai_service import OpenAIService
+
+# The OpenAI service (and the OpenAI SDK it imports) is created on first use to keep startup fast
+_openai_service: Optional["OpenAIService"] = None
+
+def get_openai_service() -> "OpenAIService":
+    """Return the OpenAI service, creating it on first use."""
+    global _openai_service
+    if _openai_service is None:
+        from app.services.openai_service import OpenAIService
+        _openai_service = OpenAIService()
+    return _openai_service
+
+async def close_openai_service():
+    """Release the OpenAI service's resources if it was created."""
+    if _openai_service is not None:
+        await _openai_service.close()
+
+# Resumable streams
+stream_registry = create_stream_registry(settings)
 
 # Define request models
 class CompletionRequest(BaseModel):
@@ -29,6 +55,11 @@ class CompletionRequest(BaseModel):
     temperature: float = Field(0.7, description="Controls randomness (0-1)")
     max_tokens: Optional[int] = Field(None, description="Maximum number of tokens to generate")
     stream: bool = Field(False, description="Whether to stream the response")
+    bypass_cache: bool = Field(False, description="Skip the completion cache for this request")
+    priority: Optional[Literal["interactive", "default", "batch"]] = Field(
+        None, description="Upstream admission priority (streams default to interactive, completions to default)"
+    )
+    model: Optional[str] = Field(None, description="A configured model to use instead of the model routes")
 
 # Define response models
 class CompletionResponse(BaseModel):
@@ -38,6 +69,22 @@ class CompletionResponse(BaseModel):
     model: str = Field(..., description="The model used for the completion")
     usage: Dict[str, int] = Field(..., description="Token usage information")
 
+class BatchCompletionRequest(BaseModel):
+    """Request model for batch completions."""
+    items: List[CompletionRequest] = Field(..., min_length=1, description="The completion requests")
+    concurrency: Optional[int] = Field(None, ge=1, description="Maximum completions running at once")
+    stream: bool = Field(False, description="Stream results as NDJSON in completion order")
+
+class BatchCompletionResult(BaseModel):
+    """Result of one batch item."""
+    index: int = Field(..., description="Position of the item in the request")
+    response: Optional[CompletionResponse] = Field(None, description="The completion, if it succeeded")
+    error: Optional[str] = Field(None, description="The error, if it failed")
+
+class BatchCompletionResponse(BaseModel):
+    """Response model for batch completions."""
+    results: List[BatchCompletionResult] = Field(..., description="Results in request order")
+
 @router.post("/completions", response_model=CompletionResponse)
 async def create_completion(request: CompletionRequest):
     """
@@ -51,26 +98,55 @@ async def create_completion(request: CompletionRequest):
     """
     try:
         # Generate completion
-        response = await openai_service.generate_completion(
+        response = await get_openai_service().generate_completion(
             prompt=request.prompt,
             system_message=request.system_message,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
-            stream=request.stream
+            stream=request.stream,
+            bypass_cache=request.bypass_cache,
+            priority=request.priority or "default",
+            model=request.model
         )
         
         return response
+    except CircuitOpenError:
+        # Answered with 503 by the application's exception handler
+        raise
+    except (ContextLengthError, UnknownModelError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error creating completion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def completion_events(chunks: AsyncGenerator[str, None]) -> AsyncGenerator[Tuple[str, str], None]:
+    """Yield the (event, data) pairs of a streamed completion, ending with a done or error event."""
+    try:
+        # Tokens are coalesced into frames; the bounded buffer pauses upstream for slow clients
+        frames = coalesce_chunks(
+            chunks,
+            window=settings.OPENAI_STREAM_COALESCE_MS / 1000,
+            max_bytes=settings.OPENAI_STREAM_COALESCE_BYTES,
+            max_buffered=settings.OPENAI_STREAM_BUFFER_CHUNKS
+        )
+        async with aclosing(frames):
+            async for frame in frames:
+                yield "message", codec.encode({"content": frame}).decode()
+        yield "done", "[DONE]"
+    except Exception as e:
+        logger.error(f"Error in stream generator: {e}")
+        yield "error", codec.encode({"error": str(e)}).decode()
+
 @router.post("/completions/stream")
-async def stream_completion(request: CompletionRequest):
+async def stream_completion(request: CompletionRequest, http_request: Request):
     """
     Stream a completion using the OpenAI API.
     
+    A request with a ``Last-Event-ID`` header resumes the stream after that event.
+    
     Args:
         request: The completion request
+        http_request: The HTTP request, for the Last-Event-ID header
         
     Returns:
         A streaming response with the completion
@@ -79,35 +155,151 @@ async def stream_completion(request: CompletionRequest):
         # Check if streaming is requested
         if not request.stream:
             # If not streaming, use the regular completion endpoint
-            response = await openai_service.generate_completion(
+            response = await get_openai_service().generate_completion(
                 prompt=request.prompt,
                 system_message=request.system_message,
                 temperature=request.temperature,
                 max_tokens=request.max_tokens,
-                stream=False
+                stream=False,
+                bypass_cache=request.bypass_cache,
+                priority=request.priority or "default",
+                model=request.model
             )
             
             return response
         
+        last_event_id = http_request.headers.get("last-event-id")
+        if last_event_id:
+            # Resume from the replay buffer; the request body is not used again
+            stream_id, _, sequence = last_event_id.rpartition(":")
+            after = int(sequence) if sequence.isdigit() else None
+            try:
+                if after is None:
+                    raise StreamGapError(f"Unknown stream event {last_event_id}")
+                # Streams started by another worker are read from the shared replay backend
+                stream = await stream_registry.resume(stream_id, after)
+            except StreamGapError as e:
+                logger.info(f"Cannot resume stream: {e}")
+                raise HTTPException(status_code=410, detail="Stream can no longer be resumed, start a new request")
+        else:
+            # Fail fast with 503, or 400 for an unknown model or a prompt that does not fit, instead
+            # of opening a stream that can only report an error
+            get_openai_service().breaker.check()
+            chunks = get_openai_service().stream_completion(
+                prompt=request.prompt,
+                system_message=request.system_message,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                bypass_cache=request.bypass_cache,
+                priority=request.priority or "interactive",
+                model=request.model
+            )
+            stream = stream_registry.create(completion_events(chunks))
+            after = None
+        
         # Create generator function for streaming
         async def event_generator():
             try:
-                async for chunk in openai_service.stream_completion(
-                    prompt=request.prompt,
-                    system_message=request.system_message,
-                    temperature=request.temperature,
-                    max_tokens=request.max_tokens
-                ):
-                    yield chunk
-            except Exception as e:
-                logger.error(f"Error in stream generator: {e}")
-                yield f"Error: {str(e)}"
+                async for sequence, event, data in stream.subscribe(after):
+                    yield ServerSentEvent(
+                        data=data,
+                        event=None if event == "message" else event,
+                        id=f"{stream.id}:{sequence}"
+                    )
+            except StreamGapError as e:
+                # A client resuming on another worker fell further behind than the replay buffer
+                logger.warning(f"Resumed stream lost events: {e}")
+                yield ServerSentEvent(data=codec.encode({"error": str(e)}).decode(), event="error")
         
-        # Return streaming response
-        return StreamingResponse(
+        # Return SSE response; generation continues for a grace period after a disconnect
+        return EventSourceResponse(
             event_generator(),
-            media_type="text/event-stream"
+            ping=settings.OPENAI_STREAM_PING_SECONDS,
+            headers={"X-Stream-ID": stream.id}
         )
+    except (HTTPException, CircuitOpenError):
+        raise
+    except (ContextLengthError, UnknownModelError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error streaming completion: {e}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e)) 
+
+async def run_batch(items: List[CompletionRequest], concurrency: int) -> AsyncGenerator[BatchCompletionResult, None]:
+    """Run batch items with bounded concurrency and yield each result as it finishes.
+    
+    Item failures are returned as results rather than raised; pending items are cancelled,
+    and waited for, if the consumer stops early (e.g. the client disconnects).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_item(index: int, item: CompletionRequest) -> BatchCompletionResult:
+        async with semaphore:
+            try:
+                response = await get_openai_service().generate_completion(
+                    prompt=item.prompt,
+                    system_message=item.system_message,
+                    temperature=item.temperature,
+                    max_tokens=item.max_tokens,
+                    bypass_cache=item.bypass_cache,
+                    priority=item.priority or "batch",
+                    model=item.model
+                )
+                return BatchCompletionResult(index=index, response=response)
+            except Exception as e:
+                logger.warning(f"Batch item {index} failed: {e}")
+                return BatchCompletionResult(index=index, error=str(e))
+    
+    tasks = [asyncio.create_task(run_item(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@router.post("/completions/batch", response_model=BatchCompletionResponse)
+async def create_batch_completion(request: BatchCompletionRequest):
+    """
+    Generate completions for several prompts in one call.
+    
+    Items run with bounded concurrency at batch priority unless they set their own.
+    A failed item does not fail the batch; its result carries the error instead.
+    
+    Args:
+        request: The batch completion request
+        
+    Returns:
+        The results in request order, or an NDJSON stream of results as they finish
+    """
+    if len(request.items) > settings.OPENAI_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {settings.OPENAI_BATCH_MAX_ITEMS} items"
+        )
+    concurrency = min(request.concurrency or settings.OPENAI_BATCH_CONCURRENCY, settings.OPENAI_BATCH_CONCURRENCY)
+    get_openai_service().breaker.check()
+    
+    if request.stream:
+        async def ndjson_generator():
+            async for result in run_batch(request.items, concurrency):
+                yield codec.encode(result.model_dump()) + b"\n"
+        
+        return StreamingResponse(ndjson_generator(), media_type="application/x-ndjson")
+    
+    results: List[Optional[BatchCompletionResult]] = [None] * len(request.items)
+    async for result in run_batch(request.items, concurrency):
+        results[result.index] = result
+    return BatchCompletionResponse(results=results)
+
+@router.get("/models")
+async def list_models():
+    """
+    List the models requests may name and the rolling stats of each model and API key.
+    
+    Returns:
+        The models and, per backend, its weight, latency by operation, error rate and cooldown
+    """
+    model_router = get_openai_service().router
+    return {"models": model_router.models, "backends": model_router.stats()}
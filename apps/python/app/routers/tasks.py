@@ -1,15 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Request, Response
 from pydantic import BaseModel, Field
 from typing import Dict, Any, Optional, List
 from loguru import logger
-import uuid
 
 from app.config import Settings, get_settings
 from app.messaging.rabbitmq import RabbitMQService
 from app.messaging.nats import NatsService
+from app.services.task_handlers import get_task_handler
+from app.services.task_store import (
+    TaskRecord,
+    InvalidTransitionError,
+    create_task_store,
+    RUNNING,
+    COMPLETED,
+    FAILED,
+)
 
 router = APIRouter()
 
+# Get settings
+settings = get_settings()
+
+# Create task store
+task_store = create_task_store(settings)
+
 class TaskBase(BaseModel):
     """Base model for tasks."""
     type: str
@@ -17,71 +31,155 @@ class TaskBase(BaseModel):
 
 class TaskCreate(TaskBase):
     """Model for creating a task."""
-    pass
+    priority: Optional[int] = Field(
+        None, ge=0, le=255,
+        description="Queue priority, higher runs first (capped at RABBITMQ_MAX_PRIORITY)"
+    )
+    tenant: Optional[str] = Field(
+        None, pattern=r"^[A-Za-z0-9_-]{1,64}$",
+        description="Tenant whose share of the workers the task runs in"
+    )
 
 class TaskResponse(TaskBase):
     """Model for task response."""
     id: str
     status: str = "queued"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[float] = None
+    updated_at: Optional[float] = None
+
+def to_response(record: TaskRecord) -> TaskResponse:
+    """Convert a task record to a response model."""
+    return TaskResponse(**record.to_dict())
 
 @router.post("/", response_model=TaskResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_task(
     task: TaskCreate,
     background_tasks: BackgroundTasks,
+    request: Request,
     settings: Settings = Depends(get_settings)
 ):
-    """Create a new task."""
-    # Generate a unique ID for the task
-    task_id = str(uuid.uuid4())
+    """Create a new task.
     
-    # Create response object
-    response = TaskResponse(
-        id=task_id,
-        type=task.type,
-        data=task.data,
-        status="queued"
-    )
+    With TASK_DISPATCH_MODE=rabbitmq the task is published for the worker (``python -m app.worker``);
+    otherwise it runs in this process as a background task.
+    """
+    rabbitmq_service: Optional[RabbitMQService] = None
+    if settings.TASK_DISPATCH_MODE == "rabbitmq":
+        rabbitmq_service = getattr(request.app.state, "rabbitmq_service", None)
+        if not rabbitmq_service:
+            raise HTTPException(status_code=503, detail="Task queue unavailable")
+        # Fail fast (503) before storing the task while the queue is unreachable
+        rabbitmq_service.ensure_available()
+    
+    # Store the task; this assigns its ID and emits the queued status
+    record = await task_store.create(task.type, task.data)
     
-    # Process task in background
-    background_tasks.add_task(process_task, task_id, task.type, task.data)
+    if rabbitmq_service:
+        # Hand the task to the worker pods
+        try:
+            await rabbitmq_service.publish(
+                rabbitmq_service.task_routing_key(task.type, task.tenant),
+                {"id": record.id, "type": task.type, "data": task.data},
+                priority=task.priority,
+                tenant=task.tenant
+            )
+        except Exception as e:
+            await task_store.update_status(record.id, FAILED, error=f"Failed to dispatch task: {e}")
+            raise HTTPException(status_code=503, detail="Task queue unavailable")
+    else:
+        # Process task in background
+        background_tasks.add_task(process_task, record.id, task.type, task.data)
     
-    return response
+    return to_response(record)
 
 async def process_task(task_id: str, task_type: str, task_data: Dict[str, Any]):
-    """Process a task in the background."""
+    """Process a task in the background (in-process dispatch mode)."""
     logger.info(f"Processing task {task_id} of type {task_type}")
     
-    # This is a placeholder for actual task processing
-    # In a real implementation, you would:
-    # 1. Publish task to RabbitMQ
-    # 2. Update task status via NATS
-    # 3. Process the task or delegate to a worker
+    try:
+        await task_store.update_status(task_id, RUNNING)
+    except (KeyError, InvalidTransitionError) as e:
+        logger.warning(f"Skipping task {task_id}: {e}")
+        return
     
-    # For now, we'll just log the task
-    logger.info(f"Task data: {task_data}")
-    logger.info(f"Task {task_id} processed successfully")
+    try:
+        handler = get_task_handler(task_type)
+        if handler is None:
+            raise LookupError(f"No handler registered for task type: {task_type}")
+        result = await handler(task_data)
+        await task_store.update_status(task_id, COMPLETED, result=result or {})
+        logger.info(f"Task {task_id} processed successfully")
+    except Exception as e:
+        logger.error(f"Task {task_id} failed: {e}")
+        await task_store.update_status(task_id, FAILED, error=str(e))
+
+class DeadLetterStats(BaseModel):
+    """Model for dead-letter queue stats."""
+    queue: str
+    messages: int
+
+class RequeueResponse(BaseModel):
+    """Model for a dead-letter requeue result."""
+    requeued: int
+    task_ids: List[str] = Field(default_factory=list)
+
+def get_rabbitmq_service(request: Request) -> RabbitMQService:
+    """Return the connected RabbitMQ service or fail fast with 503."""
+    rabbitmq_service: Optional[RabbitMQService] = getattr(request.app.state, "rabbitmq_service", None)
+    if not rabbitmq_service:
+        raise HTTPException(status_code=503, detail="Task queue unavailable")
+    rabbitmq_service.ensure_available()
+    return rabbitmq_service
+
+@router.get("/dead-letters", response_model=DeadLetterStats)
+async def get_dead_letters(
+    rabbitmq_service: RabbitMQService = Depends(get_rabbitmq_service),
+    settings: Settings = Depends(get_settings)
+):
+    """Get the number of messages in the dead-letter queue."""
+    return DeadLetterStats(
+        queue=settings.RABBITMQ_DEAD_LETTER_QUEUE,
+        messages=await rabbitmq_service.dead_letter_count()
+    )
+
+@router.post("/dead-letters/requeue", response_model=RequeueResponse)
+async def requeue_dead_letters(
+    limit: int = Query(100, ge=1, le=10000, description="Maximum number of messages to requeue"),
+    rabbitmq_service: RabbitMQService = Depends(get_rabbitmq_service)
+):
+    """Move dead-lettered tasks back to the task queue with a fresh set of attempts."""
+    messages = await rabbitmq_service.requeue_dead_letters(limit)
+    task_ids = []
+    for message in messages:
+        task_id = message.get("id") if isinstance(message, dict) else None
+        if task_id:
+            task_ids.append(task_id)
+            await task_store.requeue(task_id)
+    return RequeueResponse(requeued=len(messages), task_ids=task_ids)
 
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(task_id: str):
     """Get a task by ID."""
-    # This is a placeholder - in a real implementation, you would:
-    # 1. Retrieve task from database or cache
-    # 2. Return task details
-    
-    # For now, we'll just return a dummy response
-    return TaskResponse(
-        id=task_id,
-        type="unknown",
-        data={},
-        status="unknown"
-    )
+    record = task_store.get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return to_response(record)
 
 @router.get("/", response_model=List[TaskResponse])
-async def list_tasks():
-    """List all tasks."""
-    # This is a placeholder - in a real implementation, you would:
-    # 1. Retrieve tasks from database or cache
-    # 2. Return task list
+async def list_tasks(
+    response: Response,
+    status: Optional[str] = Query(None, description="Only return tasks with this status"),
+    type: Optional[str] = Query(None, description="Only return tasks of this type"),
+    cursor: Optional[int] = Query(None, description="Cursor from the X-Next-Cursor header of the previous page"),
+    limit: int = Query(50, ge=1, le=500, description="Page size")
+):
+    """List tasks in creation order.
     
-    # For now, we'll just return an empty list
-    return [] 
\ No newline at end of file
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    records, next_cursor = task_store.list_tasks(status=status, task_type=type, cursor=cursor, limit=limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return [to_response(record) for record in records]
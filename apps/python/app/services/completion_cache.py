@@ -0,0 +1,203 @@
+"""
+Completion cache for the Python service.
+This module caches deterministic OpenAI completions (and the chunks of streamed ones) in a bounded
+in-memory LRU with TTL and size-based eviction, optionally backed by a shared Redis cache.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import Settings
+from app.utils import codec
+from app.utils.metrics import OPENAI_CACHE_REQUESTS
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - depends on the environment
+    aioredis = None
+
+
+class CacheBackend:
+    """Shared cache backend interface."""
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        """Return the stored payload and its remaining TTL in seconds (None if unknown), or None."""
+        return None
+
+    async def set(self, key: str, payload: bytes, ttl: int):
+        """Store a payload with a TTL in seconds."""
+
+    async def close(self):
+        """Release backend resources."""
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-backed shared cache so that all workers and pods share hits."""
+
+    def __init__(self, url: str, prefix: str = "openai:completion:"):
+        """Initialize the backend with a Redis URL."""
+        if aioredis is None:
+            raise RuntimeError("The redis package is required for the shared completion cache")
+        self.client = aioredis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self.prefix + key)
+            pipe.pttl(self.prefix + key)
+            payload, remaining_ms = await pipe.execute()
+        if payload is None:
+            return None
+        # PTTL is negative when the key has no expiry or has just expired
+        return payload, remaining_ms / 1000 if remaining_ms >= 0 else None
+
+    async def set(self, key: str, payload: bytes, ttl: int):
+        await self.client.set(self.prefix + key, payload, ex=ttl)
+
+    async def close(self):
+        await self.client.close()
+
+
+class CompletionCache:
+    """Two-level completion cache: a local LRU in front of an optional shared backend."""
+
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_temperature: float = 0.0,
+        backend: Optional[CacheBackend] = None
+    ):
+        """
+        Initialize the completion cache.
+
+        Args:
+            ttl: Seconds an entry stays valid
+            max_entries: Maximum number of entries kept in memory
+            max_bytes: Maximum encoded size of the entries kept in memory
+            max_temperature: Requests above this temperature are not cached (not deterministic)
+            backend: Optional shared backend
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature
+        self.backend = backend
+        # key -> (expires_at, value, size)
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def is_cacheable(self, temperature: float) -> bool:
+        """Whether a request with this temperature is deterministic enough to cache."""
+        return temperature <= self.max_temperature
+
+    @staticmethod
+    def make_key(
+        operation: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int]
+    ) -> str:
+        """Build the cache key for a request."""
+        payload = codec.encode([operation, model, messages, temperature, max_tokens])
+        return hashlib.sha256(payload).hexdigest()
+
+    def _evict(self):
+        """Evict least recently used entries until the cache is within its bounds."""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def _store_local(self, key: str, value: Any, size: int, expires_at: float):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[2]
+        self._entries[key] = (expires_at, value, size)
+        self._bytes += size
+        self._evict()
+
+    async def get(self, key: str, operation: str = "completion") -> Optional[Any]:
+        """Look up a cached value, checking memory first and then the shared backend."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value, size = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                OPENAI_CACHE_REQUESTS.labels(operation, "hit").inc()
+                return value
+            del self._entries[key]
+            self._bytes -= size
+
+        if self.backend is not None:
+            try:
+                found = await self.backend.get(key)
+                if found is not None:
+                    payload, remaining = found
+                    value = codec.decode(payload)
+            except Exception as e:
+                logger.warning(f"Shared completion cache lookup failed: {e}")
+                found = None
+            if found is not None:
+                # The local copy expires with the shared entry, not a full TTL after this hit
+                ttl = self.ttl if remaining is None else min(self.ttl, remaining)
+                self._store_local(key, value, len(payload), time.monotonic() + ttl)
+                self.hits += 1
+                OPENAI_CACHE_REQUESTS.labels(operation, "shared_hit").inc()
+                return value
+
+        self.misses += 1
+        OPENAI_CACHE_REQUESTS.labels(operation, "miss").inc()
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Store a value in memory and in the shared backend."""
+        payload = codec.encode(value)
+        if len(payload) <= self.max_bytes:
+            self._store_local(key, value, len(payload), time.monotonic() + self.ttl)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key, payload, self.ttl)
+            except Exception as e:
+                logger.warning(f"Shared completion cache store failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def close(self):
+        """Close the shared backend."""
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_completion_cache(settings: Settings) -> Optional[CompletionCache]:
+    """Create the completion cache configured in settings, or None if caching is disabled."""
+    if not settings.OPENAI_CACHE_ENABLED:
+        return None
+    backend = None
+    if settings.OPENAI_CACHE_REDIS_URL:
+        try:
+            backend = RedisCacheBackend(settings.OPENAI_CACHE_REDIS_URL)
+        except Exception as e:
+            logger.error(f"Shared completion cache disabled: {e}")
+    return CompletionCache(
+        ttl=settings.OPENAI_CACHE_TTL_SECONDS,
+        max_entries=settings.OPENAI_CACHE_MAX_ENTRIES,
+        max_bytes=settings.OPENAI_CACHE_MAX_BYTES,
+        max_temperature=settings.OPENAI_CACHE_MAX_TEMPERATURE,
+        backend=backend
+    )
@@ -0,0 +1,202 @@
+"""
+Request hedging for the Python service.
+This module cuts tail latency of upstream completions: when a call has not answered within the
+recent p95 latency a duplicate is sent and the first result wins, and retryable errors are retried
+with jittered backoff. Hedges and retries share a budget capped at a percentage of requests.
+"""
+
+import asyncio
+import random
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple, Type
+
+from loguru import logger
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+from app.config import Settings
+from app.utils.metrics import OPENAI_HEDGED_REQUESTS, OPENAI_RETRIED_REQUESTS
+
+# Upstream errors worth another attempt
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (
+    RateLimitError,
+    APITimeoutError,
+    APIConnectionError,
+    InternalServerError,
+)
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies."""
+
+    def __init__(self, window: int = 512):
+        """Initialize the tracker with the number of samples to keep."""
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        """Add a latency sample."""
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the ``q`` quantile of the window, or None without samples."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RetryBudget:
+    """Caps extra attempts (hedges and retries) to a percentage of requests.
+
+    Every request deposits ``percent / 100`` of a token and every extra attempt spends a whole one,
+    so extra traffic stays within the percentage over time with a small burst allowance.
+    """
+
+    def __init__(self, percent: float = 10.0, max_tokens: float = 10.0):
+        """
+        Initialize the budget.
+
+        Args:
+            percent: Extra attempts allowed per 100 requests
+            max_tokens: Burst of extra attempts that may accumulate
+        """
+        self.ratio = percent / 100.0
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        """Credit the budget for a new request."""
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one extra attempt from the budget if available."""
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Hedger:
+    """Runs upstream calls with hedging and retries."""
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        min_delay: float = 0.5,
+        min_samples: int = 20,
+        budget_percent: float = 10.0,
+        max_retries: int = 2,
+        base_delay: float = 0.25,
+        max_delay: float = 5.0
+    ):
+        """
+        Initialize the hedger.
+
+        Args:
+            quantile: Latency quantile after which a hedge is sent
+            min_delay: Lower bound for the hedge delay in seconds
+            min_samples: Latency samples needed before hedging starts
+            budget_percent: Extra attempts allowed per 100 requests
+            max_retries: Retries per request on retryable errors
+            base_delay: Base of the exponential retry backoff in seconds
+            max_delay: Upper bound for the retry backoff in seconds
+        """
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latencies = LatencyTracker()
+        self.budget = RetryBudget(budget_percent)
+
+    def record_latency(self, seconds: float):
+        """Record the latency of a successful upstream call."""
+        self.latencies.record(seconds)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None until enough latencies are known."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.latencies.quantile(self.quantile))
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the upstream sends one."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(self.max_delay, float(retry_after)))
+            except ValueError:
+                pass
+        return delay
+
+    async def run(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Call ``fn`` with hedging, retrying retryable errors within the budget."""
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(fn)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                if not self.budget.try_spend():
+                    logger.warning(f"Retry budget exhausted, not retrying: {e}")
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                OPENAI_RETRIED_REQUESTS.labels(type(e).__name__).inc()
+                logger.info(f"Retrying upstream call in {delay:.2f}s (attempt {attempt}): {e}")
+                await asyncio.sleep(delay)
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Call ``fn`` and send a duplicate if it is slower than the hedge delay."""
+        delay = self.hedge_delay()
+        if delay is None:
+            return await fn()
+
+        primary = asyncio.create_task(fn())
+        roles = {primary: "primary"}
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            if not self.budget.try_spend():
+                OPENAI_HEDGED_REQUESTS.labels("budget_exhausted").inc()
+                return await primary
+
+            roles[asyncio.create_task(fn())] = "hedge"
+            pending = set(roles)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        OPENAI_HEDGED_REQUESTS.labels(f"{roles[task]}_won").inc()
+                        return task.result()
+                    error = error or task.exception()
+            # Both attempts failed
+            raise error
+        finally:
+            # The loser is cancelled, which aborts its HTTP request and frees its limiter slot
+            for task in roles:
+                task.cancel()
+
+
+def create_hedger(settings: Settings) -> Optional[Hedger]:
+    """Create the hedger configured in settings, or None if hedging is disabled."""
+    if not settings.OPENAI_HEDGING_ENABLED:
+        return None
+    return Hedger(
+        quantile=settings.OPENAI_HEDGE_QUANTILE,
+        min_delay=settings.OPENAI_HEDGE_MIN_DELAY_MS / 1000,
+        min_samples=settings.OPENAI_HEDGE_MIN_SAMPLES,
+        budget_percent=settings.OPENAI_HEDGE_BUDGET_PERCENT,
+        max_retries=settings.OPENAI_RETRY_MAX_RETRIES,
+        base_delay=settings.OPENAI_RETRY_BASE_DELAY_MS / 1000,
+        max_delay=settings.OPENAI_RETRY_MAX_DELAY_MS / 1000
+    )
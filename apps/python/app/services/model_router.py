@@ -0,0 +1,225 @@
+"""
+Model router for the Python service.
+This module chooses the model and API key each upstream call goes to. Backends (a model with an
+API key) are picked at random in proportion to their configured weight, scaled by their rolling
+latency and error rate so that traffic concentrates on the fastest healthy backend, and a backend
+that answered 429 is left alone until its Retry-After has passed. Each call gets a plan: the chosen
+backend, then the others for the same model, then the fallback models.
+"""
+
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from app.config import Settings
+from app.services.token_counter import context_window
+
+# Weight of a new sample in the rolling latency and error rate
+EWMA_ALPHA = 0.2
+# Latency is squared in the score, so a backend twice as fast gets four times the traffic
+LATENCY_EXPONENT = 2
+# Share of traffic a backend with a 100% error rate still gets, so that recovery is noticed
+MIN_HEALTH = 0.05
+
+
+class UnknownModelError(ValueError):
+    """Raised when a request names a model that is not configured."""
+
+    def __init__(self, model: str, allowed: Iterable[str]):
+        self.model = model
+        super().__init__(f"Model {model} is not available (configured: {', '.join(sorted(allowed))})")
+
+
+def parse_model_weights(value: str) -> Dict[str, float]:
+    """Parse ``"model=weight,..."`` into a weight per model (a model without a weight gets 1)."""
+    weights: Dict[str, float] = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip():
+            weights[name.strip()] = max(0.0, float(weight)) if weight.strip() else 1.0
+    return weights
+
+
+class BackendStats:
+    """Rolling latency per operation, error rate and rate-limit cooldown of a backend."""
+
+    def __init__(self):
+        self.latency: Dict[str, float] = {}
+        self.error_rate = 0.0
+        self.requests = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, operation: str, seconds: float):
+        """Fold in a successful call's latency (total for completions, to first token for streams)."""
+        previous = self.latency.get(operation)
+        self.latency[operation] = seconds if previous is None else previous + EWMA_ALPHA * (seconds - previous)
+        self.error_rate -= EWMA_ALPHA * self.error_rate
+        self.requests += 1
+
+    def record_failure(self, cooldown: float = 0.0):
+        """Fold in a failed call, keeping the backend out of rotation for ``cooldown`` seconds."""
+        self.error_rate += EWMA_ALPHA * (1 - self.error_rate)
+        self.requests += 1
+        if cooldown > 0:
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+
+    @property
+    def cooling_down(self) -> bool:
+        """Whether the backend is waiting out a rate limit."""
+        return time.monotonic() < self.cooldown_until
+
+
+class Backend:
+    """A model reached with one API key."""
+
+    def __init__(self, model: str, key_index: int, api_key: str, weight: float):
+        self.model = model
+        self.key_index = key_index
+        self.api_key = api_key
+        self.weight = weight
+        self.stats = BackendStats()
+
+    @property
+    def name(self) -> str:
+        """Name for logs and stats; the key is identified by its position, never its value."""
+        return f"{self.model}#{self.key_index}"
+
+    def to_dict(self) -> Dict[str, object]:
+        """Describe the backend and its rolling stats."""
+        return {
+            "name": self.name,
+            "model": self.model,
+            "key": self.key_index,
+            "weight": self.weight,
+            "latency_seconds": {operation: round(value, 4) for operation, value in self.stats.latency.items()},
+            "error_rate": round(self.stats.error_rate, 4),
+            "requests": self.stats.requests,
+            "cooling_down": self.stats.cooling_down,
+        }
+
+
+class ModelRouter:
+    """Plans which backends serve a request."""
+
+    def __init__(
+        self,
+        default_model: str,
+        routes: Optional[Dict[str, float]] = None,
+        fallbacks: Optional[List[str]] = None,
+        api_keys: Optional[List[str]] = None,
+        max_attempts: int = 3,
+        context_window_override: int = 0
+    ):
+        """
+        Initialize the router.
+
+        Args:
+            default_model: Model used when no routes are configured
+            routes: Weight per model for requests that don't name a model
+            fallbacks: Models tried in order when the routed model is rate limited or times out
+            api_keys: Keys each model is reached with; traffic is spread evenly across them
+            max_attempts: Upstream attempts per request, including fallbacks
+            context_window_override: Context window for every model (0 = the model's known window)
+        """
+        self.default_model = default_model
+        self.routes = routes or {default_model: 1.0}
+        self.fallbacks = [model for model in fallbacks or [] if model]
+        self.max_attempts = max(1, max_attempts)
+        self.context_window_override = context_window_override
+        keys = api_keys or [""]
+        self.backends: Dict[str, List[Backend]] = {}
+        for model in [*self.routes, *self.fallbacks]:
+            if model not in self.backends:
+                weight = self.routes.get(model, 1.0) / len(keys)
+                self.backends[model] = [Backend(model, index, key, weight) for index, key in enumerate(keys)]
+
+    @property
+    def models(self) -> List[str]:
+        """Models requests may name."""
+        return list(self.backends)
+
+    @property
+    def can_fall_back(self) -> bool:
+        """Whether a failed attempt may be retried on another backend."""
+        return self.max_attempts > 1 and sum(len(backends) for backends in self.backends.values()) > 1
+
+    def pool(self, model: Optional[str] = None) -> List[str]:
+        """Return the models a request is routed across before any fallback.
+
+        Raises:
+            UnknownModelError: If ``model`` is not configured
+        """
+        if model is None:
+            return [name for name, weight in self.routes.items() if weight > 0] or list(self.routes)
+        if model not in self.backends:
+            raise UnknownModelError(model, self.backends)
+        return [model]
+
+    def context_window(self, model: Optional[str] = None) -> int:
+        """Return the context window a request must fit: the smallest in its routing pool."""
+        return min(context_window(name, self.context_window_override) for name in self.pool(model))
+
+    def _score(self, backend: Backend, operation: str, fastest: Optional[float]) -> float:
+        """Relative share of traffic for a backend."""
+        score = backend.weight * max(MIN_HEALTH, 1 - backend.stats.error_rate)
+        latency = backend.stats.latency.get(operation)
+        if latency and fastest:
+            score *= (fastest / latency) ** LATENCY_EXPONENT
+        return score
+
+    def _order(self, backends: List[Backend], operation: str) -> List[Backend]:
+        """Order backends for trying: a weighted random pick first, then by score; cooling ones last."""
+        known = [backend.stats.latency[operation] for backend in backends if operation in backend.stats.latency]
+        fastest = min(known) if known else None
+        # A backend without samples is scored as if it were the fastest, so that it gets tried
+        scores = {backend.name: self._score(backend, operation, fastest) for backend in backends}
+        ready = [backend for backend in backends if not backend.stats.cooling_down and scores[backend.name] > 0]
+        cooling = sorted(
+            (backend for backend in backends if backend not in ready),
+            key=lambda backend: backend.stats.cooldown_until
+        )
+        if not ready:
+            return cooling
+        first = random.choices(ready, weights=[scores[backend.name] for backend in ready])[0]
+        rest = sorted((backend for backend in ready if backend is not first), key=lambda b: -scores[b.name])
+        return [first, *rest, *cooling]
+
+    def plan(self, model: Optional[str] = None, operation: str = "completion", required_tokens: int = 0) -> List[Backend]:
+        """
+        Return the backends to try for a request, in order.
+
+        Args:
+            model: Model named by the request, or None to use the routes
+            operation: completion or stream; latencies are compared per operation
+            required_tokens: Prompt plus completion tokens; fallback models with a smaller
+                context window are skipped
+
+        Raises:
+            UnknownModelError: If ``model`` is not configured
+        """
+        pool = self.pool(model)
+        plan = self._order([backend for name in pool for backend in self.backends[name]], operation)
+        for fallback in self.fallbacks:
+            if fallback in pool:
+                continue
+            if required_tokens > context_window(fallback, self.context_window_override):
+                continue
+            plan.extend(self._order(self.backends[fallback], operation))
+        return plan[:self.max_attempts]
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Describe every backend and its rolling stats."""
+        return [backend.to_dict() for backends in self.backends.values() for backend in backends]
+
+
+def create_model_router(settings: Settings) -> ModelRouter:
+    """Create the model router configured in settings."""
+    api_keys = [key.strip() for key in settings.OPENAI_API_KEYS.split(",") if key.strip()]
+    return ModelRouter(
+        default_model=settings.OPENAI_MODEL,
+        routes=parse_model_weights(settings.OPENAI_MODEL_ROUTES) or None,
+        fallbacks=[model.strip() for model in settings.OPENAI_FALLBACK_MODELS.split(",")],
+        api_keys=api_keys or [settings.OPENAI_API_KEY],
+        max_attempts=settings.OPENAI_ROUTE_MAX_ATTEMPTS,
+        context_window_override=settings.OPENAI_CONTEXT_WINDOW
+    )
@@ -3,23 +3,206 @@ OpenAI service for the Python service.
 This module provides functionality for interacting with the OpenAI API.
 """
 
-import json
-from typing import AsyncGenerator, Dict, List, Optional, Any
-from openai import AsyncOpenAI
+import asyncio
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict, List, Optional, Any, Tuple
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
 from loguru import logger
 from app.config import get_settings
+from app.utils.circuit_breaker import get_circuit_breaker
+from app.utils.http_client import get_http_client
+from app.services.completion_cache import CompletionCache, create_completion_cache
+from app.services.single_flight import SingleFlight, StreamFlights
+from app.services.hedging import create_hedger
+from app.services.model_router import Backend, create_model_router
+from app.services.rate_limiter import (
+    DEFAULT,
+    DEFAULT_COMPLETION_TOKENS,
+    INTERACTIVE,
+    Permit,
+    create_upstream_limiter,
+)
+from app.services.token_counter import ContextLengthError, create_token_counter
+from app.utils.metrics import (
+    OPENAI_CONTEXT_OVERFLOWS,
+    OPENAI_FALLBACKS,
+    OPENAI_REQUEST_DURATION,
+    OPENAI_STREAM_TTFT,
+    OPENAI_STREAM_TOKENS_PER_SECOND,
+    OPENAI_TOKENS,
+)
 
 # Get settings
 settings = get_settings()
 
+# Errors after which a request moves on to the next backend of its route plan
+FALLBACK_ERRORS = (RateLimitError, APITimeoutError, asyncio.TimeoutError)
+# Errors that count against a backend's health (client errors such as 400 do not)
+BACKEND_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
 class OpenAIService:
     """Service for interacting with the OpenAI API."""
     
     def __init__(self):
         """Initialize the OpenAI service."""
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # One client per API key
+        self._clients: Dict[int, AsyncOpenAI] = {}
         self.model = settings.OPENAI_MODEL
-        logger.info(f"OpenAI service initialized with model: {self.model}")
+        # Spreads requests across models and keys and falls back on 429s and timeouts
+        self.router = create_model_router(settings)
+        self.fallback_timeout = settings.OPENAI_FALLBACK_TIMEOUT_SECONDS
+        self.cache = create_completion_cache(settings)
+        # Concurrent identical requests share one upstream call
+        self.single_flight_enabled = settings.OPENAI_SINGLE_FLIGHT_ENABLED
+        self.completion_flights = SingleFlight("completion")
+        self.stream_flights = StreamFlights()
+        # Bounds concurrent and per-minute upstream usage
+        self.limiter = create_upstream_limiter(settings)
+        # Counts prompt tokens so oversized prompts are caught before the upstream call
+        self.token_counter = create_token_counter(settings)
+        self.truncate_overflow = settings.OPENAI_CONTEXT_OVERFLOW == "truncate"
+        # Hedges slow completions and retries retryable errors (opt-in)
+        self.hedger = create_hedger(settings)
+        # Fails fast while the upstream is unreachable or erroring (429s are left to the limiter)
+        self.breaker = get_circuit_breaker(
+            "openai", is_failure=lambda e: isinstance(e, (APIConnectionError, InternalServerError))
+        )
+        logger.info(f"OpenAI service initialized with models: {', '.join(self.router.models)}")
+    
+    def client_for(self, backend: Backend) -> AsyncOpenAI:
+        """The OpenAI client for a backend's API key, built on the shared HTTP connection pool on first use."""
+        client = self._clients.get(backend.key_index)
+        if client is None:
+            client = self._clients[backend.key_index] = AsyncOpenAI(
+                api_key=backend.api_key,
+                base_url=settings.OPENAI_BASE_URL or None,
+                http_client=get_http_client(),
+                # The hedger and the model router retry on their own, so the client must not
+                max_retries=0 if self.hedger or self.router.can_fall_back else 2
+            )
+        return client
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """The OpenAI client for the first API key."""
+        return self.client_for(self.router.backends[self.router.pool()[0]][0])
+    
+    @client.setter
+    def client(self, client: AsyncOpenAI):
+        self._clients[0] = client
+    
+    async def close(self):
+        """Release resources held by the service."""
+        if self.cache:
+            await self.cache.close()
+        # The shared HTTP client is closed separately; drop the references so they are rebuilt on reuse
+        self._clients.clear()
+    
+    @staticmethod
+    def _build_messages(prompt: str, system_message: Optional[str] = None) -> List[Dict[str, str]]:
+        """Build the chat messages for a prompt."""
+        messages = []
+        
+        # Add system message if provided
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        
+        # Add user message
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _fit_context(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int],
+        model: Optional[str] = None
+    ) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Check that a request fits in the context window of the models it is routed to.
+        
+        With OPENAI_CONTEXT_OVERFLOW=truncate, a prompt that is too long is cut to fit; the system
+        message is never truncated.
+        
+        Args:
+            messages: The chat messages, ending with the user prompt
+            max_tokens: Maximum number of tokens to generate
+            model: Model named by the request, or None to use the routes
+            
+        Returns:
+            The messages to send and their prompt token count
+            
+        Raises:
+            ContextLengthError: If the request does not fit
+            UnknownModelError: If ``model`` is not configured
+        """
+        window = self.router.context_window(model)
+        counting_model = self.router.pool(model)[0]
+        prompt_tokens = self.token_counter.count_messages(messages, counting_model)
+        budget = window - (max_tokens or 0)
+        if prompt_tokens <= budget:
+            return messages, prompt_tokens
+        
+        if self.truncate_overflow:
+            prompt = messages[-1]["content"]
+            other_tokens = prompt_tokens - self.token_counter.count(prompt, counting_model)
+            if budget > other_tokens:
+                truncated = self.token_counter.truncate(prompt, budget - other_tokens, counting_model)
+                OPENAI_CONTEXT_OVERFLOWS.labels(counting_model, "truncated").inc()
+                logger.warning(f"Truncated a prompt of {prompt_tokens} tokens to the {budget} tokens available")
+                messages = messages[:-1] + [{**messages[-1], "content": truncated}]
+                return messages, other_tokens + self.token_counter.count(truncated, counting_model)
+        
+        OPENAI_CONTEXT_OVERFLOWS.labels(counting_model, "rejected").inc()
+        raise ContextLengthError(counting_model, prompt_tokens, max_tokens, window)
+    
+    @staticmethod
+    def _cooldown(error: BaseException) -> float:
+        """Seconds to keep a rate-limited backend out of rotation, from Retry-After when sent."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(retry_after) if retry_after else settings.OPENAI_ROUTE_COOLDOWN_SECONDS
+        except ValueError:
+            return settings.OPENAI_ROUTE_COOLDOWN_SECONDS
+    
+    def _record_failure(self, backend: Backend, error: BaseException):
+        """Count an upstream error against the backend's health."""
+        if isinstance(error, RateLimitError):
+            self.limiter.record_rate_limited()
+            backend.stats.record_failure(self._cooldown(error))
+        elif isinstance(error, BACKEND_ERRORS):
+            backend.stats.record_failure()
+    
+    def _fall_back(self, backend: Backend, next_backend: Backend, error: BaseException):
+        """Record that a request is moving on from a rate-limited or slow backend."""
+        reason = "rate_limited" if isinstance(error, RateLimitError) else "timeout"
+        if isinstance(error, asyncio.TimeoutError):
+            # The attempt was cancelled before it could record its own failure
+            backend.stats.record_failure()
+        OPENAI_FALLBACKS.labels(backend.model, reason).inc()
+        logger.warning(f"OpenAI backend {backend.name} {reason.replace('_', ' ')}, trying {next_backend.name}")
+    
+    def _attempt_timeout(self, attempt: int, plan: List[Backend]) -> Optional[float]:
+        """Time an attempt gets before the next backend is tried; the last attempt is not cut short."""
+        if self.fallback_timeout > 0 and attempt < len(plan) - 1:
+            return self.fallback_timeout
+        return None
+    
+    def _request_key(
+        self,
+        operation: str,
+        model: Optional[str],
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int]
+    ) -> str:
+        """Return the key identifying identical requests."""
+        return CompletionCache.make_key(operation, model or self.model, messages, temperature, max_tokens)
+    
+    def _is_cacheable(self, temperature: float, bypass_cache: bool) -> bool:
+        """Whether a request may be served from and stored in the cache."""
+        return bool(self.cache) and not bypass_cache and self.cache.is_cacheable(temperature)
     
     async def generate_completion(
         self, 
@@ -27,7 +210,10 @@ class OpenAIService:
         system_message: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
-        stream: bool = False
+        stream: bool = False,
+        bypass_cache: bool = False,
+        priority: str = DEFAULT,
+        model: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a completion using the OpenAI API.
@@ -38,29 +224,98 @@ class OpenAIService:
             temperature: Controls randomness (0-1)
             max_tokens: Maximum number of tokens to generate
             stream: Whether to stream the response
+            bypass_cache: Skip the completion cache for this request
+            priority: Admission priority for the upstream limiter (interactive, default or batch)
+            model: A configured model to use instead of the routes
             
         Returns:
             The completion response
+            
+        Raises:
+            ContextLengthError: If the request does not fit in the model's context window
+            UnknownModelError: If ``model`` is not configured
         """
+        messages, prompt_tokens = self._fit_context(self._build_messages(prompt, system_message), max_tokens, model)
+        key = self._request_key("completion", model, messages, temperature, max_tokens)
+        cacheable = self._is_cacheable(temperature, bypass_cache)
+        
+        # Deterministic requests are served from the cache when possible
+        if cacheable:
+            cached = await self.cache.get(key, "completion")
+            if cached is not None:
+                return cached
+        
+        async def fetch() -> Dict[str, Any]:
+            if self.hedger:
+                result = await self.hedger.run(
+                    lambda: self._create_completion(messages, prompt_tokens, temperature, max_tokens, priority, model)
+                )
+            else:
+                result = await self._create_completion(messages, prompt_tokens, temperature, max_tokens, priority, model)
+            if cacheable:
+                await self.cache.set(key, result)
+            return result
+        
+        # Identical in-flight requests share one upstream call; bypass_cache asks for a fresh one
+        if self.single_flight_enabled and not bypass_cache:
+            return await self.completion_flights.do(key, fetch)
+        return await fetch()
+    
+    async def _create_completion(
+        self,
+        messages: List[Dict[str, str]],
+        prompt_tokens: int,
+        temperature: float,
+        max_tokens: Optional[int],
+        priority: str = DEFAULT,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Request a completion from the upstream API, falling back along the route plan."""
+        async with self.breaker.guard():
+            tokens = prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+            async with self.limiter.limit(priority, tokens) as permit:
+                plan = self.router.plan(model, "completion", tokens)
+                for attempt, backend in enumerate(plan):
+                    try:
+                        return await asyncio.wait_for(
+                            self._request_completion(backend, messages, temperature, max_tokens, permit),
+                            self._attempt_timeout(attempt, plan)
+                        )
+                    except FALLBACK_ERRORS as e:
+                        if attempt == len(plan) - 1:
+                            raise
+                        self._fall_back(backend, plan[attempt + 1], e)
+    
+    async def _request_completion(
+        self,
+        backend: Backend,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        permit: Permit
+    ) -> Dict[str, Any]:
+        """Call a backend once admitted by the limiter."""
+        start = time.perf_counter()
         try:
-            messages = []
-            
-            # Add system message if provided
-            if system_message:
-                messages.append({"role": "system", "content": system_message})
-            
-            # Add user message
-            messages.append({"role": "user", "content": prompt})
-            
             # Create completion
-            response = await self.client.chat.completions.create(
-                model=self.model,
+            response = await self.client_for(backend).chat.completions.create(
+                model=backend.model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
                 stream=False  # We don't stream here
             )
             
+            elapsed = time.perf_counter() - start
+            permit.settle(response.usage.total_tokens)
+            self.limiter.record_success()
+            backend.stats.record_success("completion", elapsed)
+            if self.hedger:
+                self.hedger.record_latency(elapsed)
+            OPENAI_REQUEST_DURATION.labels(backend.model, "completion", "success").observe(elapsed)
+            OPENAI_TOKENS.labels(backend.model, "prompt").inc(response.usage.prompt_tokens)
+            OPENAI_TOKENS.labels(backend.model, "completion").inc(response.usage.completion_tokens)
+            
             return {
                 "content": response.choices[0].message.content,
                 "finish_reason": response.choices[0].finish_reason,
@@ -72,41 +327,166 @@ class OpenAIService:
                 }
             }
         except Exception as e:
-            logger.error(f"Error generating completion: {e}")
+            self._record_failure(backend, e)
+            OPENAI_REQUEST_DURATION.labels(backend.model, "completion", "error").observe(
+                time.perf_counter() - start
+            )
+            logger.error(f"Error generating completion with {backend.name}: {e}")
             raise
     
-    async def stream_completion(
+    def stream_completion(
         self, 
         prompt: str, 
         system_message: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        bypass_cache: bool = False,
+        priority: str = INTERACTIVE,
+        model: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
         Stream a completion using the OpenAI API.
         
+        The request is checked against the context window when this is called, before the stream
+        is iterated, so that callers can reject it before they start a response.
+        
         Args:
             prompt: The user prompt to generate a completion for
             system_message: Optional system message to set the context
             temperature: Controls randomness (0-1)
             max_tokens: Maximum number of tokens to generate
+            bypass_cache: Skip the completion cache for this request
+            priority: Admission priority for the upstream limiter (streams are interactive by default)
+            model: A configured model to use instead of the routes
             
-        Yields:
-            Chunks of the completion response
+        Returns:
+            An async generator of the chunks of the completion response
+            
+        Raises:
+            ContextLengthError: If the request does not fit in the model's context window
+            UnknownModelError: If ``model`` is not configured
         """
+        messages, prompt_tokens = self._fit_context(self._build_messages(prompt, system_message), max_tokens, model)
+        return self._stream_fitted(messages, prompt_tokens, temperature, max_tokens, bypass_cache, priority, model)
+    
+    async def _stream_fitted(
+        self,
+        messages: List[Dict[str, str]],
+        prompt_tokens: int,
+        temperature: float,
+        max_tokens: Optional[int],
+        bypass_cache: bool,
+        priority: str,
+        model: Optional[str]
+    ) -> AsyncGenerator[str, None]:
+        """Stream a completion of messages that fit in the context window, from the cache if possible."""
+        key = self._request_key("stream", model, messages, temperature, max_tokens)
+        cacheable = self._is_cacheable(temperature, bypass_cache)
+        
+        # Replay the stored chunks of a cached stream
+        if cacheable:
+            cached = await self.cache.get(key, "stream")
+            if cached is not None:
+                for chunk in cached:
+                    yield chunk
+                return
+        
+        async def fetch() -> AsyncGenerator[str, None]:
+            chunks: List[str] = []
+            async with aclosing(
+                self._stream_upstream(messages, prompt_tokens, temperature, max_tokens, priority, model)
+            ) as upstream:
+                async for chunk in upstream:
+                    chunks.append(chunk)
+                    yield chunk
+            # Only streams that ran to completion are cached
+            if cacheable:
+                await self.cache.set(key, chunks)
+        
+        # Subscribers of an identical in-flight stream get the chunks they missed, then live chunks
+        if self.single_flight_enabled and not bypass_cache:
+            source = self.stream_flights.subscribe(key, fetch)
+        else:
+            source = fetch()
+        # aclosing releases the upstream stream as soon as the consumer stops
+        async with aclosing(source):
+            async for chunk in source:
+                yield chunk
+    
+    async def _stream_upstream(
+        self,
+        messages: List[Dict[str, str]],
+        prompt_tokens: int,
+        temperature: float,
+        max_tokens: Optional[int],
+        priority: str = INTERACTIVE,
+        model: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream a completion from the upstream API, holding a limiter slot for its duration."""
+        tokens = prompt_tokens + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+        async with self.breaker.guard():
+            async with self.limiter.limit(priority, tokens) as permit:
+                backend, upstream, first = await self._open_stream(messages, temperature, max_tokens, model, tokens)
+                completion_tokens = 0
+                async with aclosing(upstream):
+                    if first is not None:
+                        completion_tokens += 1
+                        yield first
+                    async for chunk in upstream:
+                        completion_tokens += 1
+                        yield chunk
+                # Each content delta carries roughly one token
+                permit.settle(prompt_tokens + completion_tokens)
+                OPENAI_TOKENS.labels(backend.model, "prompt").inc(prompt_tokens)
+                OPENAI_TOKENS.labels(backend.model, "completion").inc(completion_tokens)
+    
+    async def _open_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int],
+        model: Optional[str],
+        tokens: int
+    ) -> Tuple[Backend, AsyncGenerator[str, None], Optional[str]]:
+        """
+        Start a stream on the first backend of the route plan that produces a token.
+        
+        A backend that is rate limited or times out before its first token is replaced by the next
+        one; once a token has been received the stream stays on its backend.
+        
+        Returns:
+            The backend, its stream and the first chunk (None if the stream was empty)
+        """
+        plan = self.router.plan(model, "stream", tokens)
+        for attempt, backend in enumerate(plan):
+            upstream = self._request_stream(backend, messages, temperature, max_tokens)
+            try:
+                first = await asyncio.wait_for(anext(upstream, None), self._attempt_timeout(attempt, plan))
+                return backend, upstream, first
+            except FALLBACK_ERRORS as e:
+                await upstream.aclose()
+                if attempt == len(plan) - 1:
+                    raise
+                self._fall_back(backend, plan[attempt + 1], e)
+            except BaseException:
+                await upstream.aclose()
+                raise
+    
+    async def _request_stream(
+        self,
+        backend: Backend,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: Optional[int]
+    ) -> AsyncGenerator[str, None]:
+        """Call a backend's streaming API once admitted by the limiter."""
+        start = time.perf_counter()
+        first_token_at = None
+        token_count = 0
         try:
-            messages = []
-            
-            # Add system message if provided
-            if system_message:
-                messages.append({"role": "system", "content": system_message})
-            
-            # Add user message
-            messages.append({"role": "user", "content": prompt})
-            
             # Create streaming completion
-            stream = await self.client.chat.completions.create(
-                model=self.model,
+            stream = await self.client_for(backend).chat.completions.create(
+                model=backend.model,
                 messages=messages,
                 temperature=temperature,
                 max_tokens=max_tokens,
@@ -116,8 +496,26 @@ class OpenAIService:
             # Yield chunks
             async for chunk in stream:
                 if chunk.choices[0].delta.content is not None:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        backend.stats.record_success("stream", first_token_at - start)
+                        OPENAI_STREAM_TTFT.labels(backend.model).observe(first_token_at - start)
+                    # Each content delta carries roughly one token
+                    token_count += 1
                     yield chunk.choices[0].delta.content
+            
+            self.limiter.record_success()
+            OPENAI_REQUEST_DURATION.labels(backend.model, "stream", "success").observe(
+                time.perf_counter() - start
+            )
+            if first_token_at is not None:
+                elapsed = time.perf_counter() - first_token_at
+                if elapsed > 0:
+                    OPENAI_STREAM_TOKENS_PER_SECOND.labels(backend.model).observe(token_count / elapsed)
         except Exception as e:
-            logger.error(f"Error streaming completion: {e}")
-            yield json.dumps({"error": str(e)})
-            raise 
\ No newline at end of file
+            self._record_failure(backend, e)
+            OPENAI_REQUEST_DURATION.labels(backend.model, "stream", "error").observe(
+                time.perf_counter() - start
+            )
+            logger.error(f"Error streaming completion with {backend.name}: {e}")
+            raise
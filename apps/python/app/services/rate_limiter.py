@@ -0,0 +1,204 @@
+"""
+Upstream rate limiter for the Python service.
+This module bounds the calls OpenAIService makes upstream: a concurrency limit that backs off on
+429s, token buckets for requests/min and tokens/min, and a priority queue so that interactive
+streams are admitted before batch work.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import Settings
+from app.utils.metrics import OPENAI_LIMITER_QUEUE_WAIT
+
+# Priorities (lower is admitted first)
+INTERACTIVE = "interactive"
+DEFAULT = "default"
+BATCH = "batch"
+PRIORITIES: Dict[str, int] = {INTERACTIVE: 0, DEFAULT: 1, BATCH: 2}
+
+# Tokens assumed for the completion when the request sets no max_tokens
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket.
+
+        Args:
+            per_minute: Refill rate
+            capacity: Burst size (defaults to one minute of tokens)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        needed = min(amount, self.capacity) - self.tokens
+        return max(0.0, needed / self.rate) if needed > 0 else 0.0
+
+    def consume(self, amount: float):
+        """Take tokens; the balance may go negative when a request exceeds the capacity."""
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        """Return tokens (or take more when ``amount`` is negative)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Permit:
+    """Admission granted by the limiter."""
+
+    __slots__ = ("limiter", "tokens")
+
+    def __init__(self, limiter: "UpstreamLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, actual_tokens: int):
+        """Correct the token bucket once the actual usage is known."""
+        if self.limiter.token_bucket is not None:
+            self.limiter.token_bucket.refund(self.tokens - actual_tokens)
+        self.tokens = actual_tokens
+
+
+class UpstreamLimiter:
+    """Admits upstream calls by priority within concurrency and rate limits."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        adaptive: bool = True
+    ):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrency: Maximum concurrent upstream calls
+            requests_per_minute: Request rate limit (0 = unlimited)
+            tokens_per_minute: Token rate limit (0 = unlimited)
+            adaptive: Halve the concurrency limit on 429s and grow it back on successes
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self.adaptive = adaptive
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.in_flight = 0
+        self._successes = 0
+        # Heap of (priority, sequence, tokens, future)
+        self._waiters: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def queued(self) -> int:
+        """Number of calls waiting for admission."""
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def _rate_wait(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.wait_time(1))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.wait_time(tokens))
+        return wait
+
+    def _dispatch(self):
+        """Admit waiters in priority order while capacity and rate budget allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self.in_flight < self.concurrency:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._rate_wait(tokens)
+            if wait > 0:
+                # Keep strict priority order: nothing is admitted ahead of the head waiter
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            if self.request_bucket is not None:
+                self.request_bucket.consume(1)
+            if self.token_bucket is not None:
+                self.token_bucket.consume(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: str = DEFAULT, tokens: int = 0) -> Permit:
+        """Wait for admission."""
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES.get(priority, PRIORITIES[DEFAULT]), next(self._sequence), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller was cancelled
+                self.release()
+            raise
+        OPENAI_LIMITER_QUEUE_WAIT.labels(priority).observe(time.perf_counter() - start)
+        return Permit(self, tokens)
+
+    def release(self):
+        """Return a concurrency slot."""
+        self.in_flight -= 1
+        self._dispatch()
+
+    def record_success(self):
+        """Grow the concurrency limit back (additive increase)."""
+        if not self.adaptive or self.concurrency >= self.max_concurrency:
+            return
+        self._successes += 1
+        if self._successes >= self.concurrency:
+            self._successes = 0
+            self.concurrency += 1
+            self._dispatch()
+
+    def record_rate_limited(self):
+        """Halve the concurrency limit after an upstream 429 (multiplicative decrease)."""
+        if self.adaptive:
+            self.concurrency = max(1, self.concurrency // 2)
+            self._successes = 0
+
+    @asynccontextmanager
+    async def limit(self, priority: str = DEFAULT, tokens: int = 0) -> AsyncIterator[Permit]:
+        """Hold an admission for the duration of the block."""
+        permit = await self.acquire(priority, tokens)
+        try:
+            yield permit
+        finally:
+            self.release()
+
+
+def create_upstream_limiter(settings: Settings) -> UpstreamLimiter:
+    """Create the limiter configured in settings."""
+    return UpstreamLimiter(
+        max_concurrency=settings.OPENAI_MAX_CONCURRENCY,
+        requests_per_minute=settings.OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.OPENAI_TOKENS_PER_MINUTE,
+        adaptive=settings.OPENAI_LIMITER_ADAPTIVE
+    )
@@ -0,0 +1,192 @@
+"""
+Request coalescing for the Python service.
+This module lets concurrent identical requests share one in-flight upstream call. Completions share
+a task; streams share a broadcaster that replays missed chunks to late subscribers before live ones.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from app.utils.metrics import OPENAI_COALESCED_REQUESTS
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls with the same key."""
+
+    def __init__(self, operation: str = "completion"):
+        """Initialize the group; the operation name labels the metrics."""
+        self.operation = operation
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` once for all concurrent callers with the same key and return its result.
+
+        The call runs in its own task, so a cancelled caller does not cancel it for the others.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            OPENAI_COALESCED_REQUESTS.labels(self.operation, "leader").inc()
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            OPENAI_COALESCED_REQUESTS.labels(self.operation, "follower").inc()
+        return await asyncio.shield(task)
+
+
+class StreamBroadcaster:
+    """Fans one source stream out to any number of subscribers.
+
+    Chunks are kept for the lifetime of the stream so that a subscriber joining late first receives
+    the chunks it missed and then the live ones. When the last subscriber leaves, the source is cancelled.
+    """
+
+    def __init__(self, source: AsyncIterator[Any], on_close: Optional[Callable[[], None]] = None):
+        """
+        Initialize the broadcaster.
+
+        Args:
+            source: The upstream stream
+            on_close: Called once the source has finished or been cancelled
+        """
+        self._source = source
+        self._on_close = on_close
+        self._chunks: List[Any] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self._cancelling = False
+        self._task = asyncio.create_task(self._pump())
+
+    @property
+    def done(self) -> bool:
+        """Whether the source has finished."""
+        return self._done
+
+    @property
+    def joinable(self) -> bool:
+        """Whether a new subscriber can still receive the whole stream."""
+        return not self._done and not self._cancelling
+
+    async def _pump(self):
+        """Read the source and wake subscribers for every chunk."""
+        try:
+            async for chunk in self._source:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            # Subscribers get an ordinary error: re-raising CancelledError in them would look like
+            # their own request being cancelled
+            self._error = RuntimeError("upstream stream cancelled")
+        except Exception as e:
+            self._error = e
+        finally:
+            # Close the source explicitly; leaving the loop does not finalize an async generator
+            aclose = getattr(self._source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+            if self._on_close:
+                self._on_close()
+
+    def subscribe(self) -> "StreamSubscription":
+        """Return an iterator of every chunk of the stream, starting from the first one.
+
+        The subscriber is counted right away rather than on its first iteration, so that the last
+        one leaving does not cancel the source under a subscriber that has not started reading.
+        """
+        self._subscribers += 1
+        return StreamSubscription(self)
+
+    def _leave(self):
+        self._subscribers -= 1
+        if self._subscribers == 0 and not self._done:
+            logger.debug("Last stream subscriber left, cancelling upstream stream")
+            self._cancelling = True
+            self._task.cancel()
+
+    async def _iterate(self, leave: Callable[[], None]) -> AsyncGenerator[Any, None]:
+        index = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: index < len(self._chunks) or self._done)
+                    pending = self._chunks[index:]
+                    finished = self._done
+                index += len(pending)
+                for chunk in pending:
+                    yield chunk
+                if finished and index >= len(self._chunks):
+                    break
+            if self._error is not None:
+                raise self._error
+        finally:
+            leave()
+
+
+class StreamSubscription:
+    """A subscriber's iterator over a broadcast stream.
+
+    Closing it leaves the broadcast even if it was never iterated, which closing a generator that
+    has not started would not do.
+    """
+
+    def __init__(self, broadcaster: StreamBroadcaster):
+        """Initialize the subscription of a counted subscriber."""
+        self._broadcaster = broadcaster
+        self._left = False
+        self._chunks = broadcaster._iterate(self._leave)
+
+    def _leave(self):
+        if not self._left:
+            self._left = True
+            self._broadcaster._leave()
+
+    def __aiter__(self) -> "StreamSubscription":
+        return self
+
+    async def __anext__(self) -> Any:
+        return await self._chunks.__anext__()
+
+    async def aclose(self):
+        """Stop receiving chunks and leave the broadcast."""
+        try:
+            await self._chunks.aclose()
+        finally:
+            self._leave()
+
+
+class StreamFlights:
+    """Shares in-flight streams between concurrent identical requests."""
+
+    def __init__(self):
+        """Initialize the group."""
+        self._streams: Dict[str, StreamBroadcaster] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def subscribe(self, key: str, source_factory: Callable[[], AsyncIterator[Any]]) -> StreamSubscription:
+        """Join the in-flight stream for a key, starting it with ``source_factory`` if there is none."""
+        broadcaster = self._streams.get(key)
+        if broadcaster is None or not broadcaster.joinable:
+            OPENAI_COALESCED_REQUESTS.labels("stream", "leader").inc()
+            broadcaster = StreamBroadcaster(source_factory(), on_close=lambda: self._release(key))
+            self._streams[key] = broadcaster
+        else:
+            OPENAI_COALESCED_REQUESTS.labels("stream", "follower").inc()
+        return broadcaster.subscribe()
+
+    def _release(self, key: str):
+        broadcaster = self._streams.get(key)
+        if broadcaster is not None and broadcaster.done:
+            del self._streams[key]
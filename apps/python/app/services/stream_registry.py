@@ -0,0 +1,427 @@
+"""
+Resumable stream registry for the Python service.
+This module decouples a generation from the connection that started it: events go into a
+per-stream ring buffer, and a client reconnecting with ``Last-Event-ID`` resumes from the next
+event without a new upstream call, even while the generation is still running.
+
+With a shared replay backend (a Redis stream per generation) the events are also written there, so
+that a reconnect landing on another worker process or replica resumes from the backend while the
+generation keeps running where it started.
+"""
+
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import Settings
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - depends on the environment
+    aioredis = None
+
+# A buffered event: (sequence number, event name, data)
+StreamEvent = Tuple[int, str, str]
+
+# Event name of the marker that ends a stream in the replay backend
+END_EVENT = "__end__"
+
+# Longest a remote subscriber waits for an event before refreshing its attachment
+MAX_POLL_SECONDS = 5.0
+
+
+class StreamGapError(LookupError):
+    """Raised when the requested events are no longer in the replay buffer."""
+
+
+class ReplayBackend:
+    """Shared replay store interface, so that any worker can resume a stream."""
+
+    async def append(self, stream_id: str, event: StreamEvent, capacity: int, ttl: float):
+        """Store an event, keeping about ``capacity`` events and the stream for ``ttl`` seconds."""
+
+    async def finish(self, stream_id: str, next_seq: int, ttl: float):
+        """Mark the stream as finished after ``next_seq`` events; it is kept for ``ttl`` seconds."""
+
+    async def bounds(self, stream_id: str) -> Optional[Tuple[int, int, bool]]:
+        """Return (oldest sequence, next sequence, finished) of a stored stream, or None."""
+        return None
+
+    async def read(self, stream_id: str, after: int, timeout: float) -> Tuple[List[StreamEvent], bool]:
+        """Return the events after sequence ``after``, waiting up to ``timeout`` seconds for one.
+
+        The flag is True once the end of the stream has been read.
+        """
+        return [], True
+
+    async def attach(self, stream_id: str, ttl: float):
+        """Record that a client is attached to the stream for the next ``ttl`` seconds."""
+
+    async def attached(self, stream_id: str) -> bool:
+        """Whether a client on another worker is attached to the stream."""
+        return False
+
+    async def close(self):
+        """Release backend resources."""
+
+
+class RedisReplayBackend(ReplayBackend):
+    """Replay backend keeping each stream's events in a Redis stream.
+
+    Entry IDs are ``0-<sequence + 1>``, so reads resume from a sequence number without a lookup.
+    """
+
+    def __init__(self, url: str, prefix: str = "openai:stream:"):
+        """Initialize the backend with a Redis URL."""
+        if aioredis is None:
+            raise RuntimeError("The redis package is required for the shared stream replay buffer")
+        self.client = aioredis.from_url(url)
+        self.prefix = prefix
+
+    @staticmethod
+    def _entry_id(sequence: int) -> str:
+        return f"0-{sequence + 1}"
+
+    @staticmethod
+    def _sequence(entry_id: bytes) -> int:
+        return int(entry_id.split(b"-")[1]) - 1
+
+    async def append(self, stream_id: str, event: StreamEvent, capacity: int, ttl: float):
+        sequence, name, data = event
+        key = self.prefix + stream_id
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, {"event": name, "data": data}, id=self._entry_id(sequence), maxlen=capacity, approximate=True)
+            pipe.pexpire(key, int(ttl * 1000))
+            await pipe.execute()
+
+    async def finish(self, stream_id: str, next_seq: int, ttl: float):
+        key = self.prefix + stream_id
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, {"event": END_EVENT, "data": ""}, id=self._entry_id(next_seq))
+            pipe.pexpire(key, int(ttl * 1000))
+            await pipe.execute()
+
+    async def bounds(self, stream_id: str) -> Optional[Tuple[int, int, bool]]:
+        key = self.prefix + stream_id
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.xrange(key, count=1)
+            pipe.xrevrange(key, count=1)
+            first, last = await pipe.execute()
+        if not first:
+            return None
+        last_id, last_fields = last[0]
+        done = last_fields.get(b"event") == END_EVENT.encode()
+        next_seq = self._sequence(last_id) + (0 if done else 1)
+        return self._sequence(first[0][0]), next_seq, done
+
+    async def read(self, stream_id: str, after: int, timeout: float) -> Tuple[List[StreamEvent], bool]:
+        key = self.prefix + stream_id
+        response = await self.client.xread({key: self._entry_id(after)}, count=256, block=max(1, int(timeout * 1000)))
+        events: List[StreamEvent] = []
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                name = fields[b"event"].decode()
+                if name == END_EVENT:
+                    return events, True
+                events.append((self._sequence(entry_id), name, fields[b"data"].decode()))
+        return events, False
+
+    async def attach(self, stream_id: str, ttl: float):
+        await self.client.set(f"{self.prefix}{stream_id}:attached", 1, px=max(1, int(ttl * 1000)))
+
+    async def attached(self, stream_id: str) -> bool:
+        return bool(await self.client.exists(f"{self.prefix}{stream_id}:attached"))
+
+    async def close(self):
+        await self.client.close()
+
+
+class ResumableStream:
+    """A generation whose events are kept in a bounded ring buffer for replay."""
+
+    def __init__(
+        self,
+        stream_id: str,
+        source: AsyncIterator[Tuple[str, str]],
+        capacity: int = 1024,
+        ttl: float = 300.0,
+        grace: float = 30.0,
+        backend: Optional[ReplayBackend] = None
+    ):
+        """
+        Initialize the stream and start consuming the source.
+
+        Args:
+            stream_id: Identifier used in event IDs
+            source: Stream of (event name, data) pairs
+            capacity: Events kept for replay
+            ttl: Seconds a finished stream stays resumable
+            grace: Seconds a generation keeps running with no client attached
+            backend: Optional shared replay backend the events are also written to
+        """
+        self.id = stream_id
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.grace = grace
+        self.backend = backend
+        self.done = False
+        self.expires_at: Optional[float] = None
+        self._source = source
+        self._events: Deque[StreamEvent] = deque(maxlen=self.capacity)
+        self._next_seq = 0
+        self._changed = asyncio.Condition()
+        # Subscriber token -> next sequence number it needs
+        self._positions: Dict[int, int] = {}
+        self._tokens = itertools.count()
+        self._grace_timer: Optional[asyncio.TimerHandle] = None
+        self._grace_check: Optional[asyncio.Task] = None
+        self._task = asyncio.create_task(self._run())
+
+    def _oldest_seq(self) -> int:
+        return self._events[0][0] if self._events else self._next_seq
+
+    def _has_room(self) -> bool:
+        # Never overwrite events a connected subscriber has not read yet
+        if not self._positions:
+            return True
+        return self._next_seq - min(self._positions.values()) < self.capacity
+
+    async def _run(self):
+        """Move events from the source into the ring buffer."""
+        try:
+            async for event, data in self._source:
+                async with self._changed:
+                    await self._changed.wait_for(self._has_room)
+                    entry = (self._next_seq, event, data)
+                    self._events.append(entry)
+                    self._next_seq += 1
+                    self._changed.notify_all()
+                await self._store(entry)
+        except asyncio.CancelledError:
+            logger.debug(f"Stream {self.id} cancelled with no client attached")
+        except Exception as e:
+            logger.error(f"Stream {self.id} failed: {e}")
+        finally:
+            aclose = getattr(self._source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            async with self._changed:
+                self.done = True
+                self.expires_at = time.monotonic() + self.ttl
+                self._changed.notify_all()
+            if self.backend is not None:
+                try:
+                    await self.backend.finish(self.id, self._next_seq, self.ttl)
+                except Exception as e:
+                    logger.warning(f"Failed to finish stream {self.id} in the replay backend: {e}")
+
+    async def _store(self, event: StreamEvent):
+        """Write an event to the shared replay backend; local clients are served either way."""
+        if self.backend is None:
+            return
+        try:
+            await self.backend.append(self.id, event, self.capacity, self.ttl)
+        except Exception as e:
+            logger.warning(f"Failed to store stream {self.id} in the replay backend: {e}")
+
+    def _start_grace(self):
+        """Cancel the generation unless a client attaches within the grace period."""
+        self._grace_timer = asyncio.get_running_loop().call_later(self.grace, self._grace_expired)
+
+    def _grace_expired(self):
+        self._grace_timer = None
+        if self.backend is None:
+            self._task.cancel()
+        else:
+            self._grace_check = asyncio.create_task(self._cancel_unless_attached())
+
+    async def _cancel_unless_attached(self):
+        """Cancel the generation unless a client on another worker is reading it from the backend."""
+        try:
+            attached = await self.backend.attached(self.id)
+        except Exception as e:
+            logger.warning(f"Failed to check remote clients of stream {self.id}: {e}")
+            attached = False
+        if self._positions or self.done:
+            return
+        if attached:
+            self._start_grace()
+        else:
+            self._task.cancel()
+
+    def check_resume(self, after: Optional[int]):
+        """Raise StreamGapError if the events following ``after`` are no longer buffered."""
+        start = 0 if after is None else after + 1
+        if start < self._oldest_seq() or start > self._next_seq:
+            raise StreamGapError(f"Stream {self.id} cannot resume after event {after}")
+
+    async def subscribe(self, after: Optional[int] = None) -> AsyncGenerator[StreamEvent, None]:
+        """Yield buffered and live events following sequence number ``after``."""
+        self.check_resume(after)
+        position = 0 if after is None else after + 1
+        token = next(self._tokens)
+        self._positions[token] = position
+        if self._grace_timer is not None:
+            self._grace_timer.cancel()
+            self._grace_timer = None
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self._next_seq > position or self.done)
+                    offset = position - self._oldest_seq()
+                    pending = list(itertools.islice(self._events, max(0, offset), None))
+                    finished = self.done
+                for event in pending:
+                    yield event
+                    position = event[0] + 1
+                async with self._changed:
+                    self._positions[token] = position
+                    self._changed.notify_all()
+                if finished and position >= self._next_seq:
+                    break
+        finally:
+            del self._positions[token]
+            if not self._positions and not self.done:
+                # Keep generating for a while so the client can reconnect and resume
+                self._start_grace()
+            # The slowest position may have changed, so the producer can have room again
+            async with self._changed:
+                self._changed.notify_all()
+
+
+class RemoteStream:
+    """A stream generated by another worker, read from the shared replay backend."""
+
+    def __init__(self, stream_id: str, backend: ReplayBackend, grace: float = 30.0):
+        """
+        Initialize the stream.
+
+        Args:
+            stream_id: Identifier used in event IDs
+            backend: The replay backend the generating worker writes to
+            grace: Seconds the generation keeps running after this client detaches
+        """
+        self.id = stream_id
+        self.backend = backend
+        self.grace = grace
+
+    async def subscribe(self, after: Optional[int] = None) -> AsyncGenerator[StreamEvent, None]:
+        """Yield stored and live events following sequence number ``after``.
+
+        Unlike a local subscriber, a remote one does not hold back the generation, so one that falls
+        more than the buffer behind ends with StreamGapError and has to start a new request.
+        """
+        position = 0 if after is None else after + 1
+        poll = min(MAX_POLL_SECONDS, self.grace / 3)
+        while True:
+            # Keeps the generating worker from cancelling the generation as unattended
+            await self.backend.attach(self.id, self.grace)
+            events, finished = await self.backend.read(self.id, position - 1, poll)
+            for event in events:
+                if event[0] != position:
+                    raise StreamGapError(f"Stream {self.id} lost events after {position - 1}")
+                yield event
+                position += 1
+            if finished:
+                return
+
+
+class StreamRegistry:
+    """Resumable streams by ID, evicted once finished and past their TTL."""
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        ttl: float = 300.0,
+        grace: float = 30.0,
+        backend: Optional[ReplayBackend] = None
+    ):
+        """
+        Initialize the registry.
+
+        Args:
+            capacity: Events kept per stream
+            ttl: Seconds a finished stream stays resumable
+            grace: Seconds a generation keeps running with no client attached
+            backend: Optional shared replay backend, so that streams started by other workers
+                can be resumed
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self.grace = grace
+        self.backend = backend
+        self._streams: Dict[str, ResumableStream] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def _sweep(self):
+        now = time.monotonic()
+        expired = [
+            stream_id for stream_id, stream in self._streams.items()
+            if stream.done and stream.expires_at is not None and stream.expires_at <= now
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+
+    def create(self, source: AsyncIterator[Tuple[str, str]]) -> ResumableStream:
+        """Start a new resumable stream."""
+        self._sweep()
+        stream = ResumableStream(uuid.uuid4().hex, source, self.capacity, self.ttl, self.grace, self.backend)
+        self._streams[stream.id] = stream
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ResumableStream]:
+        """Return a stream that can still be resumed."""
+        self._sweep()
+        return self._streams.get(stream_id)
+
+    async def resume(self, stream_id: str, after: int):
+        """Return the stream to resume after sequence number ``after``, local or on another worker.
+
+        Raises:
+            StreamGapError: If the stream is unknown or the events are no longer buffered
+        """
+        stream = self.get(stream_id)
+        if stream is not None:
+            stream.check_resume(after)
+            return stream
+        if self.backend is None:
+            raise StreamGapError(f"Unknown stream {stream_id}")
+        try:
+            bounds = await self.backend.bounds(stream_id)
+        except Exception as e:
+            logger.warning(f"Replay backend lookup of stream {stream_id} failed: {e}")
+            bounds = None
+        if bounds is None:
+            raise StreamGapError(f"Unknown stream {stream_id}")
+        oldest, next_seq, _ = bounds
+        if not oldest <= after + 1 <= next_seq:
+            raise StreamGapError(f"Stream {stream_id} cannot resume after event {after}")
+        return RemoteStream(stream_id, self.backend, self.grace)
+
+    async def close(self):
+        """Close the shared replay backend."""
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_stream_registry(settings: Settings) -> StreamRegistry:
+    """Create the stream registry configured in settings."""
+    backend = None
+    if settings.OPENAI_STREAM_REPLAY_REDIS_URL:
+        try:
+            backend = RedisReplayBackend(settings.OPENAI_STREAM_REPLAY_REDIS_URL)
+        except Exception as e:
+            logger.error(f"Shared stream replay buffer disabled: {e}")
+    return StreamRegistry(
+        capacity=settings.OPENAI_STREAM_REPLAY_EVENTS,
+        ttl=settings.OPENAI_STREAM_REPLAY_TTL_SECONDS,
+        grace=settings.OPENAI_STREAM_RESUME_GRACE_SECONDS,
+        backend=backend
+    )
@@ -0,0 +1,46 @@
+"""
+Task handlers for the Python service.
+This module holds the registry of task type handlers shared by in-process dispatch in the API
+and by the RabbitMQ worker (``python -m app.worker``).
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from loguru import logger
+
+# A handler receives the task data and returns an optional result
+TaskHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+# Task type -> (handler, concurrency limit in the worker's consumer pool)
+_registry: Dict[str, Tuple[TaskHandler, Optional[int]]] = {}
+
+
+def task_handler(task_type: str, concurrency: Optional[int] = None):
+    """Register a coroutine function as the handler for a task type.
+
+    Args:
+        task_type: The task type the handler processes
+        concurrency: Maximum concurrent executions per worker process (None = pool default)
+    """
+    def decorator(handler: TaskHandler) -> TaskHandler:
+        _registry[task_type] = (handler, concurrency)
+        logger.debug(f"Registered task handler for type: {task_type}")
+        return handler
+    return decorator
+
+
+def get_task_handler(task_type: str) -> Optional[TaskHandler]:
+    """Return the handler registered for a task type."""
+    registration = _registry.get(task_type)
+    return registration[0] if registration else None
+
+
+def registered_task_handlers() -> Dict[str, Tuple[TaskHandler, Optional[int]]]:
+    """Return all registered handlers with their concurrency limits."""
+    return dict(_registry)
+
+
+@task_handler("echo")
+async def echo(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the task data unchanged (useful for smoke and load tests)."""
+    return data
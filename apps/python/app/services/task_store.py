@@ -0,0 +1,471 @@
+"""
+Task store for the Python service.
+This module keeps task state in memory with O(1) lookup by ID, secondary indexes by status and
+type kept in creation order, cursor pagination, and an optional persistent backend (SQLite locally).
+"""
+
+import asyncio
+import bisect
+import json
+import sqlite3
+import time
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from app.config import Settings
+
+# Task statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+TERMINAL_STATUSES = frozenset({COMPLETED, FAILED, CANCELLED})
+
+# Allowed status transitions
+TRANSITIONS: Dict[str, frozenset] = {
+    QUEUED: frozenset({RUNNING, FAILED, CANCELLED}),
+    RUNNING: frozenset({COMPLETED, FAILED, CANCELLED}),
+    COMPLETED: frozenset(),
+    FAILED: frozenset(),
+    CANCELLED: frozenset(),
+}
+
+
+class InvalidTransitionError(ValueError):
+    """Raised when a task status change is not allowed."""
+
+
+class TaskRecord:
+    """Compact task record."""
+
+    __slots__ = ("id", "type", "data", "status", "result", "error", "created_at", "updated_at", "seq")
+
+    def __init__(
+        self,
+        id: str,
+        type: str,
+        data: Dict[str, Any],
+        status: str = QUEUED,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+        seq: int = 0
+    ):
+        now = time.time()
+        self.id = id
+        self.type = type
+        self.data = data
+        self.status = status
+        self.result = result
+        self.error = error
+        self.created_at = created_at or now
+        self.updated_at = updated_at or self.created_at
+        self.seq = seq
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the record as a plain dict."""
+        return {
+            "id": self.id,
+            "type": self.type,
+            "data": self.data,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class TaskBackend:
+    """Persistent backend interface. The default implementation keeps nothing."""
+
+    async def load(self) -> List[TaskRecord]:
+        """Load all persisted records in creation order."""
+        return []
+
+    async def save(self, record: TaskRecord):
+        """Persist a record (insert or update)."""
+
+    async def delete(self, task_ids: Iterable[str]):
+        """Remove records."""
+
+    async def close(self):
+        """Release backend resources."""
+
+
+class SQLiteTaskBackend(TaskBackend):
+    """SQLite backend for local development. Queries run in a worker thread."""
+
+    def __init__(self, path: str):
+        """Initialize the backend with a database file path."""
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = asyncio.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id TEXT PRIMARY KEY, type TEXT NOT NULL, data TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, seq INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    async def _run(self, fn: Callable, *args):
+        # sqlite3 connections are not safe for concurrent use, so serialize access
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _load(self) -> List[TaskRecord]:
+        rows = self._conn.execute(
+            "SELECT id, type, data, status, result, error, created_at, updated_at, seq FROM tasks ORDER BY seq"
+        ).fetchall()
+        return [
+            TaskRecord(
+                id=row[0],
+                type=row[1],
+                data=json.loads(row[2]),
+                status=row[3],
+                result=json.loads(row[4]) if row[4] else None,
+                error=row[5],
+                created_at=row[6],
+                updated_at=row[7],
+                seq=row[8],
+            )
+            for row in rows
+        ]
+
+    def _save(self, record: TaskRecord):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tasks (id, type, data, status, result, error, created_at, updated_at, seq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record.id,
+                record.type,
+                json.dumps(record.data),
+                record.status,
+                json.dumps(record.result) if record.result is not None else None,
+                record.error,
+                record.created_at,
+                record.updated_at,
+                record.seq,
+            ),
+        )
+        self._conn.commit()
+
+    def _delete(self, task_ids: List[str]):
+        self._conn.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in task_ids])
+        self._conn.commit()
+
+    async def load(self) -> List[TaskRecord]:
+        return await self._run(self._load)
+
+    async def save(self, record: TaskRecord):
+        await self._run(self._save, record)
+
+    async def delete(self, task_ids: Iterable[str]):
+        await self._run(self._delete, list(task_ids))
+
+    async def close(self):
+        self._conn.close()
+
+
+class SeqIndex:
+    """Task IDs of one index key, sorted by creation sequence so pages can start at a cursor."""
+
+    __slots__ = ("seqs", "ids")
+
+    def __init__(self):
+        self.seqs: List[int] = []
+        self.ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.seqs)
+
+    def add(self, seq: int, task_id: str):
+        """Add a task; new tasks have the highest sequence, so this is usually an append."""
+        index = bisect.bisect_left(self.seqs, seq)
+        self.seqs.insert(index, seq)
+        self.ids.insert(index, task_id)
+
+    def remove(self, seq: int):
+        """Remove a task by its sequence."""
+        index = bisect.bisect_left(self.seqs, seq)
+        if index < len(self.seqs) and self.seqs[index] == seq:
+            del self.seqs[index]
+            del self.ids[index]
+
+    def after(self, seq: int) -> Iterator[str]:
+        """Iterate the IDs of tasks created after ``seq``, in creation order."""
+        for index in range(bisect.bisect_right(self.seqs, seq), len(self.ids)):
+            yield self.ids[index]
+
+
+# Listener called with the record after every status change
+TransitionListener = Callable[[TaskRecord], Awaitable[None]]
+
+
+class TaskStore:
+    """In-memory task store with secondary indexes and cursor pagination."""
+
+    def __init__(self, backend: Optional[TaskBackend] = None, max_records: int = 100_000):
+        """
+        Initialize the task store.
+
+        Args:
+            backend: Persistent backend (defaults to memory only)
+            max_records: Number of records kept before the oldest finished tasks are evicted
+        """
+        self.backend = backend or TaskBackend()
+        self.max_records = max_records
+        self._records: Dict[str, TaskRecord] = {}
+        # Indexes map a key to its task IDs in creation order
+        self._by_status: Dict[str, SeqIndex] = {}
+        self._by_type: Dict[str, SeqIndex] = {}
+        # Creation order for pagination; entries of evicted tasks are compacted lazily
+        self._seqs: List[int] = []
+        self._order: List[str] = []
+        # Finished tasks in the order they finished, as (updated_at, task ID), for eviction; entries
+        # of tasks that were evicted, requeued or finished again since are skipped lazily
+        self._finished: Deque[Tuple[float, str]] = deque()
+        self._next_seq = 1
+        self._listeners: List[TransitionListener] = []
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add_listener(self, listener: TransitionListener):
+        """Register a coroutine called after every status change."""
+        self._listeners.append(listener)
+
+    async def load(self):
+        """Load persisted records from the backend."""
+        records = await self.backend.load()
+        for record in records:
+            self._insert(record, track_finished=False)
+            self._next_seq = max(self._next_seq, record.seq + 1)
+        finished = sorted(
+            (record.updated_at, record.id) for record in records if record.status in TERMINAL_STATUSES
+        )
+        self._finished.extend(finished)
+        if records:
+            logger.info(f"Loaded {len(records)} tasks from the task store backend")
+
+    async def close(self):
+        """Close the backend."""
+        await self.backend.close()
+
+    def _index_add(self, record: TaskRecord, track_finished: bool = True):
+        self._by_status.setdefault(record.status, SeqIndex()).add(record.seq, record.id)
+        self._by_type.setdefault(record.type, SeqIndex()).add(record.seq, record.id)
+        if track_finished and record.status in TERMINAL_STATUSES:
+            self._finished.append((record.updated_at, record.id))
+
+    def _index_remove(self, record: TaskRecord):
+        if record.status in self._by_status:
+            self._by_status[record.status].remove(record.seq)
+        if record.type in self._by_type:
+            self._by_type[record.type].remove(record.seq)
+
+    def _insert(self, record: TaskRecord, track_finished: bool = True):
+        self._records[record.id] = record
+        self._index_add(record, track_finished)
+        self._seqs.append(record.seq)
+        self._order.append(record.id)
+
+    async def create(self, task_type: str, data: Dict[str, Any], task_id: Optional[str] = None) -> TaskRecord:
+        """Create a queued task."""
+        record = TaskRecord(id=task_id or str(uuid.uuid4()), type=task_type, data=data, seq=self._next_seq)
+        self._next_seq += 1
+        self._insert(record)
+        await self.backend.save(record)
+        await self._evict()
+        await self._notify(record)
+        return record
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        """Get a task by ID."""
+        return self._records.get(task_id)
+
+    async def update_status(
+        self,
+        task_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> TaskRecord:
+        """Move a task to a new status.
+
+        Raises:
+            KeyError: If the task does not exist
+            InvalidTransitionError: If the transition is not allowed
+        """
+        record = self._records[task_id]
+        if status not in TRANSITIONS.get(record.status, frozenset()):
+            raise InvalidTransitionError(f"Cannot move task {task_id} from {record.status} to {status}")
+
+        self._index_remove(record)
+        record.status = status
+        record.updated_at = time.time()
+        if result is not None:
+            record.result = result
+        if error is not None:
+            record.error = error
+        self._index_add(record)
+
+        await self.backend.save(record)
+        await self._notify(record)
+        return record
+
+    async def requeue(self, task_id: str) -> Optional[TaskRecord]:
+        """Move a failed task back to queued, e.g. when its message is requeued from the dead-letter queue.
+
+        Returns None if the task is unknown or has not failed.
+        """
+        record = self._records.get(task_id)
+        if record is None or record.status != FAILED:
+            return None
+
+        self._index_remove(record)
+        record.status = QUEUED
+        record.updated_at = time.time()
+        record.error = None
+        self._index_add(record)
+
+        await self.backend.save(record)
+        await self._notify(record)
+        return record
+
+    async def apply_update(
+        self,
+        task_id: str,
+        status: str,
+        task_type: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> Optional[TaskRecord]:
+        """Apply a status update reported by another process (e.g. a worker) without notifying listeners.
+
+        Unknown tasks are created when the task type is known; duplicate or stale updates are ignored.
+        """
+        record = self._records.get(task_id)
+        if record is None:
+            if task_type is None:
+                return None
+            record = TaskRecord(
+                id=task_id, type=task_type, data=data or {}, status=status,
+                result=result, error=error, seq=self._next_seq
+            )
+            self._next_seq += 1
+            self._insert(record)
+            await self.backend.save(record)
+            await self._evict()
+            return record
+
+        if status not in TRANSITIONS.get(record.status, frozenset()):
+            return record
+
+        self._index_remove(record)
+        record.status = status
+        record.updated_at = time.time()
+        if result is not None:
+            record.result = result
+        if error is not None:
+            record.error = error
+        self._index_add(record)
+        await self.backend.save(record)
+        return record
+
+    def list_tasks(
+        self,
+        status: Optional[str] = None,
+        task_type: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 50
+    ) -> Tuple[List[TaskRecord], Optional[int]]:
+        """List tasks in creation order.
+
+        Args:
+            status: Only return tasks with this status
+            task_type: Only return tasks of this type
+            cursor: Return tasks created after this cursor
+            limit: Page size
+
+        Returns:
+            The page of tasks and the cursor for the next page (None when exhausted)
+        """
+        after = cursor or 0
+        if status is None and task_type is None:
+            # Walk the creation order from the cursor position
+            page: List[TaskRecord] = []
+            index = bisect.bisect_right(self._seqs, after)
+            while index < len(self._order) and len(page) <= limit:
+                record = self._records.get(self._order[index])
+                if record is not None:
+                    page.append(record)
+                index += 1
+        else:
+            # Walk the smaller of the matching indexes from the cursor position
+            candidates = [
+                index.get(key) or SeqIndex()
+                for index, key in ((self._by_status, status), (self._by_type, task_type))
+                if key is not None
+            ]
+            page = []
+            for task_id in min(candidates, key=len).after(after):
+                record = self._records[task_id]
+                if (status is None or record.status == status) and (task_type is None or record.type == task_type):
+                    page.append(record)
+                    if len(page) > limit:
+                        break
+
+        next_cursor = page[limit - 1].seq if len(page) > limit else None
+        return page[:limit], next_cursor
+
+    def count_by_status(self) -> Dict[str, int]:
+        """Return the number of tasks per status."""
+        return {status: len(ids) for status, ids in self._by_status.items() if ids}
+
+    async def _evict(self):
+        """Drop the tasks that finished first once the store is over capacity."""
+        excess = len(self._records) - self.max_records
+        if excess <= 0:
+            return
+        evicted = []
+        while self._finished and len(evicted) < excess:
+            finished_at, task_id = self._finished.popleft()
+            record = self._records.get(task_id)
+            if record is None or record.status not in TERMINAL_STATUSES or record.updated_at != finished_at:
+                continue
+            del self._records[task_id]
+            self._index_remove(record)
+            evicted.append(task_id)
+        if evicted:
+            await self.backend.delete(evicted)
+        # Compact the creation order once enough entries point at evicted tasks
+        if len(self._order) > 2 * len(self._records):
+            live = [(seq, task_id) for seq, task_id in zip(self._seqs, self._order) if task_id in self._records]
+            self._seqs = [seq for seq, _ in live]
+            self._order = [task_id for _, task_id in live]
+
+    async def _notify(self, record: TaskRecord):
+        for listener in self._listeners:
+            try:
+                await listener(record)
+            except Exception as e:
+                logger.error(f"Task status listener failed for task {record.id}: {e}")
+
+
+def create_task_store(settings: Settings) -> TaskStore:
+    """Create the task store with the backend selected in settings."""
+    backend: Optional[TaskBackend] = None
+    if settings.TASK_STORE_BACKEND == "sqlite":
+        backend = SQLiteTaskBackend(settings.TASK_STORE_SQLITE_PATH)
+        logger.info(f"Task store persisting to SQLite at {settings.TASK_STORE_SQLITE_PATH}")
+    elif settings.TASK_STORE_BACKEND != "memory":
+        raise ValueError(f"Unknown task store backend: {settings.TASK_STORE_BACKEND}")
+    return TaskStore(backend, max_records=settings.TASK_STORE_MAX_RECORDS)
@@ -0,0 +1,136 @@
+"""
+Token counter for the Python service.
+This module counts prompt tokens with tiktoken so that requests can be checked against the model's
+context window before they are sent upstream. Encoders are memoized per model, and counts of
+repeated system messages are kept in an LRU cache.
+
+tiktoken is imported on first use to keep startup fast. Without it, or when its encoding files
+cannot be loaded (they are downloaded on first use), counts fall back to an estimate of four
+characters per token.
+"""
+
+import functools
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config import Settings
+
+# Context windows by model name prefix; the longest matching prefix wins
+CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106": 128000,
+    "gpt-4-0125": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo-instruct": 4096,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Encoding used for models tiktoken does not know (e.g. mock or fine-tuned model names)
+FALLBACK_ENCODING = "cl100k_base"
+CHARS_PER_TOKEN = 4
+
+# Chat formatting overhead: tokens added per message and tokens that prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+class ContextLengthError(ValueError):
+    """Raised when a prompt does not fit in the model's context window."""
+
+    def __init__(self, model: str, prompt_tokens: int, max_tokens: Optional[int], context_window: int):
+        self.model = model
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.context_window = context_window
+        requested = f"{prompt_tokens} prompt tokens"
+        if max_tokens:
+            requested += f" + {max_tokens} completion tokens"
+        super().__init__(f"Request of {requested} exceeds the {context_window} token context window of {model}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str) -> Optional[Any]:
+    """Return the tiktoken encoding for a model, or None if counts must be estimated."""
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover - depends on the environment
+        logger.warning("tiktoken is not installed, token counts are estimated")
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        logger.warning(f"Token counts for {model} are estimated, tiktoken encoding unavailable: {e}")
+        return None
+
+
+def context_window(model: str, override: int = 0) -> int:
+    """Return the context window of a model in tokens.
+
+    Args:
+        model: The model name
+        override: Context window to use instead of the known one (0 = look it up)
+    """
+    if override > 0:
+        return override
+    matches = [prefix for prefix in CONTEXT_WINDOWS if model.startswith(prefix)]
+    return CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+class TokenCounter:
+    """Counts and truncates prompt tokens per model."""
+
+    def __init__(self, cache_size: int = 1024):
+        """
+        Initialize the counter.
+
+        Args:
+            cache_size: Number of system message counts to keep (0 disables the cache)
+        """
+        self._count_cached = functools.lru_cache(maxsize=cache_size)(self.count) if cache_size > 0 else self.count
+
+    def count(self, text: str, model: str) -> int:
+        """Count the tokens of a text."""
+        encoding = get_encoding(model)
+        if encoding is None:
+            return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+        # Special-token text in user input is counted as ordinary text, as the API does
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: List[Dict[str, str]], model: str) -> int:
+        """Count the prompt tokens of chat messages, including the chat format's overhead.
+
+        System messages are usually the same across requests, so their counts are cached.
+        """
+        tokens = TOKENS_PER_REPLY
+        for message in messages:
+            count = self._count_cached if message["role"] == "system" else self.count
+            tokens += TOKENS_PER_MESSAGE + count(message["content"], model)
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int, model: str) -> str:
+        """Return the start of a text that fits in ``max_tokens`` tokens."""
+        if max_tokens <= 0:
+            return ""
+        encoding = get_encoding(model)
+        if encoding is None:
+            return text[:max_tokens * CHARS_PER_TOKEN]
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+
+    def cache_info(self) -> Optional[Any]:
+        """Hit and miss counts of the system message cache."""
+        return self._count_cached.cache_info() if hasattr(self._count_cached, "cache_info") else None
+
+
+def create_token_counter(settings: Settings) -> TokenCounter:
+    """Create the token counter configured in settings."""
+    return TokenCounter(cache_size=settings.OPENAI_TOKEN_COUNT_CACHE_SIZE)
@@ -0,0 +1,206 @@
+"""
+Circuit breakers for the Python service.
+This module stops calls to a dependency that keeps failing (OpenAI, RabbitMQ, NATS) so requests
+fail fast with 503 instead of piling up. After a cool-down a limited number of probe calls are let
+through; a success closes the breaker again, a failure reopens it. Disconnected brokers are
+reconnected in the background.
+"""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from loguru import logger
+
+from app.config import get_settings
+from app.utils.metrics import CIRCUIT_BREAKER_STATE, CIRCUIT_BREAKER_TRANSITIONS
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES: Dict[str, int] = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuit breaker for one dependency."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        is_failure: Callable[[BaseException], bool] = lambda e: True
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            name: Dependency name, used in metrics and /health
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds the breaker stays open before probing
+            half_open_max_calls: Concurrent probe calls allowed while half-open
+            is_failure: Whether an exception counts against the dependency
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.is_failure = is_failure
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probes = 0
+        CIRCUIT_BREAKER_STATE.labels(name).set(STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._probes = 0
+        self.opened_at = time.monotonic() if state == OPEN else None
+        if state == CLOSED:
+            self.failures = 0
+        CIRCUIT_BREAKER_STATE.labels(self.name).set(STATE_VALUES[state])
+        CIRCUIT_BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def _retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently rejected (open and still cooling down)."""
+        return self.state == OPEN and self._retry_after() > 0
+
+    def check(self):
+        """Raise CircuitOpenError if the breaker is open and still cooling down."""
+        if self.is_open:
+            raise CircuitOpenError(self.name, self._retry_after())
+
+    def acquire(self):
+        """Admit a call or raise CircuitOpenError; admitted calls must be reported back."""
+        if self.state == OPEN:
+            self.check()
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probes += 1
+
+    def record_success(self):
+        """Report a successful call."""
+        if self.state == HALF_OPEN:
+            self._transition(CLOSED)
+        self.failures = 0
+
+    def record_failure(self):
+        """Report a failed call."""
+        if self.state == HALF_OPEN:
+            self._transition(OPEN)
+            return
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._transition(OPEN)
+
+    def release(self):
+        """Report a call that ended without a verdict (e.g. cancelled)."""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def trip(self):
+        """Open the breaker immediately, e.g. when a connection is lost."""
+        self._transition(OPEN)
+
+    def reset(self):
+        """Close the breaker, e.g. when a connection is restored."""
+        self._transition(CLOSED)
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Run the block as a call through the breaker."""
+        self.acquire()
+        try:
+            yield
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self.release()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the breaker state for /health."""
+        return {
+            "state": OPEN if self.is_open else (HALF_OPEN if self.state == OPEN else self.state),
+            "failures": self.failures,
+            "retry_after": round(self._retry_after(), 1) if self.state == OPEN else None,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str, **kwargs: Any) -> CircuitBreaker:
+    """Return the process-wide breaker for a dependency, creating it from settings on first use."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        settings = get_settings()
+        options = {
+            "failure_threshold": settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            "reset_timeout": settings.CIRCUIT_BREAKER_RESET_SECONDS,
+            "half_open_max_calls": settings.CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS,
+        }
+        options.update(kwargs)
+        breaker = CircuitBreaker(name, **options)
+        _breakers[name] = breaker
+    return breaker
+
+
+def circuit_breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Return the state of every breaker."""
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+async def reconnect_forever(
+    breaker: CircuitBreaker,
+    connect: Callable[[], Awaitable[None]],
+    max_delay: float = 30.0
+):
+    """Call ``connect`` with jittered exponential backoff until it succeeds.
+
+    The breaker stays open while the dependency is unreachable and is closed on success.
+    """
+    attempt = 0
+    while True:
+        try:
+            await connect()
+        except Exception as e:
+            breaker.trip()
+            delay = random.uniform(0.5, 1.0) * min(max_delay, 2 ** attempt)
+            attempt += 1
+            logger.warning(f"Reconnecting to {breaker.name} in {delay:.1f}s: {e}")
+            await asyncio.sleep(delay)
+        else:
+            breaker.reset()
+            logger.info(f"Reconnected to {breaker.name}")
+            return
@@ -0,0 +1,127 @@
+"""
+Message codecs for the Python service.
+This module provides the serialization layer shared by RabbitMQ, NATS and HTTP responses.
+
+JSON uses orjson when it is installed (bytes in, bytes out, no str round trip) and falls back
+to the standard library otherwise. MessagePack is available when msgpack is installed.
+The codec is selected from a content type, so services can negotiate the wire format.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+
+class DecodeError(ValueError):
+    """Raised when a payload cannot be decoded by its codec."""
+
+
+class Codec:
+    """Base class for codecs."""
+
+    content_type: str = ""
+
+    def encode(self, obj: Any) -> bytes:
+        """Serialize an object to bytes."""
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        """Deserialize bytes to an object."""
+        raise NotImplementedError
+
+
+class JSONCodec(Codec):
+    """JSON codec backed by orjson, with a pure-Python fallback."""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+    def decode(self, data: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+class MsgPackCodec(Codec):
+    """MessagePack codec backed by msgpack."""
+
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+_codecs: Dict[str, Codec] = {}
+
+
+def register_codec(codec: Codec, *aliases: str):
+    """Register a codec under its content type and any aliases."""
+    for content_type in (codec.content_type, *aliases):
+        _codecs[content_type.lower()] = codec
+
+
+def get_codec(content_type: Optional[str] = None) -> Codec:
+    """Return the codec for a content type, defaulting to JSON.
+
+    Parameters such as ``; charset=utf-8`` are ignored.
+
+    Raises:
+        ValueError: If no codec is registered for the content type
+    """
+    if not content_type:
+        return _codecs[JSON_CONTENT_TYPE]
+    key = content_type.split(";", 1)[0].strip().lower()
+    codec = _codecs.get(key)
+    if codec is None:
+        raise ValueError(f"Unsupported content type: {content_type}")
+    return codec
+
+
+def encode(obj: Any, content_type: Optional[str] = None) -> bytes:
+    """Serialize an object with the codec for the content type."""
+    return get_codec(content_type).encode(obj)
+
+
+def decode(data: bytes, content_type: Optional[str] = None) -> Any:
+    """Deserialize bytes with the codec for the content type.
+
+    Raises:
+        DecodeError: If the payload is malformed or the content type is unsupported
+    """
+    try:
+        return get_codec(content_type).decode(data)
+    except Exception as e:
+        raise DecodeError(str(e)) from e
+
+
+register_codec(JSONCodec(), "text/json")
+if msgpack is not None:
+    register_codec(MsgPackCodec(), "application/x-msgpack")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered through the shared JSON codec."""
+
+    def render(self, content: Any) -> bytes:
+        return _codecs[JSON_CONTENT_TYPE].encode(content)
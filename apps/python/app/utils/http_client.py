@@ -0,0 +1,92 @@
+"""
+Outbound HTTP client for the Python service.
+This module owns the process-wide httpx connection pool shared by the OpenAI client, schema
+fetching and calls to the NestJS backend, so connections are reused across requests instead of
+each caller opening its own pool. The client is created at startup and closed at shutdown.
+"""
+
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+from app.config import Settings, get_settings
+from app.utils.metrics import (
+    OUTBOUND_HTTP_CONNECTIONS,
+    OUTBOUND_HTTP_QUEUED_REQUESTS,
+    OUTBOUND_HTTP_REQUESTS,
+)
+
+try:
+    import h2  # noqa: F401
+except ImportError:  # pragma: no cover - depends on the environment
+    h2 = None
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _record_pool_metrics(client: httpx.AsyncClient):
+    """Update the pool gauges from the transport's connection pool."""
+    pool = getattr(client._transport, "_pool", None)
+    if pool is None:
+        return
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    OUTBOUND_HTTP_CONNECTIONS.labels("active").set(len(connections) - idle)
+    OUTBOUND_HTTP_CONNECTIONS.labels("idle").set(idle)
+    queued = sum(1 for request in getattr(pool, "_requests", []) if request.is_queued())
+    OUTBOUND_HTTP_QUEUED_REQUESTS.set(queued)
+
+
+def create_http_client(settings: Settings) -> httpx.AsyncClient:
+    """Create an HTTP client with the pool limits, timeouts and protocol configured in settings."""
+    http2 = settings.HTTP_CLIENT_HTTP2
+    if http2 and h2 is None:
+        logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+
+    client: httpx.AsyncClient
+
+    async def on_request(request: httpx.Request):
+        _record_pool_metrics(client)
+
+    async def on_response(response: httpx.Response):
+        OUTBOUND_HTTP_REQUESTS.labels(response.request.url.host, str(response.status_code)).inc()
+        _record_pool_metrics(client)
+
+    client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+            read=settings.HTTP_CLIENT_READ_TIMEOUT,
+            write=settings.HTTP_CLIENT_WRITE_TIMEOUT,
+            pool=settings.HTTP_CLIENT_POOL_TIMEOUT,
+        ),
+        event_hooks={"request": [on_request], "response": [on_response]},
+    )
+    logger.info(
+        f"Outbound HTTP client created (http2={http2}, "
+        f"max_connections={settings.HTTP_CLIENT_MAX_CONNECTIONS})"
+    )
+    return client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client(get_settings())
+    return _client
+
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,269 @@
+"""
+Prometheus metrics for the Python service.
+This module defines the hot-path metrics and the ASGI middleware that records request latency.
+
+The production image runs uvicorn with several workers, so when ``PROMETHEUS_MULTIPROC_DIR``
+is set every worker writes its samples to that directory and ``/metrics`` aggregates them.
+"""
+
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets tuned for API latencies (fast health checks up to long completions)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TTFT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+TOKENS_PER_SECOND_BUCKETS = (1, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+# HTTP metrics
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route, measured until the last body chunk is sent",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# OpenAI metrics
+OPENAI_REQUEST_DURATION = Histogram(
+    "openai_request_duration_seconds",
+    "Upstream OpenAI request latency",
+    ["model", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+OPENAI_STREAM_TTFT = Histogram(
+    "openai_stream_time_to_first_token_seconds",
+    "Time from request start to the first streamed token",
+    ["model"],
+    buckets=TTFT_BUCKETS,
+)
+OPENAI_STREAM_TOKENS_PER_SECOND = Histogram(
+    "openai_stream_tokens_per_second",
+    "Streamed tokens per second after the first token",
+    ["model"],
+    buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "Tokens sent to and generated by the upstream by model and kind (prompt, completion)",
+    ["model", "kind"],
+)
+OPENAI_FALLBACKS = Counter(
+    "openai_fallbacks_total",
+    "Upstream attempts abandoned for the next backend by model and reason (rate_limited, timeout)",
+    ["model", "reason"],
+)
+OPENAI_CONTEXT_OVERFLOWS = Counter(
+    "openai_context_overflows_total",
+    "Requests exceeding the model's context window by action (rejected, truncated)",
+    ["model", "action"],
+)
+
+OPENAI_CACHE_REQUESTS = Counter(
+    "openai_cache_requests_total",
+    "Completion cache lookups by result (hit, shared_hit, miss)",
+    ["operation", "result"],
+)
+
+OPENAI_COALESCED_REQUESTS = Counter(
+    "openai_coalesced_requests_total",
+    "Requests by single-flight role (leader calls upstream, followers share its result)",
+    ["operation", "role"],
+)
+
+OPENAI_LIMITER_QUEUE_WAIT = Histogram(
+    "openai_limiter_queue_wait_seconds",
+    "Time upstream calls wait for admission by the rate limiter",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OPENAI_HEDGED_REQUESTS = Counter(
+    "openai_hedged_requests_total",
+    "Slow completions by hedge result (primary_won, hedge_won, budget_exhausted)",
+    ["result"],
+)
+OPENAI_RETRIED_REQUESTS = Counter(
+    "openai_retried_requests_total",
+    "Completion retries by upstream error type",
+    ["error"],
+)
+
+# RabbitMQ metrics
+RABBITMQ_TASK_DURATION = Histogram(
+    "rabbitmq_task_duration_seconds",
+    "RabbitMQ task handler duration by task type",
+    ["task_type", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+RABBITMQ_TASK_RETRIES = Counter(
+    "rabbitmq_task_retries_total",
+    "RabbitMQ tasks scheduled for a delayed retry by task type",
+    ["task_type"],
+)
+RABBITMQ_TASKS_DEFERRED = Counter(
+    "rabbitmq_tasks_deferred_total",
+    "RabbitMQ tasks handed back for later because their task type's backlog in the worker was full",
+    ["task_type"],
+)
+RABBITMQ_DEAD_LETTERS = Counter(
+    "rabbitmq_dead_letters_total",
+    "RabbitMQ messages moved to the dead-letter queue by reason (exhausted or poison)",
+    ["reason"],
+)
+RABBITMQ_TASKS_IN_FLIGHT = Gauge(
+    "rabbitmq_tasks_in_flight",
+    "RabbitMQ tasks currently being handled by the consumer pool",
+    ["task_type"],
+    multiprocess_mode="livesum",
+)
+
+# NATS metrics
+NATS_MESSAGES_PUBLISHED = Counter(
+    "nats_messages_published_total",
+    "Messages published to NATS",
+    ["subject"],
+)
+NATS_MESSAGES_RECEIVED = Counter(
+    "nats_messages_received_total",
+    "Messages delivered to NATS subscriber callbacks",
+    ["subject"],
+)
+NATS_CALLBACK_DURATION = Histogram(
+    "nats_callback_duration_seconds",
+    "Time spent in NATS subscriber callbacks",
+    ["subject"],
+    buckets=LATENCY_BUCKETS,
+)
+NATS_DELIVERY_LAG = Histogram(
+    "nats_delivery_lag_seconds",
+    "Time from publishing a message to the start of its subscriber callback (messages with a publish timestamp)",
+    ["subject"],
+    buckets=LATENCY_BUCKETS,
+)
+NATS_REQUEST_DURATION = Histogram(
+    "nats_request_duration_seconds",
+    "NATS request/reply round trips by outcome (success, error, timeout, no_responders)",
+    ["subject", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# Outbound HTTP metrics
+OUTBOUND_HTTP_REQUESTS = Counter(
+    "outbound_http_requests_total",
+    "Responses received by the shared outbound HTTP client",
+    ["host", "status"],
+)
+OUTBOUND_HTTP_CONNECTIONS = Gauge(
+    "outbound_http_pool_connections",
+    "Connections in the shared outbound HTTP pool by state (active or idle)",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+OUTBOUND_HTTP_QUEUED_REQUESTS = Gauge(
+    "outbound_http_pool_queued_requests",
+    "Outbound requests waiting for a pooled connection",
+    multiprocess_mode="livesum",
+)
+
+# Circuit breaker metrics
+CIRCUIT_BREAKER_STATE = Gauge(
+    "circuit_breaker_state",
+    "Circuit breaker state by dependency (0 closed, 1 open, 2 half-open)",
+    ["name"],
+    multiprocess_mode="livemax",
+)
+CIRCUIT_BREAKER_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state transitions by dependency and new state",
+    ["name", "state"],
+)
+
+# NestJS schema metrics
+NESTJS_SCHEMA_CHECKS = Counter(
+    "nestjs_schema_checks_total",
+    "NestJS OpenAPI schema checks by outcome (not_modified, unchanged, cached, generated, failed)",
+    ["outcome"],
+)
+
+# Routes that should not be recorded (scrapes would dominate the histogram)
+EXCLUDED_ROUTES = {"/metrics"}
+
+
+def is_multiprocess() -> bool:
+    """Return True when metrics are shared between worker processes."""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render the current metrics in the Prometheus text format.
+
+    Returns:
+        A tuple of (payload, content type)
+    """
+    if is_multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Clean up live gauges of an exiting worker process."""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    """Return the matched route template to keep label cardinality bounded."""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records request latency per route.
+
+    A pure ASGI middleware is used instead of ``BaseHTTPMiddleware`` so that streaming
+    responses are timed until their final chunk rather than until the headers are sent.
+    """
+
+    def __init__(self, app):
+        """Wrap an ASGI application."""
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_template(scope)
+            if route not in EXCLUDED_ROUTES:
+                HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(
+                    time.perf_counter() - start
+                )
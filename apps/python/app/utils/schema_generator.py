@@ -1,15 +1,35 @@
 """
 Schema generator for the Python service.
 This script fetches the OpenAPI schema from the NestJS backend and generates Pydantic models.
+
+Run ``python -m app.utils.schema_generator`` as a build step to regenerate the models from the
+saved schema (``--fetch`` downloads it first), so the service does not have to at startup.
+
+At runtime, ``update_models`` checks the backend's schema with ``If-None-Match`` and compares a
+hash of its content with the schema the loaded models were generated from. Generated models are
+cached by schema hash, so only a schema no process has seen runs datamodel-codegen, and changed
+models replace ``app.models.nestjs_models`` in place without restarting the worker. Look models up
+through ``get_models()`` (or the module attribute) rather than importing classes by name, so
+that reloads are seen.
 """
 
+import argparse
+import asyncio
+import functools
+import hashlib
+import importlib
+import importlib.util
 import os
 import json
-import httpx
-import subprocess
+import sys
+import tempfile
 from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Optional, Tuple
 from loguru import logger
 from app.config import get_settings
+from app.utils.http_client import close_http_client, get_http_client
+from app.utils.metrics import NESTJS_SCHEMA_CHECKS
 
 # Get settings
 settings = get_settings()
@@ -19,35 +39,81 @@ CURRENT_DIR = Path(__file__).parent
 MODELS_DIR = CURRENT_DIR.parent / "models"
 OPENAPI_JSON_PATH = CURRENT_DIR / "openapi.json"
 MODELS_PATH = MODELS_DIR / "nestjs_models.py"
+MODELS_MODULE = "app.models.nestjs_models"
+
+# The source tree may be read-only at runtime, so generated models are cached elsewhere
+CACHE_DIR = Path(settings.SCHEMA_CACHE_DIR or os.path.join(tempfile.gettempdir(), "nestjs-models"))
+CACHE_MAX_ENTRIES = 8
+
+# ETag of the last schema whose models were loaded, and the hash of that schema
+_etag: Optional[str] = None
+_models_hash: Optional[str] = None
+_update_lock = asyncio.Lock()
 
-async def fetch_openapi_schema():
-    """Fetch the OpenAPI schema from the NestJS backend."""
+def schema_hash(schema: Any) -> str:
+    """Return a hash of the schema's content that ignores key order and formatting."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def shipped_schema_hash() -> Optional[str]:
+    """Return the hash of the saved schema that the shipped models were generated from."""
+    if not (MODELS_PATH.exists() and OPENAPI_JSON_PATH.exists()):
+        return None
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(settings.NESTJS_OPENAPI_URL)
-            response.raise_for_status()
-            
-            # Save the schema to a file
-            with open(OPENAPI_JSON_PATH, "w") as f:
-                json.dump(response.json(), f, indent=2)
-            
-            logger.info(f"OpenAPI schema saved to {OPENAPI_JSON_PATH}")
-            return True
-    except Exception as e:
-        logger.error(f"Failed to fetch OpenAPI schema: {e}")
-        return False
+        with open(OPENAPI_JSON_PATH) as f:
+            return schema_hash(json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read saved OpenAPI schema: {e}")
+        return None
+
+def current_models_hash() -> Optional[str]:
+    """Return the hash of the schema the loaded models were generated from, if known."""
+    return _models_hash or shipped_schema_hash()
+
+async def fetch_openapi_schema(etag: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Fetch the OpenAPI schema from the NestJS backend.
+
+    Args:
+        etag (str, optional): ETag of a previous response, sent as If-None-Match.
+
+    Returns:
+        Tuple of the schema (None if unchanged since ``etag``) and the response's ETag.
+
+    Raises:
+        httpx.HTTPError: If the backend cannot be reached or answers with an error.
+    """
+    headers = {"If-None-Match": etag} if etag else {}
+    response = await get_http_client().get(settings.NESTJS_OPENAPI_URL, headers=headers, timeout=30.0)
+    if response.status_code == 304:
+        return None, etag
+    response.raise_for_status()
+    return response.json(), response.headers.get("etag")
+
+def save_schema(schema: Dict[str, Any], path: Path = OPENAPI_JSON_PATH):
+    """Save the schema to a file."""
+    with open(path, "w") as f:
+        json.dump(schema, f, indent=2)
+    logger.info(f"OpenAPI schema saved to {path}")
 
-def generate_models():
-    """Generate Pydantic models from the OpenAPI schema."""
+async def generate_models(input_path: Path = OPENAPI_JSON_PATH, output_path: Path = MODELS_PATH):
+    """Generate Pydantic models from the OpenAPI schema.
+
+    datamodel-codegen runs as an asynchronous subprocess so the event loop is not blocked.
+
+    Args:
+        input_path (Path): OpenAPI schema to generate from.
+        output_path (Path): Module to write the models to.
+    """
     try:
-        # Create models directory if it doesn't exist
-        os.makedirs(MODELS_DIR, exist_ok=True)
-        
+        # Create the output directory if it doesn't exist
+        os.makedirs(output_path.parent, exist_ok=True)
+
         # Generate models using datamodel-code-generator
         cmd = [
             "datamodel-codegen",
-            "--input", str(OPENAPI_JSON_PATH),
-            "--output", str(MODELS_PATH),
+            "--input", str(input_path),
+            "--output", str(output_path),
             "--input-file-type", "openapi",
             "--output-model-type", "pydantic.BaseModel",
             "--target-python-version", "3.10",
@@ -56,46 +122,185 @@ def generate_models():
             "--snake-case-field",
             "--enum-field-as-literal", "all"
         ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info(f"Pydantic models generated successfully at {MODELS_PATH}")
-            
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+
+        if process.returncode == 0:
+            logger.info(f"Pydantic models generated successfully at {output_path}")
+
             # Create __init__.py if it doesn't exist
             init_path = MODELS_DIR / "__init__.py"
-            if not init_path.exists():
+            if output_path == MODELS_PATH and not init_path.exists():
                 with open(init_path, "w") as f:
                     f.write('"""Generated models from NestJS OpenAPI schema."""\n')
-            
+
             return True
         else:
-            logger.error(f"Failed to generate models: {result.stderr}")
+            logger.error(f"Failed to generate models: {stderr.decode(errors='replace')}")
             return False
     except Exception as e:
         logger.error(f"Error generating models: {e}")
         return False
 
+def _prune_cache():
+    """Keep only the most recently used generated models."""
+    artifacts = sorted(CACHE_DIR.glob("*.py"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for artifact in artifacts[CACHE_MAX_ENTRIES:]:
+        artifact.unlink(missing_ok=True)
+        artifact.with_suffix(".json").unlink(missing_ok=True)
+
+async def build_models(schema: Dict[str, Any], digest: str) -> Optional[Path]:
+    """Return the models generated from a schema, generating them only on a cache miss.
+
+    Args:
+        schema (dict): The OpenAPI schema.
+        digest (str): The schema's hash, as returned by ``schema_hash``.
+
+    Returns:
+        Path of the generated module, or None if generation failed.
+    """
+    artifact = CACHE_DIR / f"{digest}.py"
+    if artifact.exists():
+        artifact.touch()
+        NESTJS_SCHEMA_CHECKS.labels("cached").inc()
+        logger.info(f"Using cached models for schema {digest[:12]}")
+        return artifact
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    schema_path = CACHE_DIR / f"{digest}.json"
+    save_schema(schema, schema_path)
+    # Other workers may generate the same schema; each writes its own file and renames it into place
+    partial = CACHE_DIR / f"{digest}.{os.getpid()}.partial"
+    if not await generate_models(schema_path, partial):
+        partial.unlink(missing_ok=True)
+        return None
+    os.replace(partial, artifact)
+    NESTJS_SCHEMA_CHECKS.labels("generated").inc()
+    _prune_cache()
+    return artifact
+
+def load_models(path: Path) -> ModuleType:
+    """Load generated models as ``app.models.nestjs_models``, replacing the loaded module.
+
+    Args:
+        path (Path): Generated module to load.
+
+    Returns:
+        The new module; the previous one stays in place if loading fails.
+    """
+    previous = sys.modules.get(MODELS_MODULE)
+    spec = importlib.util.spec_from_file_location(MODELS_MODULE, path)
+    module = importlib.util.module_from_spec(spec)
+    # Registered before executing so that pydantic can resolve the module's forward references
+    sys.modules[MODELS_MODULE] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        if previous is not None:
+            sys.modules[MODELS_MODULE] = previous
+        else:
+            del sys.modules[MODELS_MODULE]
+        raise
+
+    import app.models
+    app.models.nestjs_models = module
+    return module
+
+def get_models() -> ModuleType:
+    """Return the current generated models module."""
+    return importlib.import_module(MODELS_MODULE)
+
 async def update_models(force: bool = False):
-    """Update the Pydantic models from the NestJS OpenAPI schema.
-    
+    """Bring the loaded Pydantic models up to date with the NestJS OpenAPI schema.
+
     Args:
-        force (bool): If True, regenerate models even if they already exist.
+        force (bool): If True, fetch and regenerate the models even if the schema is unchanged.
+
+    Returns:
+        bool: True if the loaded models match the backend's schema.
     """
-    # Check if models already exist and force is False
-    if not force and MODELS_PATH.exists():
-        logger.info("Models already exist and force=False, skipping generation")
+    global _etag, _models_hash
+
+    async with _update_lock:
+        try:
+            schema, etag = await fetch_openapi_schema(None if force else _etag)
+        except Exception as e:
+            NESTJS_SCHEMA_CHECKS.labels("failed").inc()
+            logger.error(f"Failed to fetch OpenAPI schema: {e}")
+            return False
+
+        if schema is None:
+            NESTJS_SCHEMA_CHECKS.labels("not_modified").inc()
+            logger.debug("OpenAPI schema not modified")
+            return True
+
+        digest = schema_hash(schema)
+        if not force and digest == current_models_hash():
+            NESTJS_SCHEMA_CHECKS.labels("unchanged").inc()
+            logger.debug(f"OpenAPI schema unchanged ({digest[:12]})")
+            _etag = etag
+            return True
+
+        if force:
+            (CACHE_DIR / f"{digest}.py").unlink(missing_ok=True)
+            artifact = await build_models(schema, digest)
+        elif digest == shipped_schema_hash():
+            # Back to the schema the shipped models were generated from
+            artifact = MODELS_PATH
+        else:
+            artifact = await build_models(schema, digest)
+        if artifact is None:
+            NESTJS_SCHEMA_CHECKS.labels("failed").inc()
+            return False
+
+        try:
+            load_models(artifact)
+        except Exception as e:
+            NESTJS_SCHEMA_CHECKS.labels("failed").inc()
+            logger.error(f"Failed to load models generated from schema {digest[:12]}: {e}")
+            return False
+
+        # The ETag is only kept once models for it are loaded, so that a failure is retried
+        _etag = etag
+        _models_hash = digest
+        logger.info(f"Reloaded NestJS models for schema {digest[:12]}")
         return True
-    
-    # Fetch the schema
-    schema_fetched = await fetch_openapi_schema()
-    
-    if not schema_fetched:
-        logger.warning("Using existing schema if available")
-    
-    # Generate models if schema exists
-    if OPENAPI_JSON_PATH.exists():
-        return generate_models()
-    else:
-        logger.error("OpenAPI schema not found")
-        return False 
\ No newline at end of file
+
+async def watch_schema(interval: float):
+    """Check the backend's schema now and then every ``interval`` seconds, reloading models on change.
+
+    Args:
+        interval (float): Seconds between checks; 0 or less checks only once.
+    """
+    while True:
+        await update_models()
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+async def _main(fetch: bool):
+    try:
+        if fetch:
+            try:
+                schema, _ = await fetch_openapi_schema()
+            except Exception as e:
+                logger.error(f"Failed to fetch OpenAPI schema: {e}")
+                return False
+            save_schema(schema)
+        if not OPENAPI_JSON_PATH.exists():
+            logger.error("OpenAPI schema not found")
+            return False
+        return await generate_models()
+    finally:
+        await close_http_client()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Pydantic models from the NestJS OpenAPI schema")
+    parser.add_argument("--fetch", action="store_true", help="Download the schema from NESTJS_OPENAPI_URL first")
+    args = parser.parse_args()
+    raise SystemExit(0 if asyncio.run(_main(args.fetch)) else 1)
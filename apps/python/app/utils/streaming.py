@@ -0,0 +1,90 @@
+"""
+Streaming utilities for the Python service.
+This module coalesces small streamed chunks into larger frames by time or byte window, with a
+bounded buffer between the producer and the client so a slow consumer applies backpressure
+upstream instead of growing memory.
+"""
+
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, List
+
+# Marks the end of the source stream in the buffer
+_END = object()
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[str],
+    window: float = 0.02,
+    max_bytes: int = 1024,
+    max_buffered: int = 256
+) -> AsyncGenerator[str, None]:
+    """Merge chunks from ``source`` into frames.
+
+    The first chunk is emitted immediately so time-to-first-token is not delayed. After that,
+    chunks arriving within ``window`` seconds are merged until the frame reaches ``max_bytes``.
+
+    Args:
+        source: The chunk stream
+        window: Seconds to collect chunks per frame (0 disables coalescing)
+        max_bytes: Frame size that triggers an early flush
+        max_buffered: Chunks buffered ahead of the consumer before the source is paused
+
+    Yields:
+        Coalesced frames
+    """
+    buffer: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_buffered))
+    error: List[BaseException] = []
+
+    async def pump():
+        try:
+            async for chunk in source:
+                # Blocks when the consumer falls behind, which stops reading from upstream
+                await buffer.put(chunk)
+        except Exception as e:
+            error.append(e)
+        finally:
+            # Close the source explicitly; leaving the loop does not finalize an async generator
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        await buffer.put(_END)
+
+    producer = asyncio.create_task(pump())
+    try:
+        first = True
+        while True:
+            item = await buffer.get()
+            if item is _END:
+                break
+            frame = [item]
+            size = len(item)
+            finished = False
+
+            if not first and window > 0:
+                # Take what is already buffered, then give the window a chance to fill the frame
+                for attempt in range(2):
+                    while size < max_bytes:
+                        try:
+                            item = buffer.get_nowait()
+                        except asyncio.QueueEmpty:
+                            break
+                        if item is _END:
+                            finished = True
+                            break
+                        frame.append(item)
+                        size += len(item)
+                    if finished or size >= max_bytes or attempt:
+                        break
+                    await asyncio.sleep(window)
+
+            first = False
+            yield "".join(frame)
+            if finished:
+                break
+
+        if error:
+            raise error[0]
+    finally:
+        # Stops the upstream stream when the client disconnects
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
@@ -0,0 +1,99 @@
+"""
+Task worker for the Python service.
+This module consumes tasks from RabbitMQ with the registered task handlers and reports status
+transitions over NATS, so API pods and worker pods can be scaled independently.
+
+Run with ``python -m app.worker``.
+"""
+
+import asyncio
+import signal
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from app.config import get_settings
+from app.messaging.rabbitmq import RabbitMQService
+from app.messaging.nats import NatsService
+from app.services.task_handlers import TaskHandler, registered_task_handlers
+from app.services.task_store import RUNNING, COMPLETED, FAILED
+from app.utils.http_client import close_http_client
+
+
+def make_task_handler(task_type: str, handler: TaskHandler, nats_service: NatsService):
+    """Wrap a task handler so that it reports status transitions over NATS."""
+    async def report(task_id: str, status: str, data: Dict[str, Any]):
+        # Tasks still run while NATS is down; only the status updates are lost
+        try:
+            await nats_service.publish_task_status(task_id, status, data)
+        except Exception as e:
+            logger.warning(f"Could not publish {status} status for task {task_id}: {e}")
+    
+    async def handle(message_data: Dict[str, Any]):
+        task_id = message_data.get("id")
+        await report(task_id, RUNNING, {"type": task_type})
+        # Failures are retried by the RabbitMQ service; the task is reported failed once dead-lettered
+        result = await handler(message_data.get("data") or {})
+        await report(task_id, COMPLETED, {"type": task_type, "result": result or {}})
+    return handle
+
+
+def make_dead_letter_listener(nats_service: NatsService):
+    """Report tasks that exhausted their attempts or could not be handled as failed."""
+    async def on_dead_letter(task_type: Optional[str], message_data: Optional[Dict[str, Any]], error: str):
+        task_id = message_data.get("id") if isinstance(message_data, dict) else None
+        if not task_id:
+            return
+        try:
+            await nats_service.publish_task_status(task_id, FAILED, {"type": task_type, "error": error})
+        except Exception as e:
+            logger.warning(f"Could not publish {FAILED} status for task {task_id}: {e}")
+    return on_dead_letter
+
+
+async def run_worker():
+    """Connect to the brokers and consume tasks until SIGINT or SIGTERM."""
+    settings = get_settings()
+    logger.info("Starting task worker...")
+
+    rabbitmq_service = RabbitMQService(settings)
+    nats_service = NatsService(settings)
+
+    try:
+        await rabbitmq_service.connect()
+    except Exception as e:
+        # Nothing to do without the queue; wait until it is reachable
+        logger.error(f"Failed to connect to RabbitMQ, retrying until it is reachable: {e}")
+        await rabbitmq_service.start_reconnect()
+    try:
+        await nats_service.connect()
+    except Exception as e:
+        # Tasks still run; status updates are lost until NATS is reachable again
+        logger.error(f"Failed to connect to NATS, reconnecting in the background: {e}")
+        nats_service.start_reconnect()
+
+    for task_type, (handler, concurrency) in registered_task_handlers().items():
+        rabbitmq_service.register_task_handler(
+            task_type,
+            make_task_handler(task_type, handler, nats_service),
+            concurrency
+        )
+    rabbitmq_service.add_dead_letter_listener(make_dead_letter_listener(nats_service))
+    await rabbitmq_service.start_consumer_pool()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info("Task worker running")
+    await stop.wait()
+
+    logger.info("Shutting down task worker...")
+    await rabbitmq_service.close()
+    await nats_service.close()
+    await close_http_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
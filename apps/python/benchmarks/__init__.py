@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Python service.
+This package measures HTTP throughput and latency, completion streaming against the mock OpenAI
+upstream, RabbitMQ and NATS throughput against local brokers, and codec speed, and writes the
+results as JSON so that releases can be compared. Run with ``python -m benchmarks``.
+"""
@@ -0,0 +1,99 @@
+"""
+Broker benchmarks for the Python service.
+This module measures publish and consume throughput of RabbitMQ and NATS against local brokers,
+using temporary queues and subjects so that it does not touch the service's own traffic.
+"""
+
+import asyncio
+import time
+import uuid
+from typing import Any, Dict
+
+import aio_pika
+import nats
+
+from app.utils import codec
+
+# Payload of every benchmark message, about the size of a task message
+PAYLOAD = {"id": "00000000-0000-0000-0000-000000000000", "type": "echo", "data": {"text": "x" * 200}}
+
+
+def _rates(count: int, publish_seconds: float, consume_seconds: float) -> Dict[str, Any]:
+    return {
+        "messages": count,
+        "publish_per_second": round(count / publish_seconds, 2) if publish_seconds > 0 else 0.0,
+        "consume_per_second": round(count / consume_seconds, 2) if consume_seconds > 0 else 0.0,
+    }
+
+
+async def bench_rabbitmq(url: str, count: int, batch: int = 500) -> Dict[str, Any]:
+    """Publish ``count`` confirmed messages to a temporary queue, then consume them all."""
+    body = codec.encode(PAYLOAD)
+    connection = await aio_pika.connect_robust(url, timeout=5)
+    try:
+        channel = await connection.channel(publisher_confirms=True)
+        await channel.set_qos(prefetch_count=batch)
+        queue = await channel.declare_queue(f"bench.{uuid.uuid4().hex}", exclusive=True, auto_delete=True)
+
+        # Publishes are pipelined in batches and wait for broker confirms
+        start = time.perf_counter()
+        for offset in range(0, count, batch):
+            await asyncio.gather(*(
+                channel.default_exchange.publish(aio_pika.Message(body), routing_key=queue.name)
+                for _ in range(min(batch, count - offset))
+            ))
+        publish_seconds = time.perf_counter() - start
+
+        received = 0
+        done = asyncio.Event()
+
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage):
+            nonlocal received
+            codec.decode(message.body)
+            await message.ack()
+            received += 1
+            if received >= count:
+                done.set()
+
+        start = time.perf_counter()
+        await queue.consume(on_message)
+        await asyncio.wait_for(done.wait(), timeout=120)
+        consume_seconds = time.perf_counter() - start
+    finally:
+        await connection.close()
+    return _rates(count, publish_seconds, consume_seconds)
+
+
+async def bench_nats(url: str, count: int) -> Dict[str, Any]:
+    """Publish ``count`` core NATS messages to a temporary subject and wait until all arrive."""
+    body = codec.encode(PAYLOAD)
+    subject = f"bench.{uuid.uuid4().hex}"
+    client = await nats.connect(url, connect_timeout=5, max_reconnect_attempts=1)
+    try:
+        received = 0
+        first = None
+        done = asyncio.Event()
+
+        async def on_message(msg):
+            nonlocal received, first
+            if first is None:
+                first = time.perf_counter()
+            codec.decode(msg.data)
+            received += 1
+            if received >= count:
+                done.set()
+
+        # A large pending buffer keeps the slow-consumer guard from dropping messages
+        await client.subscribe(subject, cb=on_message, pending_msgs_limit=count + 1)
+        await client.flush()
+
+        start = time.perf_counter()
+        for _ in range(count):
+            await client.publish(subject, body)
+        await client.flush()
+        publish_seconds = time.perf_counter() - start
+        await asyncio.wait_for(done.wait(), timeout=120)
+        consume_seconds = time.perf_counter() - (first or start)
+    finally:
+        await client.close()
+    return _rates(count, publish_seconds, consume_seconds)
@@ -0,0 +1,62 @@
+"""
+Codec micro-benchmarks for the Python service.
+This module times encoding and decoding of representative messages with every registered codec.
+"""
+
+import time
+from typing import Any, Callable, Dict
+
+from app.utils import codec
+
+# Representative messages: a task status update and a large completion result
+MESSAGES: Dict[str, Any] = {
+    "task_status": {
+        "taskId": "00000000-0000-0000-0000-000000000000",
+        "status": "completed",
+        "timestamp": 1700000000.0,
+        "data": {"type": "echo", "result": {"value": 42, "ok": True}},
+    },
+    "completion": {
+        "content": "lorem ipsum dolor sit amet " * 400,
+        "finish_reason": "stop",
+        "model": "gpt-4",
+        "usage": {"prompt_tokens": 120, "completion_tokens": 2400, "total_tokens": 2520},
+        "choices": [{"index": i, "logprob": -0.25 * i} for i in range(64)],
+    },
+}
+
+
+def _time(fn: Callable[[], Any], min_seconds: float) -> Dict[str, float]:
+    """Call ``fn`` repeatedly for at least ``min_seconds`` and return its speed."""
+    iterations = 0
+    batch = 100
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        iterations += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+    return {
+        "ops_per_second": round(iterations / elapsed, 1),
+        "us_per_op": round(elapsed / iterations * 1_000_000, 3),
+    }
+
+
+def bench_codecs(min_seconds: float = 0.5) -> Dict[str, Any]:
+    """Time encode and decode for every codec and message."""
+    results: Dict[str, Any] = {}
+    for content_type in (codec.JSON_CONTENT_TYPE, codec.MSGPACK_CONTENT_TYPE):
+        try:
+            codec.get_codec(content_type)
+        except ValueError:
+            continue
+        for name, message in MESSAGES.items():
+            encoded = codec.encode(message, content_type)
+            results[f"{content_type.split('/')[-1]}_{name}"] = {
+                "bytes": len(encoded),
+                "encode": _time(lambda: codec.encode(message, content_type), min_seconds),
+                "decode": _time(lambda: codec.decode(encoded, content_type), min_seconds),
+            }
+    return results
@@ -0,0 +1,136 @@
+"""
+Shared helpers for the benchmarks.
+This module runs closed-loop load against an async operation, summarizes latencies into the
+result format shared by all suites, and starts the service and the mock upstream as subprocesses.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+# Directory containing the app package, used as the working directory of spawned processes
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Return the ``q`` quantile of an ascending list (nearest rank)."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as milliseconds."""
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered) if ordered else 0.0
+    return {
+        "mean": round(mean * 1000, 3),
+        "p50": round(percentile(ordered, 0.50) * 1000, 3),
+        "p90": round(percentile(ordered, 0.90) * 1000, 3),
+        "p99": round(percentile(ordered, 0.99) * 1000, 3),
+        "max": round((ordered[-1] if ordered else 0.0) * 1000, 3),
+    }
+
+
+def summarize(samples: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Build the result of a load run."""
+    return {
+        "requests": len(samples) + errors,
+        "errors": errors,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(samples),
+    }
+
+
+async def run_load(
+    operation: Callable[[int], Awaitable[Any]],
+    concurrency: int,
+    duration: float,
+    warmup: float = 1.0,
+    on_measure: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """Call ``operation`` from ``concurrency`` loops for ``duration`` seconds after a warmup.
+
+    The operation receives a running request number; it fails by raising. ``on_measure`` is called
+    when the warmup ends, e.g. to reset samples the operation collects itself.
+    """
+    samples: List[float] = []
+    errors = 0
+    counter = 0
+    measuring = False
+
+    async def loop(deadline: float):
+        nonlocal errors, counter
+        while time.perf_counter() < deadline:
+            counter += 1
+            start = time.perf_counter()
+            try:
+                await operation(counter)
+            except Exception:
+                if measuring:
+                    errors += 1
+                continue
+            if measuring:
+                samples.append(time.perf_counter() - start)
+
+    if warmup > 0:
+        await asyncio.gather(*(loop(time.perf_counter() + warmup) for _ in range(concurrency)))
+    measuring = True
+    if on_measure:
+        on_measure()
+    start = time.perf_counter()
+    await asyncio.gather(*(loop(start + duration) for _ in range(concurrency)))
+    result = summarize(samples, errors, time.perf_counter() - start)
+    result["concurrency"] = concurrency
+    return result
+
+
+def free_port() -> int:
+    """Return a TCP port that is free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """Start a Python module as a subprocess in the service directory."""
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=SERVICE_DIR,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    """Wait until ``url`` answers, failing early if the process exits."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Process exited with code {process.returncode} before {url} was up")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+def stop(process: Optional[subprocess.Popen]):
+    """Terminate a spawned process."""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
@@ -0,0 +1,75 @@
+"""
+Benchmark comparison for the Python service.
+This module compares two benchmark result files and reports metrics that got worse by more than
+a threshold, exiting non-zero so that it can gate a release.
+
+Usage: ``python -m benchmarks.compare baseline.json results.json --threshold 10``
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Metric name suffixes where a higher value is better; other numeric metrics are latencies,
+# sizes and counts that are either lower-is-better or not compared
+HIGHER_IS_BETTER = ("per_second",)
+LOWER_IS_BETTER = ("mean", "p50", "p90", "p99", "us_per_op")
+
+
+def flatten(data: Any, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """Yield (dotted path, value) for every number in nested results."""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, float(data)
+
+
+def direction(path: str) -> Optional[int]:
+    """Return 1 if higher is better, -1 if lower is better, None if the metric is not compared."""
+    name = path.rsplit(".", 1)[-1]
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name in LOWER_IS_BETTER:
+        return -1
+    return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Return the regressions and improvements beyond ``threshold`` percent."""
+    before = dict(flatten(baseline.get("results", {})))
+    after = dict(flatten(current.get("results", {})))
+    regressions, improvements = [], []
+    for path, old in before.items():
+        sign = direction(path)
+        new = after.get(path)
+        if sign is None or new is None or old == 0:
+            continue
+        change = (new - old) / old * 100
+        entry = {"metric": path, "baseline": old, "current": new, "change_percent": round(change, 1)}
+        if change * sign < -threshold:
+            regressions.append(entry)
+        elif change * sign > threshold:
+            improvements.append(entry)
+    return {"threshold_percent": threshold, "regressions": regressions, "improvements": improvements}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    report = compare(baseline, current, args.threshold)
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
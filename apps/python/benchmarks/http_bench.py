@@ -0,0 +1,92 @@
+"""
+HTTP benchmarks for the Python service.
+This module measures throughput and latency of ``/health``, ``/tasks`` and ``/openai/completions``,
+and time to first event and event rate of ``/openai/completions/stream``.
+"""
+
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.common import latency_summary, run_load
+
+
+async def bench_http(base_url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Run the request/response scenarios against a running service."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def health(_: int):
+            response = await client.get("/health")
+            response.raise_for_status()
+
+        async def create_task(n: int):
+            response = await client.post("/tasks/", json={"type": "echo", "data": {"n": n}})
+            response.raise_for_status()
+
+        async def completion(n: int):
+            # Distinct prompts and a non-zero temperature keep the completion cache out of the way
+            response = await client.post(
+                "/openai/completions",
+                json={"prompt": f"benchmark prompt {n}", "temperature": 0.7}
+            )
+            response.raise_for_status()
+
+        return {
+            "health": await run_load(health, concurrency, duration),
+            "tasks_create": await run_load(create_task, concurrency, duration),
+            "completions": await run_load(completion, concurrency, duration),
+        }
+
+
+async def bench_streaming(base_url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Open concurrent completion streams and measure time to first event and events per second."""
+    ttfts: List[float] = []
+    rates: List[float] = []
+    events_total = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        async def stream(n: int):
+            nonlocal events_total
+            start = time.perf_counter()
+            first = None
+            events = 0
+            async with client.stream(
+                "POST",
+                "/openai/completions/stream",
+                json={"prompt": f"benchmark stream {n}", "temperature": 0.7, "stream": True}
+            ) as response:
+                response.raise_for_status()
+                event = "message"
+                async for line in response.aiter_lines():
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:"):
+                        if event == "error":
+                            raise RuntimeError(line)
+                        if event == "message":
+                            events += 1
+                            if first is None:
+                                first = time.perf_counter()
+                        event = "message"
+            end = time.perf_counter()
+            if first is not None:
+                ttfts.append(first - start)
+                if end > first and events > 1:
+                    rates.append((events - 1) / (end - first))
+            events_total += events
+
+        def reset():
+            nonlocal events_total
+            ttfts.clear()
+            rates.clear()
+            events_total = 0
+
+        result = await run_load(stream, concurrency, duration, on_measure=reset)
+
+    ordered = sorted(rates)
+    result["ttft_ms"] = latency_summary(ttfts)
+    result["events_per_stream_per_second"] = round(ordered[len(ordered) // 2], 2) if ordered else 0.0
+    result["events"] = events_total
+    return result
@@ -0,0 +1,16 @@
+"""
+Shared fixtures for the Python service tests.
+"""
+
+import os
+
+# Metrics are recorded in this process's registry, not in a multiprocess directory
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run ``@pytest.mark.anyio`` tests on asyncio, the loop the service runs on."""
+    return "asyncio"
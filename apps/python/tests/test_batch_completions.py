@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import openai as openai_router
+from app.routers.openai import CompletionRequest, run_batch
+
+
+class FakeBreaker:
+    def check(self):
+        pass
+
+
+class FakeOpenAIService:
+    def __init__(self, delays=None):
+        self.breaker = FakeBreaker()
+        self.delays = delays or {}
+        self.running = 0
+        self.peak = 0
+        self.priorities = []
+
+    async def generate_completion(self, prompt, priority, **kwargs):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        self.priorities.append(priority)
+        try:
+            await asyncio.sleep(self.delays.get(prompt, 0))
+            if prompt == "fail":
+                raise RuntimeError("upstream failed")
+            return {"content": prompt.upper(), "finish_reason": "stop", "model": "gpt-4", "usage": {}}
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeOpenAIService()
+    monkeypatch.setattr(openai_router, "_openai_service", service)
+    return service
+
+
+def items(*prompts, **fields):
+    return [CompletionRequest(prompt=prompt, **fields) for prompt in prompts]
+
+
+@pytest.mark.anyio
+async def test_results_arrive_in_completion_order_with_bounded_concurrency(service):
+    service.delays = {"slow": 0.05}
+
+    results = [result async for result in run_batch(items("slow", "a", "b", "c"), concurrency=2)]
+
+    assert results[-1].index == 0
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    assert service.peak == 2
+    assert service.priorities == ["batch"] * 4
+
+
+@pytest.mark.anyio
+async def test_item_failures_are_results(service):
+    results = {result.index: result async for result in run_batch(items("ok", "fail"), concurrency=4)}
+
+    assert results[0].response.content == "OK"
+    assert results[1].error == "upstream failed" and results[1].response is None
+
+
+@pytest.mark.anyio
+async def test_stopping_early_cancels_pending_items(service):
+    service.delays = {"slow": 10}
+    batch = run_batch(items("fast", "slow"), concurrency=2)
+
+    first = await batch.__anext__()
+    await batch.aclose()
+
+    assert first.index == 0
+    assert service.running == 0
+
+
+def create_client() -> TestClient:
+    app = FastAPI()
+    app.include_router(openai_router.router, prefix="/openai")
+    return TestClient(app)
+
+
+def test_endpoint_returns_results_in_request_order(service):
+    service.delays = {"a": 0.02}
+
+    response = create_client().post(
+        "/openai/completions/batch",
+        json={"items": [{"prompt": "a"}, {"prompt": "fail"}, {"prompt": "c", "priority": "interactive"}]}
+    )
+
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2]
+    assert results[0]["response"]["content"] == "A"
+    assert results[1]["error"] == "upstream failed"
+    assert "interactive" in service.priorities
+
+
+def test_endpoint_streams_ndjson(service):
+    response = create_client().post(
+        "/openai/completions/batch",
+        json={"items": [{"prompt": "a"}, {"prompt": "b"}], "stream": True}
+    )
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.strip().splitlines()) == 2
+
+
+def test_endpoint_rejects_oversized_batches(service, monkeypatch):
+    monkeypatch.setattr(openai_router.settings, "OPENAI_BATCH_MAX_ITEMS", 2)
+
+    response = create_client().post("/openai/completions/batch", json={"items": [{"prompt": "a"}] * 3})
+
+    assert response.status_code == 413
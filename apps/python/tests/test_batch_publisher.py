@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from aio_pika import Message
+
+from app.messaging.batch_publisher import BatchPublisher
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeExchange:
+    def __init__(self):
+        self.published = []
+        self.concurrent = 0
+        self.peak = 0
+        self.reject = set()
+
+    async def publish(self, message, routing_key):
+        self.concurrent += 1
+        self.peak = max(self.peak, self.concurrent)
+        try:
+            # Yield so that publishes of one batch overlap, as they do while awaiting confirms
+            await asyncio.sleep(0)
+            if routing_key in self.reject:
+                raise RuntimeError(f"nack for {routing_key}")
+            self.published.append((routing_key, message.body))
+        finally:
+            self.concurrent -= 1
+
+
+class FakeChannel:
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.is_closed = False
+        self.publisher_confirms = None
+
+    async def get_exchange(self, name):
+        return self.exchange
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.exchange = FakeExchange()
+        self.channels = []
+
+    async def channel(self, publisher_confirms=False):
+        channel = FakeChannel(self.exchange)
+        channel.publisher_confirms = publisher_confirms
+        self.channels.append(channel)
+        return channel
+
+
+async def start_publisher(**options):
+    connection = FakeConnection()
+    publisher = BatchPublisher("tasks", **options)
+    await publisher.start(connection)
+    return publisher, connection
+
+
+async def test_publish_waits_for_the_broker_ack():
+    publisher, connection = await start_publisher(batch_window=0)
+    try:
+        await publisher.publish("task", Message(b"one"))
+    finally:
+        await publisher.stop()
+
+    assert connection.channels[0].publisher_confirms is True
+    assert connection.exchange.published == [("task", b"one")]
+
+
+async def test_concurrent_publishes_share_a_batch():
+    publisher, connection = await start_publisher(batch_size=50, batch_window=0.01)
+    try:
+        await asyncio.gather(*(publisher.publish("task", Message(str(i).encode())) for i in range(20)))
+    finally:
+        await publisher.stop()
+
+    assert len(connection.exchange.published) == 20
+    # All 20 were in flight together instead of one confirm round trip each
+    assert connection.exchange.peak == 20
+
+
+async def test_batches_are_capped_at_batch_size():
+    publisher, connection = await start_publisher(batch_size=5, batch_window=0.01)
+    try:
+        futures = [await publisher.enqueue("task", Message(str(i).encode())) for i in range(12)]
+        await asyncio.gather(*futures)
+    finally:
+        await publisher.stop()
+
+    assert len(connection.exchange.published) == 12
+    assert connection.exchange.peak == 5
+
+
+async def test_rejected_message_fails_only_its_own_future():
+    publisher, connection = await start_publisher(batch_window=0.01)
+    connection.exchange.reject.add("bad")
+    try:
+        good = await publisher.enqueue("good", Message(b"1"))
+        bad = await publisher.enqueue("bad", Message(b"2"))
+        await good
+        with pytest.raises(RuntimeError, match="nack for bad"):
+            await bad
+    finally:
+        await publisher.stop()
+
+
+async def test_stop_flushes_queued_messages_and_closes_the_channel():
+    publisher, connection = await start_publisher(batch_size=100, batch_window=1.0)
+    futures = [await publisher.enqueue("task", Message(str(i).encode())) for i in range(3)]
+
+    await publisher.stop()
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert len(connection.exchange.published) == 3
+    assert connection.channels[0].is_closed
+    with pytest.raises(RuntimeError):
+        await publisher.enqueue("task", Message(b"late"))
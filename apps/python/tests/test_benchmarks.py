@@ -0,0 +1,61 @@
+import pytest
+
+from benchmarks.common import latency_summary, percentile, run_load, summarize
+from benchmarks.compare import compare, direction, flatten
+
+
+def test_percentile_uses_the_nearest_rank():
+    ordered = [float(value) for value in range(1, 101)]
+    assert percentile(ordered, 0.5) == 51.0
+    assert percentile(ordered, 0.99) == 100.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_summary_reports_milliseconds_and_throughput():
+    result = summarize([0.001, 0.002, 0.003, 0.010], errors=1, elapsed=2.0)
+
+    assert result["requests"] == 5
+    assert result["throughput_per_second"] == 2.0
+    assert result["latency_ms"] == {"mean": 4.0, "p50": 3.0, "p90": 10.0, "p99": 10.0, "max": 10.0}
+    assert latency_summary([])["p99"] == 0.0
+
+
+@pytest.mark.anyio
+async def test_run_load_counts_errors_only_after_the_warmup():
+    measured = []
+
+    async def operation(n):
+        if n % 2:
+            raise RuntimeError("failed")
+
+    result = await run_load(operation, concurrency=2, duration=0.02, warmup=0.01, on_measure=lambda: measured.append(1))
+
+    assert measured == [1]
+    assert result["concurrency"] == 2
+    assert 0 < result["errors"] < result["requests"]
+
+
+def test_flatten_yields_dotted_numeric_paths():
+    data = {"http": {"latency_ms": {"p50": 1}, "ok": True, "name": "health"}, "count": 3}
+    assert dict(flatten(data)) == {"http.latency_ms.p50": 1.0, "count": 3.0}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("http.throughput_per_second", 1),
+    ("http.latency_ms.p99", -1),
+    ("codec.json.us_per_op", -1),
+    ("http.requests", None),
+])
+def test_direction(path, expected):
+    assert direction(path) == expected
+
+
+def test_compare_reports_changes_beyond_the_threshold():
+    baseline = {"results": {"http": {"throughput_per_second": 1000, "latency_ms": {"p99": 10, "p50": 2}, "requests": 5}}}
+    current = {"results": {"http": {"throughput_per_second": 850, "latency_ms": {"p99": 8, "p50": 2.1}, "requests": 50}}}
+
+    report = compare(baseline, current, threshold=10)
+
+    assert [entry["metric"] for entry in report["regressions"]] == ["http.throughput_per_second"]
+    assert report["regressions"][0]["change_percent"] == -15.0
+    assert [entry["metric"] for entry in report["improvements"]] == ["http.latency_ms.p99"]
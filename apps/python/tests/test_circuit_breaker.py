@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.utils import circuit_breaker
+from app.utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, reconnect_forever
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=3, reset_timeout=10)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.acquire()
+    assert error.value.retry_after == pytest.approx(10)
+
+
+def test_probe_after_cool_down_closes_on_success(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=10, half_open_max_calls=1)
+    breaker.record_failure()
+
+    clock.now += 10
+    assert not breaker.is_open
+    assert breaker.snapshot()["state"] == HALF_OPEN
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.acquire()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.snapshot() == {"state": OPEN, "failures": 1, "retry_after": 10.0}
+
+
+def test_released_probe_frees_its_slot(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+    breaker.acquire()
+
+    breaker.release()
+    breaker.acquire()
+    assert breaker.state == HALF_OPEN
+
+
+def test_check_rejects_only_while_cooling_down(clock):
+    breaker = CircuitBreaker("upstream", reset_timeout=10)
+    breaker.check()
+
+    breaker.trip()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    clock.now += 10
+    breaker.check()
+
+    breaker.reset()
+    assert breaker.snapshot() == {"state": CLOSED, "failures": 0, "retry_after": None}
+
+
+@pytest.mark.anyio
+async def test_guard_reports_the_outcome(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, is_failure=lambda e: not isinstance(e, ValueError))
+
+    with pytest.raises(ValueError):
+        async with breaker.guard():
+            raise ValueError("client error")
+    assert breaker.state == CLOSED
+
+    async with breaker.guard():
+        pass
+    assert breaker.failures == 0
+
+    with pytest.raises(ConnectionError):
+        async with breaker.guard():
+            raise ConnectionError("down")
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        async with breaker.guard():
+            pass
+
+
+@pytest.mark.anyio
+async def test_cancelled_probe_is_released(clock):
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.now += 10
+
+    with pytest.raises(asyncio.CancelledError):
+        async with breaker.guard():
+            raise asyncio.CancelledError()
+    assert breaker.state == HALF_OPEN
+
+    async with breaker.guard():
+        pass
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.anyio
+async def test_reconnect_forever_keeps_the_breaker_open_until_connected(monkeypatch):
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(circuit_breaker.asyncio, "sleep", no_sleep)
+    monkeypatch.setattr(circuit_breaker.random, "uniform", lambda low, high: 1.0)
+    breaker = CircuitBreaker("broker")
+    attempts = []
+
+    async def connect():
+        attempts.append(breaker.state)
+        if len(attempts) < 4:
+            raise ConnectionError("refused")
+
+    await reconnect_forever(breaker, connect, max_delay=3)
+
+    assert attempts == [CLOSED, OPEN, OPEN, OPEN]
+    assert delays == [1, 2, 3]
+    assert breaker.state == CLOSED
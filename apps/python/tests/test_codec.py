@@ -0,0 +1,44 @@
+import pytest
+
+from app.utils import codec
+
+PAYLOAD = {"id": "1", "type": "resize", "data": {"width": 640, "tags": ["a", "b"], "ratio": 1.5, "ok": True}}
+
+
+@pytest.mark.parametrize("content_type", [None, "application/json", "text/json", "application/msgpack"])
+def test_round_trip(content_type):
+    assert codec.decode(codec.encode(PAYLOAD, content_type), content_type) == PAYLOAD
+
+
+def test_json_is_compact_and_decodable_by_other_services():
+    assert codec.encode({"a": 1, "b": [1, 2]}) == b'{"a":1,"b":[1,2]}'
+
+
+def test_content_type_parameters_and_case_are_ignored():
+    assert codec.get_codec("Application/JSON; charset=utf-8") is codec.get_codec("application/json")
+    assert codec.get_codec("application/x-msgpack") is codec.get_codec("application/msgpack")
+
+
+def test_msgpack_is_smaller_than_json():
+    assert len(codec.encode(PAYLOAD, "application/msgpack")) < len(codec.encode(PAYLOAD))
+
+
+def test_unsupported_content_type_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported content type"):
+        codec.encode(PAYLOAD, "application/xml")
+    with pytest.raises(codec.DecodeError):
+        codec.decode(b"<a/>", "application/xml")
+
+
+def test_malformed_payload_raises_decode_error():
+    with pytest.raises(codec.DecodeError):
+        codec.decode(b"{not json")
+    with pytest.raises(codec.DecodeError):
+        codec.decode(b"\xc1", "application/msgpack")
+
+
+def test_fast_json_response_renders_with_the_shared_codec():
+    response = codec.FastJSONResponse({"a": 1})
+
+    assert response.body == b'{"a":1}'
+    assert response.media_type == "application/json"
@@ -0,0 +1,146 @@
+import pytest
+
+from app.services import completion_cache
+from app.services.completion_cache import CacheBackend, CompletionCache
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(completion_cache.time, "monotonic", clock)
+    return clock
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.entries = {}
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        if key not in self.entries:
+            return None
+        payload, expires_at = self.entries[key]
+        return payload, expires_at - completion_cache.time.monotonic()
+
+    async def set(self, key, payload, ttl):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.entries[key] = (payload, completion_cache.time.monotonic() + ttl)
+
+
+async def test_hit_and_miss(clock):
+    cache = CompletionCache()
+
+    assert await cache.get("k") is None
+    await cache.set("k", {"text": "hi"})
+
+    assert await cache.get("k") == {"text": "hi"}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_entries_expire_after_the_ttl(clock):
+    cache = CompletionCache(ttl=10)
+    await cache.set("k", "value")
+
+    clock.now += 9
+    assert await cache.get("k") == "value"
+    clock.now += 2
+    assert await cache.get("k") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+async def test_least_recently_used_entry_is_evicted(clock):
+    cache = CompletionCache(max_entries=2)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    await cache.get("a")
+
+    await cache.set("c", 3)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1 and await cache.get("c") == 3
+
+
+async def test_size_bound_evicts_and_skips_oversized_values(clock):
+    cache = CompletionCache(max_bytes=20)
+    await cache.set("a", "x" * 12)
+    await cache.set("b", "y" * 12)
+    assert await cache.get("a") is None
+    assert cache.stats()["bytes"] <= 20
+
+    await cache.set("big", "z" * 100)
+    assert await cache.get("big") is None
+    assert await cache.get("b") == "y" * 12
+
+
+async def test_shared_backend_fills_the_local_cache(clock):
+    backend = MemoryBackend()
+    writer = CompletionCache(backend=backend)
+    await writer.set("k", {"text": "shared"})
+
+    reader = CompletionCache(backend=backend)
+    assert await reader.get("k") == {"text": "shared"}
+    backend.entries.clear()
+    assert await reader.get("k") == {"text": "shared"}
+
+
+async def test_shared_backend_errors_are_treated_as_misses(clock):
+    cache = CompletionCache(backend=MemoryBackend(fail=True))
+
+    await cache.set("k", "value")
+
+    assert await cache.get("k") == "value"
+    assert await cache.get("other") is None
+
+
+async def test_undecodable_shared_entries_are_misses(clock):
+    backend = MemoryBackend()
+    backend.entries["k"] = (b"\xff not json", clock.now + 60)
+    cache = CompletionCache(backend=backend)
+
+    assert await cache.get("k") is None
+    assert cache.stats() == {"entries": 0, "bytes": 0, "hits": 0, "misses": 1}
+
+
+async def test_local_copy_of_a_shared_hit_keeps_the_remaining_ttl(clock):
+    backend = MemoryBackend()
+    await CompletionCache(ttl=10, backend=backend).set("k", "value")
+    clock.now += 8
+
+    reader = CompletionCache(ttl=10, backend=backend)
+    assert await reader.get("k") == "value"
+    backend.entries.clear()
+    clock.now += 1
+    assert await reader.get("k") == "value"
+    clock.now += 2
+    assert await reader.get("k") is None
+
+
+def test_only_deterministic_requests_are_cacheable():
+    cache = CompletionCache(max_temperature=0.0)
+
+    assert cache.is_cacheable(0.0)
+    assert not cache.is_cacheable(0.7)
+
+
+def test_keys_distinguish_every_request_parameter():
+    messages = [{"role": "user", "content": "hi"}]
+    key = CompletionCache.make_key("completion", "gpt-4", messages, 0.0, 10)
+
+    assert key == CompletionCache.make_key("completion", "gpt-4", [dict(messages[0])], 0.0, 10)
+    assert key != CompletionCache.make_key("stream", "gpt-4", messages, 0.0, 10)
+    assert key != CompletionCache.make_key("completion", "gpt-4o", messages, 0.0, 10)
+    assert key != CompletionCache.make_key("completion", "gpt-4", [{"role": "user", "content": "ho"}], 0.0, 10)
+    assert key != CompletionCache.make_key("completion", "gpt-4", messages, 0.0, None)
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from app.messaging.consumer_pool import ConsumerPool
+
+pytestmark = pytest.mark.anyio
+
+
+class Recorder:
+    """Execute callback that records peak concurrency per lane and can hold items until released."""
+
+    def __init__(self):
+        self.running = {}
+        self.peak = {}
+        self.done = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, lane, item):
+        self.running[lane] = self.running.get(lane, 0) + 1
+        self.peak[lane] = max(self.peak.get(lane, 0), self.running[lane])
+        try:
+            if item == "fail":
+                raise RuntimeError("handler failed")
+            if lane == "slow":
+                await self.release.wait()
+            await asyncio.sleep(0)
+            self.done.append((lane, item))
+        finally:
+            self.running[lane] -= 1
+
+
+async def wait_until(condition, timeout=1.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.001)
+    await asyncio.wait_for(poll(), timeout)
+
+
+async def test_lane_limit_caps_concurrency():
+    recorder = Recorder()
+    pool = ConsumerPool(recorder, size=8)
+    pool.set_limit("resize", 2)
+    pool.start()
+    try:
+        for i in range(10):
+            await pool.submit("resize", i)
+        await wait_until(lambda: len(recorder.done) == 10)
+    finally:
+        await pool.stop()
+
+    assert recorder.peak["resize"] == 2
+
+
+async def test_saturated_lane_does_not_block_other_lanes():
+    recorder = Recorder()
+    recorder.release.clear()
+    pool = ConsumerPool(recorder, size=4)
+    pool.set_limit("slow", 1)
+    pool.start()
+    try:
+        for i in range(5):
+            await pool.submit("slow", i)
+        for i in range(5):
+            await pool.submit("fast", i)
+        await wait_until(lambda: len([lane for lane, _ in recorder.done if lane == "fast"]) == 5)
+        assert recorder.running["slow"] == 1
+        assert pool.pending == 4
+
+        recorder.release.set()
+        await wait_until(lambda: len(recorder.done) == 10)
+    finally:
+        await pool.stop()
+
+    assert recorder.peak["slow"] == 1
+
+
+async def test_offer_bounds_the_backlog_of_limited_lanes():
+    recorder = Recorder()
+    recorder.release.clear()
+    pool = ConsumerPool(recorder, size=4)
+    pool.set_limit("slow", 1)
+    pool.start()
+    try:
+        assert await pool.offer("slow", 1)
+        await wait_until(lambda: recorder.running.get("slow") == 1)
+        assert await pool.offer("slow", 2)
+        assert not await pool.offer("slow", 3)
+        assert await pool.offer("fast", 1)
+
+        recorder.release.set()
+        await wait_until(lambda: len(recorder.done) == 3)
+        assert await pool.offer("slow", 3)
+        await wait_until(lambda: len(recorder.done) == 4)
+    finally:
+        await pool.stop()
+
+
+async def test_default_limit_applies_to_lanes_without_one():
+    recorder = Recorder()
+    pool = ConsumerPool(recorder, size=8, default_limit=3)
+    pool.start()
+    try:
+        for i in range(12):
+            await pool.submit("other", i)
+        await wait_until(lambda: len(recorder.done) == 12)
+    finally:
+        await pool.stop()
+
+    assert recorder.peak["other"] == 3
+
+
+async def test_failed_item_does_not_stop_the_worker():
+    recorder = Recorder()
+    pool = ConsumerPool(recorder, size=1)
+    pool.start()
+    try:
+        await pool.submit("lane", "fail")
+        await pool.submit("lane", "next")
+        await wait_until(lambda: recorder.done == [("lane", "next")])
+    finally:
+        await pool.stop()
+
+
+async def test_stop_cancels_workers_and_drops_queued_items():
+    recorder = Recorder()
+    recorder.release.clear()
+    pool = ConsumerPool(recorder, size=1)
+    pool.start()
+    await pool.submit("slow", 1)
+    await pool.submit("slow", 2)
+    await wait_until(lambda: recorder.running.get("slow") == 1)
+
+    await pool.stop()
+
+    assert not pool.is_running
+    assert pool.pending == 0
+    assert recorder.done == []
+
+
+async def test_tenants_are_served_in_proportion_to_their_weights():
+    served = []
+
+    async def execute(lane, item):
+        served.append(item)
+
+    pool = ConsumerPool(execute, size=1, weights={"interactive": 3})
+    for i in range(4):
+        await pool.submit("resize", "interactive", tenant="interactive")
+        await pool.submit("resize", "backfill", tenant="backfill")
+    pool.start()
+    try:
+        await wait_until(lambda: len(served) == 8)
+    finally:
+        await pool.stop()
+
+    assert served[:4].count("interactive") == 3
+    assert served[4:] == ["interactive", "backfill", "backfill", "backfill"]
+
+
+async def test_higher_priority_items_run_first_within_a_lane():
+    served = []
+
+    async def execute(lane, item):
+        served.append(item)
+
+    pool = ConsumerPool(execute, size=1)
+    for item, priority in (("low", 0), ("urgent", 9), ("normal", 1), ("low again", 0)):
+        await pool.submit("resize", item, priority=priority)
+    pool.start()
+    try:
+        await wait_until(lambda: len(served) == 4)
+    finally:
+        await pool.stop()
+
+    assert served == ["urgent", "normal", "low", "low again"]
@@ -0,0 +1,181 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APITimeoutError, RateLimitError
+
+from app.services import hedging
+from app.services.hedging import Hedger, LatencyTracker, RetryBudget
+
+pytestmark = pytest.mark.anyio
+
+
+def timeout_error() -> APITimeoutError:
+    return APITimeoutError(request=httpx.Request("POST", "http://upstream.test/v1/chat/completions"))
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Retry without waiting out the jittered backoff."""
+    monkeypatch.setattr(hedging.random, "uniform", lambda low, high: 0.0)
+
+
+def test_quantile_of_the_window():
+    tracker = LatencyTracker(window=4)
+    assert tracker.quantile(0.95) is None
+
+    for seconds in (9.0, 1.0, 2.0, 3.0, 4.0):
+        tracker.record(seconds)
+
+    assert len(tracker) == 4
+    assert tracker.quantile(0.5) == 3.0
+    assert tracker.quantile(0.95) == 4.0
+
+
+def test_budget_allows_a_burst_then_a_share_of_requests():
+    budget = RetryBudget(percent=50, max_tokens=2)
+
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert not budget.try_spend()
+    budget.deposit()
+    assert budget.try_spend()
+
+
+def test_budget_is_capped():
+    budget = RetryBudget(percent=100, max_tokens=1)
+    for _ in range(5):
+        budget.deposit()
+    assert budget.tokens == 1
+
+
+def test_hedge_delay_waits_for_samples_and_has_a_floor():
+    hedger = Hedger(min_delay=0.5, min_samples=3)
+    hedger.record_latency(0.1)
+    hedger.record_latency(0.2)
+    assert hedger.hedge_delay() is None
+
+    hedger.record_latency(0.3)
+    assert hedger.hedge_delay() == 0.5
+    for _ in range(3):
+        hedger.record_latency(2.0)
+    assert hedger.hedge_delay() == 2.0
+
+
+def test_backoff_honours_retry_after():
+    hedger = Hedger(max_delay=5.0)
+    request = httpx.Request("POST", "http://upstream.test")
+    limited = RateLimitError(
+        "rate limited",
+        response=httpx.Response(429, headers={"retry-after": "3"}, request=request),
+        body=None,
+    )
+    too_long = RateLimitError(
+        "rate limited",
+        response=httpx.Response(429, headers={"retry-after": "60"}, request=request),
+        body=None,
+    )
+
+    assert hedger._backoff(0, limited) == 3.0
+    assert hedger._backoff(0, too_long) == 5.0
+    assert hedger._backoff(0, timeout_error()) == 0.0
+
+
+async def test_retryable_errors_are_retried():
+    hedger = Hedger(max_retries=2)
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise timeout_error()
+        return "ok"
+
+    assert await hedger.run(flaky) == "ok"
+    assert len(calls) == 3
+
+
+async def test_retries_stop_at_the_limit_and_other_errors_are_not_retried():
+    hedger = Hedger(max_retries=1)
+    calls = []
+
+    async def always_times_out():
+        calls.append(1)
+        raise timeout_error()
+
+    with pytest.raises(APITimeoutError):
+        await hedger.run(always_times_out)
+    assert len(calls) == 2
+
+    async def broken():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await hedger.run(broken)
+    assert len(calls) == 3
+
+
+async def test_retries_stop_when_the_budget_is_exhausted():
+    hedger = Hedger(max_retries=5)
+    hedger.budget = RetryBudget(percent=0, max_tokens=1)
+    calls = []
+
+    async def always_times_out():
+        calls.append(1)
+        raise timeout_error()
+
+    with pytest.raises(APITimeoutError):
+        await hedger.run(always_times_out)
+    assert len(calls) == 2
+
+
+async def test_slow_call_is_hedged_and_the_loser_cancelled():
+    hedger = Hedger(min_delay=0.01, min_samples=1)
+    hedger.record_latency(0.01)
+    started = []
+    cancelled = []
+
+    async def call():
+        attempt = len(started)
+        started.append(attempt)
+        try:
+            await asyncio.sleep(10 if attempt == 0 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(attempt)
+            raise
+        return attempt
+
+    assert await hedger.run(call) == 1
+    await asyncio.sleep(0)
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+
+async def test_fast_call_is_not_hedged():
+    hedger = Hedger(min_delay=1.0, min_samples=1)
+    hedger.record_latency(1.0)
+    started = []
+
+    async def call():
+        started.append(1)
+        return "fast"
+
+    assert await hedger.run(call) == "fast"
+    assert len(started) == 1
+
+
+async def test_no_hedge_without_budget():
+    hedger = Hedger(min_delay=0.01, min_samples=1)
+    hedger.record_latency(0.01)
+    hedger.budget = RetryBudget(percent=0, max_tokens=0)
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    assert await hedger.run(call) == "primary"
+    assert len(started) == 1
@@ -0,0 +1,54 @@
+import httpx
+import pytest
+from prometheus_client import REGISTRY
+
+from app.config import Settings
+from app.utils import http_client
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def shared_client():
+    yield
+    await http_client.close_http_client()
+
+
+async def test_callers_share_one_client_until_it_is_closed(shared_client):
+    client = http_client.get_http_client()
+
+    assert http_client.get_http_client() is client
+    await http_client.close_http_client()
+    assert client.is_closed
+    assert http_client.get_http_client() is not client
+
+
+async def test_pool_and_timeouts_come_from_settings():
+    settings = Settings(
+        HTTP_CLIENT_MAX_CONNECTIONS=7,
+        HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS=3,
+        HTTP_CLIENT_CONNECT_TIMEOUT=1.5,
+        HTTP_CLIENT_READ_TIMEOUT=42,
+    )
+    client = http_client.create_http_client(settings)
+    try:
+        pool = client._transport._pool
+        assert pool._max_connections == 7
+        assert pool._max_keepalive_connections == 3
+        assert client.timeout.connect == 1.5
+        assert client.timeout.read == 42
+    finally:
+        await client.aclose()
+
+
+async def test_responses_are_counted_by_host_and_status():
+    client = http_client.create_http_client(Settings())
+    client._transport = httpx.MockTransport(lambda request: httpx.Response(204))
+    labels = {"host": "backend.test", "status": "204"}
+    before = REGISTRY.get_sample_value("outbound_http_requests_total", labels) or 0.0
+    try:
+        await client.get("http://backend.test/api")
+    finally:
+        await client.aclose()
+
+    assert REGISTRY.get_sample_value("outbound_http_requests_total", labels) == before + 1
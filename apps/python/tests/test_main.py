@@ -0,0 +1,65 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+from loguru import logger
+
+from app import main
+
+
+@pytest.fixture
+def client():
+    # Without entering the client as a context manager, startup (broker connections) is not run
+    return TestClient(main.app)
+
+
+def test_liveness_does_not_depend_on_startup(client):
+    assert client.get("/health/live").json() == {"status": "alive"}
+
+
+def test_readiness_waits_for_startup(client, monkeypatch):
+    monkeypatch.setattr(main, "ready", False)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+    monkeypatch.setattr(main, "ready", True)
+    assert client.get("/health/ready").json() == {"status": "ready"}
+
+
+def test_openai_sdk_and_tokenizer_are_not_imported_at_boot():
+    code = (
+        "import sys, app.main; "
+        "print(sorted(m for m in ('openai', 'tiktoken', 'app.services.openai_service') if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip().splitlines()[-1] == "[]"
+
+
+@pytest.mark.anyio
+async def test_background_failures_are_logged_but_cancellations_are_not():
+    messages = []
+    sink = logger.add(messages.append, level="ERROR", format="{message}")
+
+    async def fail():
+        raise RuntimeError("schema fetch failed")
+
+    async def wait_forever():
+        await asyncio.Event().wait()
+
+    try:
+        failed = main.run_in_background(fail())
+        cancelled = main.run_in_background(asyncio.gather(wait_forever()))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.gather(failed, cancelled, return_exceptions=True)
+        await asyncio.sleep(0)
+    finally:
+        logger.remove(sink)
+
+    assert not main.background_tasks
+    assert len(messages) == 1
+    assert "schema fetch failed" in messages[0]
@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.utils.metrics import MetricsMiddleware, render_metrics
+
+
+def request_count(method: str, route: str, status: str) -> float:
+    labels = {"method": method, "route": route, "status": status}
+    return REGISTRY.get_sample_value("http_request_duration_seconds_count", labels) or 0.0
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/metrics")
+    async def metrics():
+        return "ok"
+
+    return app
+
+
+def test_requests_are_recorded_by_route_template():
+    client = TestClient(create_app())
+    before = request_count("GET", "/items/{item_id}", "200")
+
+    client.get("/items/1")
+    client.get("/items/2")
+
+    assert request_count("GET", "/items/{item_id}", "200") == before + 2
+
+
+def test_unmatched_routes_share_one_label():
+    client = TestClient(create_app())
+    before = request_count("GET", "unmatched", "404")
+
+    client.get("/no/such/route")
+
+    assert request_count("GET", "unmatched", "404") == before + 1
+
+
+def test_metrics_scrapes_are_not_recorded():
+    client = TestClient(create_app())
+
+    client.get("/metrics")
+
+    assert request_count("GET", "/metrics", "200") == 0
+
+
+def test_render_metrics_uses_the_prometheus_text_format():
+    payload, content_type = render_metrics()
+
+    assert content_type.startswith("text/plain")
+    assert b"http_request_duration_seconds" in payload
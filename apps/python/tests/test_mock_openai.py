@@ -0,0 +1,67 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI, RateLimitError
+
+from app.config import Settings
+from app.routers.mock_openai import MockUpstream, create_mock_app
+
+
+def mock_settings(**overrides) -> Settings:
+    options = {"OPENAI_MOCK_TTFT_MS": 0, "OPENAI_MOCK_TOKENS_PER_SECOND": 0, "OPENAI_MOCK_TOKENS": 3}
+    options.update(overrides)
+    return Settings(**options)
+
+
+def openai_client(settings: Settings) -> AsyncOpenAI:
+    transport = httpx.ASGITransport(app=create_mock_app(settings))
+    return AsyncOpenAI(
+        api_key="test",
+        base_url="http://mock/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=transport),
+    )
+
+
+def test_completion_is_capped_by_max_tokens():
+    client = TestClient(create_mock_app(mock_settings()))
+
+    response = client.post("/v1/chat/completions", json={"model": "m", "messages": [], "max_tokens": 2})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["choices"][0]["message"]["content"] == "tok0 tok1 "
+    assert body["usage"]["completion_tokens"] == 2
+
+
+@pytest.mark.anyio
+async def test_openai_client_reads_completions_and_streams():
+    client = openai_client(mock_settings())
+    messages = [{"role": "user", "content": "Hello"}]
+
+    completion = await client.chat.completions.create(model="mock-model", messages=messages)
+    assert completion.model == "mock-model"
+    assert completion.choices[0].message.content == "tok0 tok1 tok2 "
+
+    stream = await client.chat.completions.create(model="mock-model", messages=messages, stream=True)
+    chunks = [chunk async for chunk in stream]
+    assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == "tok0 tok1 tok2 "
+    assert chunks[-1].choices[0].finish_reason == "stop"
+
+
+@pytest.mark.anyio
+async def test_injected_rate_limit_carries_retry_after():
+    client = openai_client(mock_settings(OPENAI_MOCK_RATE_LIMIT_RATE=1.0, OPENAI_MOCK_RETRY_AFTER_SECONDS=7))
+
+    with pytest.raises(RateLimitError) as error:
+        await client.chat.completions.create(model="mock-model", messages=[])
+    assert error.value.response.headers["retry-after"] == "7"
+
+
+def test_seeded_failures_are_reproducible():
+    settings = mock_settings(OPENAI_MOCK_ERROR_RATE=0.5, OPENAI_MOCK_SEED=42)
+    first, second = MockUpstream(settings), MockUpstream(settings)
+
+    outcomes = [first.injected_failure() is None for _ in range(20)]
+    assert outcomes == [second.injected_failure() is None for _ in range(20)]
+    assert True in outcomes and False in outcomes
@@ -0,0 +1,125 @@
+import pytest
+
+from app.config import Settings
+from app.services import model_router
+from app.services.model_router import MIN_HEALTH, ModelRouter, UnknownModelError, create_model_router, parse_model_weights
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_router.time, "monotonic", clock)
+    return clock
+
+
+def names(plan):
+    return [backend.name for backend in plan]
+
+
+def test_parse_model_weights():
+    assert parse_model_weights("gpt-4o=3, gpt-4o-mini, off=0,, neg=-1") == {
+        "gpt-4o": 3.0, "gpt-4o-mini": 1.0, "off": 0.0, "neg": 0.0
+    }
+
+
+def test_named_model_must_be_configured():
+    router = ModelRouter("gpt-4o", fallbacks=["gpt-4o-mini"])
+
+    assert router.pool() == ["gpt-4o"]
+    assert router.pool("gpt-4o-mini") == ["gpt-4o-mini"]
+    with pytest.raises(UnknownModelError):
+        router.plan("gpt-5")
+
+
+def test_zero_weight_routes_are_only_reachable_by_name():
+    router = ModelRouter("a", routes={"a": 1, "b": 0})
+
+    assert router.pool() == ["a"]
+    assert router.pool("b") == ["b"]
+
+
+def test_plan_tries_fallbacks_in_order_up_to_max_attempts():
+    router = ModelRouter("gpt-4o", fallbacks=["gpt-4o-mini", "gpt-3.5-turbo"], max_attempts=2)
+    assert names(router.plan()) == ["gpt-4o#0", "gpt-4o-mini#0"]
+
+    router.max_attempts = 5
+    assert names(router.plan()) == ["gpt-4o#0", "gpt-4o-mini#0", "gpt-3.5-turbo#0"]
+    assert names(router.plan("gpt-4o-mini")) == ["gpt-4o-mini#0", "gpt-3.5-turbo#0"]
+
+
+def test_fallbacks_with_a_smaller_context_window_are_skipped():
+    router = ModelRouter("gpt-4o", fallbacks=["gpt-4", "gpt-4o-mini"], max_attempts=5)
+
+    assert names(router.plan(required_tokens=20000)) == ["gpt-4o#0", "gpt-4o-mini#0"]
+
+
+def test_context_window_is_the_smallest_in_the_pool():
+    router = ModelRouter("gpt-4o", routes={"gpt-4o": 1, "gpt-4": 1})
+
+    assert router.context_window() == 8192
+    assert router.context_window("gpt-4o") == 128000
+    assert ModelRouter("gpt-4o", context_window_override=500).context_window() == 500
+
+
+def test_cooling_backend_is_tried_last(clock):
+    router = ModelRouter("m", api_keys=["k0", "k1", "k2"], max_attempts=3)
+    router.backends["m"][0].stats.record_failure(cooldown=30)
+    router.backends["m"][2].stats.record_failure(cooldown=10)
+
+    assert names(router.plan()) == ["m#1", "m#2", "m#0"]
+    clock.now += 10
+    assert names(router.plan())[-1] == "m#0"
+    clock.now += 20
+    assert not router.backends["m"][0].stats.cooling_down
+
+
+def test_faster_and_healthier_backends_score_higher():
+    router = ModelRouter("m", api_keys=["fast", "slow"])
+    fast, slow = router.backends["m"]
+    fast.stats.record_success("completion", 1.0)
+    slow.stats.record_success("completion", 2.0)
+
+    assert router._score(fast, "completion", 1.0) == pytest.approx(4 * router._score(slow, "completion", 1.0))
+    assert router._score(slow, "stream", None) == router._score(fast, "stream", None)
+
+    for _ in range(100):
+        slow.stats.record_failure()
+    assert router._score(slow, "stream", None) == pytest.approx(slow.weight * MIN_HEALTH)
+
+
+def test_ready_backends_are_ordered_by_score_after_the_weighted_pick(monkeypatch):
+    monkeypatch.setattr(model_router.random, "choices", lambda population, weights: [population[-1]])
+    router = ModelRouter("m", api_keys=["k0", "k1", "k2"])
+    for backend, seconds in zip(router.backends["m"], (3.0, 1.0, 2.0)):
+        backend.stats.record_success("completion", seconds)
+
+    assert names(router.plan()) == ["m#2", "m#1", "m#0"]
+
+
+def test_fallback_needs_another_backend_and_attempt():
+    assert not ModelRouter("m").can_fall_back
+    assert not ModelRouter("m", api_keys=["k0", "k1"], max_attempts=1).can_fall_back
+    assert ModelRouter("m", api_keys=["k0", "k1"]).can_fall_back
+    assert ModelRouter("m", fallbacks=["n"]).can_fall_back
+
+
+def test_router_from_settings_splits_weight_across_keys():
+    router = create_model_router(Settings(
+        OPENAI_MODEL="gpt-4o",
+        OPENAI_MODEL_ROUTES="gpt-4o=2,gpt-4o-mini=1",
+        OPENAI_FALLBACK_MODELS="gpt-3.5-turbo",
+        OPENAI_API_KEYS="k0, k1",
+    ))
+
+    assert router.models == ["gpt-4o", "gpt-4o-mini", "gpt-3.5-turbo"]
+    assert [backend.weight for backend in router.backends["gpt-4o"]] == [1.0, 1.0]
+    assert [backend.api_key for backend in router.backends["gpt-4o-mini"]] == ["k0", "k1"]
+    assert "k0" not in str(router.stats())
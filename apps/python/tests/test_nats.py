@@ -0,0 +1,233 @@
+import asyncio
+
+import nats
+import pytest
+from prometheus_client import REGISTRY
+
+from app.config import Settings
+from app.messaging.nats import PUBLISHED_AT_HEADER, SERVICE_ERROR_HEADER, NatsService, RPCError, subject_matches
+from app.utils import codec
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeMessage:
+    def __init__(self, subject: str, data: bytes = b"{}", headers=None, reply: str = ""):
+        self.subject = subject
+        self.data = data
+        self.headers = headers
+        self.reply = reply
+        self.acked = False
+        self.naked = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nak(self):
+        self.naked = True
+
+
+class FakeClient:
+    """NATS client that records publishes and answers requests with a canned reply."""
+
+    def __init__(self, reply=None, error=None):
+        self.reply = reply
+        self.error = error
+        self.published = []
+        self.requests = []
+        self.callbacks = {}
+
+    async def publish(self, subject, payload, headers=None):
+        self.published.append((subject, payload, headers))
+
+    async def subscribe(self, subject, queue="", cb=None):
+        self.callbacks[subject] = cb
+
+    async def request(self, subject, payload, timeout, headers=None):
+        self.requests.append((subject, codec.decode(payload), timeout))
+        if self.error:
+            raise self.error
+        return self.reply
+
+
+def connected_service(client: FakeClient, **settings) -> NatsService:
+    service = NatsService(Settings(**settings))
+    service.client = client
+    service.is_connected = True
+    service.breaker.reset()
+    return service
+
+
+class FakeSubscription:
+    """Pull subscription that hands out queued messages and records the batch sizes asked for."""
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.batches = []
+        self.drained = asyncio.Event()
+
+    async def fetch(self, batch, timeout):
+        if not self.messages:
+            self.drained.set()
+            await asyncio.Event().wait()
+        self.batches.append(batch)
+        fetched, self.messages = self.messages[:batch], self.messages[batch:]
+        return fetched
+
+
+async def wait_until(predicate, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.parametrize("subject, pattern, expected", [
+    ("task.completed", "task.completed", True),
+    ("task.completed", "task.*", True),
+    ("task.completed", "task.>", True),
+    ("task.a.b", "task.>", True),
+    ("task", "task.>", False),
+    ("task.a.b", "task.*", False),
+    ("task.a", "*.a", True),
+    ("other.completed", "task.*", False),
+    ("task", "task.completed", False),
+])
+def test_subject_matches(subject, pattern, expected):
+    assert subject_matches(subject, pattern) is expected
+
+
+def test_only_configured_subjects_use_jetstream():
+    service = NatsService(Settings(NATS_JETSTREAM_ENABLED=True, NATS_JETSTREAM_SUBJECTS="task.>, audit.*"))
+    assert service.uses_jetstream("task.completed")
+    assert service.uses_jetstream("audit.login")
+    assert not service.uses_jetstream("rpc.echo")
+
+    assert not NatsService(Settings(NATS_JETSTREAM_ENABLED=False)).uses_jetstream("task.completed")
+
+
+async def test_pull_loop_fetches_only_as_many_messages_as_free_slots():
+    service = NatsService(Settings(NATS_PULL_CONCURRENCY=2, NATS_PULL_BATCH_SIZE=64))
+    messages = [FakeMessage(f"task.{index}") for index in range(5)]
+    subscription = FakeSubscription(messages)
+    release = asyncio.Event()
+    running = []
+
+    async def callback(msg):
+        running.append(msg)
+        await release.wait()
+
+    loop = asyncio.create_task(service._pull_loop(subscription, callback))
+    try:
+        await wait_until(lambda: len(running) == 2)
+        await asyncio.sleep(0.01)
+        assert subscription.batches == [2]
+
+        release.set()
+        await asyncio.wait_for(subscription.drained.wait(), 1)
+        await wait_until(lambda: all(msg.acked for msg in messages))
+        assert max(subscription.batches) <= 2
+    finally:
+        loop.cancel()
+        await asyncio.gather(loop, return_exceptions=True)
+
+
+async def test_failed_jetstream_message_is_negatively_acknowledged():
+    service = NatsService(Settings())
+    msg = FakeMessage("task.failed")
+
+    async def callback(msg):
+        raise RuntimeError("handler failed")
+
+    await service._process_jetstream_message(msg, callback)
+    assert msg.naked and not msg.acked
+
+
+async def test_request_returns_the_decoded_reply():
+    client = FakeClient(reply=FakeMessage("_INBOX.1", codec.encode({"sum": 3})))
+    service = connected_service(client, NATS_RPC_TIMEOUT_SECONDS=2.5)
+
+    assert await service.request("rpc.add", {"a": 1, "b": 2}) == {"sum": 3}
+    assert client.requests == [("task.rpc.add", {"a": 1, "b": 2}, 2.5)]
+
+
+async def test_request_raises_the_handler_error():
+    reply = FakeMessage("_INBOX.1", b"", headers={SERVICE_ERROR_HEADER: "boom", "Nats-Service-Error-Code": "422"})
+    service = connected_service(FakeClient(reply=reply))
+
+    with pytest.raises(RPCError) as error:
+        await service.request("rpc.add", {})
+    assert error.value.code == "422"
+
+
+async def test_request_without_responders_fails_fast():
+    service = connected_service(FakeClient(error=nats.errors.NoRespondersError()))
+
+    with pytest.raises(nats.errors.NoRespondersError):
+        await service.request("rpc.missing", {})
+
+
+async def test_handler_replies_with_the_result_or_the_error():
+    client = FakeClient()
+    service = connected_service(client)
+    service.is_connected = False
+
+    @service.handler("rpc.divide", concurrency=4)
+    async def divide(data):
+        return {"quotient": data["a"] / data["b"]}
+
+    subject, serve, options = service.subscriptions[-1]
+    assert subject == "rpc.divide"
+    assert options == {"queue": "python-service", "concurrency": 4}
+
+    await serve(FakeMessage("task.rpc.divide", codec.encode({"a": 6, "b": 3}), reply="_INBOX.1"))
+    await serve(FakeMessage("task.rpc.divide", codec.encode({"a": 1, "b": 0}), reply="_INBOX.2"))
+
+    (inbox, payload, headers), (error_inbox, _, error_headers) = client.published
+    assert (inbox, codec.decode(payload), headers) == ("_INBOX.1", {"quotient": 2.0}, None)
+    assert error_inbox == "_INBOX.2"
+    assert "division by zero" in error_headers[SERVICE_ERROR_HEADER]
+
+
+async def test_bounded_callbacks_run_concurrently_up_to_the_limit():
+    service = NatsService(Settings())
+    release = asyncio.Event()
+    running = []
+
+    async def callback(msg):
+        running.append(msg)
+        await release.wait()
+
+    dispatch = service._bounded(callback, 2)
+    await dispatch(FakeMessage("a"))
+    await dispatch(FakeMessage("b"))
+    third = asyncio.create_task(dispatch(FakeMessage("c")))
+    await asyncio.sleep(0.01)
+    assert len(running) == 2 and not third.done()
+
+    release.set()
+    await asyncio.wait_for(third, 1)
+    await wait_until(lambda: len(running) == 3 and not service._background)
+
+
+async def test_delivery_lag_is_measured_from_the_publish_timestamp():
+    client = FakeClient()
+    service = connected_service(client, NATS_SUBJECT_PREFIX="lag")
+    received = []
+
+    async def callback(msg):
+        received.append(service.decode_message(msg))
+
+    await service.subscribe("events.created", callback)
+    await service.publish("events.created", {"id": 1})
+    subject, payload, headers = client.published[0]
+    assert service.published_at(FakeMessage(subject, payload, headers)) is not None
+
+    labels = {"subject": subject}
+    before = REGISTRY.get_sample_value("nats_delivery_lag_seconds_count", labels) or 0.0
+    await client.callbacks[subject](FakeMessage(subject, payload, headers))
+    await client.callbacks[subject](FakeMessage(subject, payload))
+
+    assert received == [{"id": 1}, {"id": 1}]
+    assert REGISTRY.get_sample_value("nats_delivery_lag_seconds_count", labels) == before + 1
+    assert REGISTRY.get_sample_value("nats_callback_duration_seconds_count", labels) >= 2
@@ -0,0 +1,257 @@
+import pytest
+
+from app.config import Settings
+from app.messaging.consumer_pool import DEFAULT_TENANT
+from app.messaging.rabbitmq import (
+    DEAD_LETTER_REASON_HEADER,
+    EXHAUSTED,
+    LAST_ERROR_HEADER,
+    POISON,
+    RETRY_COUNT_HEADER,
+    PoisonMessageError,
+    RabbitMQService,
+    parse_weights,
+)
+from app.utils import codec
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeMessage:
+    """Received message that records how it was settled."""
+
+    def __init__(self, body, headers=None, content_type="application/json", priority=None, redelivered=False):
+        self.body = body if isinstance(body, bytes) else codec.encode(body)
+        self.headers = headers or {}
+        self.content_type = content_type
+        self.content_encoding = None
+        self.delivery_mode = 2
+        self.priority = priority
+        self.redelivered = redelivered
+        self.correlation_id = None
+        self.message_id = None
+        self.settled = None
+
+    async def ack(self):
+        self.settled = "ack"
+
+    async def nack(self, requeue=True):
+        self.settled = "requeue" if requeue else "nack"
+
+
+class FakeExchange:
+    def __init__(self, fail=False):
+        self.published = []
+        self.fail = fail
+
+    async def publish(self, message, routing_key):
+        if self.fail:
+            raise ConnectionError("channel closed")
+        self.published.append((routing_key, message))
+
+
+class FakeChannel:
+    def __init__(self):
+        self.default_exchange = FakeExchange()
+
+
+def create_service(**settings) -> RabbitMQService:
+    service = RabbitMQService(Settings(**settings))
+    service.channel = FakeChannel()
+    service.dead_letter_exchange = FakeExchange()
+    return service
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    service = create_service(RABBITMQ_RETRY_BASE_DELAY_MS=500, RABBITMQ_RETRY_MAX_DELAY_MS=3000)
+    assert [service._retry_delay(retry) for retry in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (b"{not json", "application/json"),
+    ({"data": 1}, "application/json"),
+    ([1, 2], "application/json"),
+    ({"type": "unknown"}, "application/json"),
+])
+def test_unhandleable_messages_are_poison(body, content_type):
+    service = create_service()
+    service.register_task_handler("resize", lambda data: None)
+
+    with pytest.raises(PoisonMessageError):
+        service._parse_task(FakeMessage(body, content_type=content_type))
+
+
+async def test_failed_task_is_parked_in_its_retry_queue():
+    service = create_service(RABBITMQ_MAX_ATTEMPTS=3)
+
+    async def fail(data):
+        raise RuntimeError("upstream down")
+
+    service.register_task_handler("resize", fail)
+    message = FakeMessage({"type": "resize"}, headers={RETRY_COUNT_HEADER: 1})
+    await service.process_message(message)
+
+    [(routing_key, retry)] = service.channel.default_exchange.published
+    assert routing_key == "tasks.retry.2"
+    assert retry.headers[RETRY_COUNT_HEADER] == 2
+    assert retry.headers[LAST_ERROR_HEADER] == "upstream down"
+    assert retry.expiration == 2.0
+    assert message.settled == "ack"
+
+
+async def test_task_is_dead_lettered_once_its_attempts_are_used_up():
+    service = create_service(RABBITMQ_MAX_ATTEMPTS=3)
+    notified = []
+
+    async def fail(data):
+        raise RuntimeError("still down")
+
+    async def listener(task_type, data, error):
+        notified.append((task_type, data, error))
+
+    service.register_task_handler("resize", fail)
+    service.add_dead_letter_listener(listener)
+    message = FakeMessage({"type": "resize", "id": 7}, headers={RETRY_COUNT_HEADER: 2})
+    await service.process_message(message)
+
+    assert service.channel.default_exchange.published == []
+    [(routing_key, dead)] = service.dead_letter_exchange.published
+    assert routing_key == "tasks"
+    assert dead.headers[DEAD_LETTER_REASON_HEADER] == EXHAUSTED
+    assert message.settled == "ack"
+    assert notified == [("resize", {"type": "resize", "id": 7}, "still down")]
+
+
+async def test_poison_message_is_dead_lettered_without_retrying():
+    service = create_service()
+    message = FakeMessage({"type": "unknown"})
+    await service.process_message(message)
+
+    [(_, dead)] = service.dead_letter_exchange.published
+    assert dead.headers[DEAD_LETTER_REASON_HEADER] == POISON
+    assert RETRY_COUNT_HEADER not in dead.headers
+    assert message.settled == "ack"
+
+
+async def test_task_is_requeued_when_its_retry_cannot_be_published():
+    service = create_service()
+    service.channel.default_exchange.fail = True
+
+    async def fail(data):
+        raise RuntimeError("upstream down")
+
+    service.register_task_handler("resize", fail)
+    message = FakeMessage({"type": "resize"})
+    await service.process_message(message)
+
+    assert message.settled == "requeue"
+
+
+async def test_redelivered_task_counts_as_a_failed_attempt():
+    service = create_service(RABBITMQ_MAX_ATTEMPTS=3)
+    handled = []
+
+    async def handle(data):
+        handled.append(data)
+
+    service.register_task_handler("resize", handle)
+    crashed = FakeMessage({"type": "resize"}, headers={RETRY_COUNT_HEADER: 1}, redelivered=True)
+    await service.process_message(crashed)
+
+    assert handled == []
+    [(routing_key, retry)] = service.channel.default_exchange.published
+    assert routing_key == "tasks.retry.2"
+    assert retry.headers[RETRY_COUNT_HEADER] == 2
+    assert crashed.settled == "ack"
+
+    # The copy crashes its worker again and is dead-lettered instead of looping forever
+    crashed_again = FakeMessage({"type": "resize"}, headers=retry.headers, redelivered=True)
+    await service._dispatch_message(crashed_again)
+
+    [(_, dead)] = service.dead_letter_exchange.published
+    assert dead.headers[DEAD_LETTER_REASON_HEADER] == EXHAUSTED
+    assert handled == []
+
+
+async def test_successful_task_is_acknowledged():
+    service = create_service()
+    handled = []
+
+    async def handle(data):
+        handled.append(data)
+
+    service.register_task_handler("resize", handle)
+    message = FakeMessage({"type": "resize", "id": 1})
+    await service.process_message(message)
+
+    assert handled == [{"type": "resize", "id": 1}]
+    assert message.settled == "ack"
+
+
+def test_parse_weights_ignores_entries_without_a_weight():
+    assert parse_weights("interactive=4, backfill=1,bad,zero=0") == {"interactive": 4, "backfill": 1, "zero": 1}
+    assert parse_weights("") == {}
+
+
+def test_shared_queue_is_the_work_queue_without_priorities():
+    service = create_service()
+
+    assert service.work_queue_name == "tasks"
+    assert service.consumed_queue_names == ["tasks"]
+    assert service._queue_arguments("tasks") == {}
+    assert service._retry_queue_name(1) == "tasks.retry.1"
+
+
+def test_priority_queue_is_consumed_alongside_the_shared_queue():
+    service = create_service(RABBITMQ_MAX_PRIORITY=10)
+
+    assert service.work_queue_name == "tasks.priority"
+    assert service.consumed_queue_names == ["tasks.priority", "tasks"]
+    assert service._queue_arguments("tasks.priority") == {"x-max-priority": 10}
+    assert service._queue_arguments("tasks") == {}
+    assert service._retry_queue_name(1) == "tasks.priority.retry.1"
+
+
+def test_routing_key_carries_tenant_and_type():
+    service = create_service()
+
+    assert service.task_routing_key("resize", "acme") == "task.acme.resize"
+    assert service.task_routing_key("resize") == f"task.{DEFAULT_TENANT}.resize"
+
+
+async def test_messages_are_dispatched_to_their_tenant_and_priority():
+    service = create_service()
+    service.register_task_handler("resize", lambda data: None)
+    submitted = []
+
+    async def offer(lane, item, tenant, priority):
+        submitted.append((lane, item[1], tenant, priority))
+        return True
+
+    service.consumer_pool.offer = offer
+    await service._dispatch_message(FakeMessage({"type": "resize"}, headers={"x-tenant": "acme"}, priority=5))
+    await service._dispatch_message(FakeMessage({"type": "resize", "tenant": "globex"}))
+    await service._dispatch_message(FakeMessage({"type": "resize"}))
+
+    assert submitted == [
+        ("resize", {"type": "resize"}, "acme", 5),
+        ("resize", {"type": "resize", "tenant": "globex"}, "globex", 0),
+        ("resize", {"type": "resize"}, DEFAULT_TENANT, 0),
+    ]
+
+
+async def test_tasks_of_a_full_lane_are_deferred_without_using_an_attempt():
+    service = create_service(RABBITMQ_DEFER_DELAY_MS=500)
+    service.register_task_handler("resize", lambda data: None, concurrency=1)
+    first = FakeMessage({"type": "resize"})
+    second = FakeMessage({"type": "resize"}, headers={RETRY_COUNT_HEADER: 1})
+
+    await service._dispatch_message(first)
+    await service._dispatch_message(second)
+
+    assert first.settled is None and service.consumer_pool.pending == 1
+    assert second.settled == "ack"
+    [(routing_key, deferred)] = service.channel.default_exchange.published
+    assert routing_key == "tasks.deferred"
+    assert deferred.headers[RETRY_COUNT_HEADER] == 1
+    assert deferred.expiration == 0.5
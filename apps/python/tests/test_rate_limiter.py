@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import BATCH, DEFAULT, INTERACTIVE, TokenBucket, UpstreamLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(60)
+
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(30) == 0.0
+    assert bucket.tokens == pytest.approx(30)
+    clock.now += 60
+    bucket.refund(0)
+    assert bucket.tokens == 60
+
+
+def test_token_bucket_requests_above_capacity_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.consume(30)
+
+    assert bucket.wait_time(1000) == pytest.approx(30.0)
+    bucket.consume(1000)
+    assert bucket.tokens == -970
+
+
+def test_permit_settle_refunds_unused_tokens(clock):
+    limiter = UpstreamLimiter(tokens_per_minute=1000)
+    limiter.token_bucket.consume(500)
+    permit = rate_limiter.Permit(limiter, 500)
+
+    permit.settle(200)
+
+    assert limiter.token_bucket.tokens == 800
+    assert permit.tokens == 200
+
+
+@pytest.mark.anyio
+async def test_concurrency_is_capped():
+    limiter = UpstreamLimiter(max_concurrency=2)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with limiter.limit():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.001)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(10)))
+
+    assert peak == 2
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_waiters_are_admitted_by_priority():
+    limiter = UpstreamLimiter(max_concurrency=1)
+    order = []
+    holder = await limiter.acquire()
+
+    async def call(priority, name):
+        async with limiter.limit(priority):
+            order.append(name)
+
+    waiters = [
+        asyncio.create_task(call(BATCH, "batch")),
+        asyncio.create_task(call(DEFAULT, "default")),
+        asyncio.create_task(call(INTERACTIVE, "interactive")),
+    ]
+    await asyncio.sleep(0)
+    assert limiter.queued == 3
+    holder.limiter.release()
+    await asyncio.gather(*waiters)
+
+    assert order == ["interactive", "default", "batch"]
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiters_give_up_their_place():
+    limiter = UpstreamLimiter(max_concurrency=1)
+    await limiter.acquire()
+    cancelled = asyncio.create_task(limiter.acquire(INTERACTIVE))
+    waiting = asyncio.create_task(limiter.acquire(BATCH))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.sleep(0)
+    limiter.release()
+
+    await asyncio.wait_for(waiting, 1)
+    assert limiter.in_flight == 1
+    assert limiter.queued == 0
+
+
+@pytest.mark.anyio
+async def test_rate_limited_calls_wait_for_the_bucket():
+    limiter = UpstreamLimiter(requests_per_minute=6000)
+    limiter.request_bucket.tokens = 0
+
+    permit = await asyncio.wait_for(limiter.acquire(), 1)
+    limiter.release()
+
+    assert permit.tokens == 0
+    assert limiter.request_bucket.tokens < 1
+
+
+def test_concurrency_backs_off_on_429_and_grows_back():
+    limiter = UpstreamLimiter(max_concurrency=8)
+
+    limiter.record_rate_limited()
+    limiter.record_rate_limited()
+    assert limiter.concurrency == 2
+
+    for _ in range(2):
+        limiter.record_success()
+    assert limiter.concurrency == 3
+    for _ in range(100):
+        limiter.record_success()
+    assert limiter.concurrency == 8
+
+
+def test_fixed_concurrency_when_not_adaptive():
+    limiter = UpstreamLimiter(max_concurrency=8, adaptive=False)
+
+    limiter.record_rate_limited()
+
+    assert limiter.concurrency == 8
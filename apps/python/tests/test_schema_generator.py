@@ -0,0 +1,104 @@
+import sys
+
+import pytest
+
+import app.models
+import app.models.nestjs_models
+from app.utils import schema_generator
+from app.utils.schema_generator import schema_hash
+
+pytestmark = pytest.mark.anyio
+
+SCHEMA = {"openapi": "3.0.0", "components": {"schemas": {"Task": {"type": "object"}}}}
+CHANGED = {"openapi": "3.0.0", "components": {"schemas": {"Task": {"type": "string"}}}}
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    """Isolate the module's ETag, loaded-models hash and model cache."""
+    monkeypatch.setattr(schema_generator, "_etag", None)
+    monkeypatch.setattr(schema_generator, "_models_hash", schema_hash(SCHEMA))
+    monkeypatch.setattr(schema_generator, "CACHE_DIR", tmp_path)
+    monkeypatch.setitem(sys.modules, schema_generator.MODELS_MODULE, sys.modules[schema_generator.MODELS_MODULE])
+    monkeypatch.setattr(app.models, "nestjs_models", app.models.nestjs_models)
+    return tmp_path
+
+
+def serve(monkeypatch, schema, etag='"v2"'):
+    """Answer schema fetches with ``schema`` (None = not modified) and record the ETags sent."""
+    sent = []
+
+    async def fetch(previous=None):
+        sent.append(previous)
+        return schema, etag
+
+    monkeypatch.setattr(schema_generator, "fetch_openapi_schema", fetch)
+    return sent
+
+
+def test_hash_ignores_key_order_and_formatting():
+    reordered = {"components": {"schemas": {"Task": {"type": "object"}}}, "openapi": "3.0.0"}
+    assert schema_hash(reordered) == schema_hash(SCHEMA)
+    assert schema_hash(CHANGED) != schema_hash(SCHEMA)
+
+
+async def test_not_modified_schema_is_not_regenerated(state, monkeypatch):
+    sent = serve(monkeypatch, None)
+    monkeypatch.setattr(schema_generator, "_etag", '"v1"')
+
+    assert await schema_generator.update_models()
+    assert sent == ['"v1"']
+
+
+async def test_unchanged_schema_only_updates_the_etag(state, monkeypatch):
+    serve(monkeypatch, dict(SCHEMA))
+
+    async def build(schema, digest):
+        raise AssertionError("models should not be generated")
+
+    monkeypatch.setattr(schema_generator, "build_models", build)
+
+    assert await schema_generator.update_models()
+    assert schema_generator._etag == '"v2"'
+
+
+async def test_changed_schema_reloads_models_in_place(state, monkeypatch):
+    serve(monkeypatch, CHANGED)
+    digest = schema_hash(CHANGED)
+    artifact = state / f"{digest}.py"
+    artifact.write_text("class Task:\n    kind = 'string'\n")
+
+    async def generate(input_path, output_path):
+        raise AssertionError("cached models should be reused")
+
+    monkeypatch.setattr(schema_generator, "generate_models", generate)
+
+    assert await schema_generator.update_models()
+    assert schema_generator.get_models().Task.kind == "string"
+    assert app.models.nestjs_models.Task.kind == "string"
+    assert schema_generator._models_hash == digest
+    assert schema_generator._etag == '"v2"'
+
+
+async def test_failed_generation_keeps_the_etag_for_a_retry(state, monkeypatch):
+    serve(monkeypatch, CHANGED)
+    previous = sys.modules[schema_generator.MODELS_MODULE]
+
+    async def generate(input_path, output_path):
+        return False
+
+    monkeypatch.setattr(schema_generator, "generate_models", generate)
+
+    assert not await schema_generator.update_models()
+    assert schema_generator._etag is None
+    assert sys.modules[schema_generator.MODELS_MODULE] is previous
+
+
+def test_broken_models_leave_the_loaded_module_in_place(state):
+    previous = sys.modules[schema_generator.MODELS_MODULE]
+    broken = state / "broken.py"
+    broken.write_text("raise ImportError('bad models')\n")
+
+    with pytest.raises(ImportError):
+        schema_generator.load_models(broken)
+    assert sys.modules[schema_generator.MODELS_MODULE] is previous
@@ -0,0 +1,191 @@
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight, StreamBroadcaster, StreamFlights
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    callers = [asyncio.create_task(flights.do("k", fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*callers) == ["result"] * 5
+    assert calls == 1
+    assert len(flights) == 0
+
+
+async def test_errors_reach_every_caller_and_are_not_remembered():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream failed")
+
+    results = await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def succeed():
+        return "ok"
+
+    assert await flights.do("k", succeed) == "ok"
+
+
+async def test_cancelled_caller_does_not_cancel_the_call_for_others():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "result"
+
+    leader = asyncio.create_task(flights.do("k", fetch))
+    follower = asyncio.create_task(flights.do("k", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+    release.set()
+
+    assert await follower == "result"
+
+
+async def source(chunks, gate=None):
+    for chunk in chunks:
+        if gate is not None:
+            await gate.get()
+        yield chunk
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+async def test_late_subscriber_gets_missed_chunks_then_live_ones():
+    gate = asyncio.Queue()
+    broadcaster = StreamBroadcaster(source(["a", "b", "c"], gate))
+    first = broadcaster.subscribe()
+
+    gate.put_nowait(None)
+    assert await first.__anext__() == "a"
+
+    late = asyncio.create_task(collect(broadcaster.subscribe()))
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+
+    assert await collect(first) == ["b", "c"]
+    assert await late == ["a", "b", "c"]
+
+
+async def test_source_errors_are_raised_to_subscribers():
+    async def failing():
+        yield "a"
+        raise RuntimeError("stream broke")
+
+    broadcaster = StreamBroadcaster(failing())
+    chunks = []
+    with pytest.raises(RuntimeError, match="stream broke"):
+        async for chunk in broadcaster.subscribe():
+            chunks.append(chunk)
+    assert chunks == ["a"]
+
+
+async def test_source_is_cancelled_when_the_last_subscriber_leaves():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "chunk"
+                await asyncio.sleep(0)
+        finally:
+            closed.set()
+
+    broadcaster = StreamBroadcaster(endless())
+    subscriber = broadcaster.subscribe()
+    await subscriber.__anext__()
+    await subscriber.aclose()
+
+    await asyncio.wait_for(closed.wait(), 1)
+    await asyncio.sleep(0)
+    assert broadcaster.done
+
+
+async def test_late_subscriber_racing_the_last_leaver_gets_the_whole_stream():
+    gate = asyncio.Queue()
+    broadcaster = StreamBroadcaster(source(["a", "b"], gate))
+    first = broadcaster.subscribe()
+    gate.put_nowait(None)
+    assert await first.__anext__() == "a"
+
+    # Joined but not yet iterating when the first subscriber disconnects
+    late = broadcaster.subscribe()
+    await first.aclose()
+    gate.put_nowait(None)
+
+    assert await collect(late) == ["a", "b"]
+    assert broadcaster.done
+
+
+async def test_cancelled_source_is_an_ordinary_error_for_subscribers():
+    broadcaster = StreamBroadcaster(source(["a", "b"], asyncio.Queue()))
+    subscriber = asyncio.create_task(collect(broadcaster.subscribe()))
+    await asyncio.sleep(0)
+
+    broadcaster._task.cancel()
+
+    with pytest.raises(RuntimeError, match="upstream stream cancelled"):
+        await subscriber
+    assert not subscriber.cancelled()
+
+
+async def test_stream_flights_do_not_join_a_stream_being_cancelled():
+    flights = StreamFlights()
+    started = 0
+
+    def factory():
+        nonlocal started
+        started += 1
+        return source(["a"], asyncio.Queue() if started == 1 else None)
+
+    first = flights.subscribe("k", factory)
+    await asyncio.sleep(0)
+    await first.aclose()
+
+    assert await collect(flights.subscribe("k", factory)) == ["a"]
+    assert started == 2
+
+
+async def test_stream_flights_share_in_flight_streams_only():
+    flights = StreamFlights()
+    started = 0
+    gate = asyncio.Queue()
+
+    def factory():
+        nonlocal started
+        started += 1
+        return source(["a", "b"], gate)
+
+    first = asyncio.create_task(collect(flights.subscribe("k", factory)))
+    second = asyncio.create_task(collect(flights.subscribe("k", factory)))
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+    assert await first == ["a", "b"] and await second == ["a", "b"]
+    assert started == 1
+
+    await asyncio.sleep(0)
+    assert len(flights) == 0
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+    assert await collect(flights.subscribe("k", factory)) == ["a", "b"]
+    assert started == 2
@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+
+from app.services.stream_registry import ReplayBackend, ResumableStream, StreamGapError, StreamRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+class MemoryReplayBackend(ReplayBackend):
+    """Replay backend shared by registries in one process, standing in for Redis."""
+
+    def __init__(self):
+        self.streams = {}
+        self.finished = {}
+        self.attached_until = {}
+        self.changed = asyncio.Condition()
+
+    async def append(self, stream_id, event, capacity, ttl):
+        async with self.changed:
+            events = self.streams.setdefault(stream_id, [])
+            events.append(event)
+            del events[:-capacity]
+            self.changed.notify_all()
+
+    async def finish(self, stream_id, next_seq, ttl):
+        async with self.changed:
+            self.streams.setdefault(stream_id, [])
+            self.finished[stream_id] = next_seq
+            self.changed.notify_all()
+
+    async def bounds(self, stream_id):
+        if stream_id not in self.streams:
+            return None
+        events = self.streams[stream_id]
+        next_seq = events[-1][0] + 1 if events else self.finished.get(stream_id, 0)
+        return (events[0][0] if events else next_seq), next_seq, stream_id in self.finished
+
+    async def read(self, stream_id, after, timeout):
+        def available():
+            return [event for event in self.streams.get(stream_id, []) if event[0] > after]
+
+        async with self.changed:
+            try:
+                await asyncio.wait_for(self.changed.wait_for(lambda: available() or stream_id in self.finished), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return available(), stream_id in self.finished
+
+    async def attach(self, stream_id, ttl):
+        self.attached_until[stream_id] = asyncio.get_running_loop().time() + ttl
+
+    async def attached(self, stream_id):
+        return self.attached_until.get(stream_id, 0) > asyncio.get_running_loop().time()
+
+
+async def events(count, gate=None):
+    for index in range(count):
+        if gate is not None:
+            await gate.get()
+        yield "message", f"e{index}"
+
+
+async def collect(stream, after=None):
+    return [(sequence, data) async for sequence, _, data in stream.subscribe(after)]
+
+
+async def test_subscriber_receives_every_event_in_order():
+    stream = ResumableStream("s", events(3))
+
+    assert await collect(stream) == [(0, "e0"), (1, "e1"), (2, "e2")]
+
+
+async def test_resume_replays_from_after_the_last_event_id():
+    stream = ResumableStream("s", events(5))
+    await collect(stream)
+
+    assert await collect(stream, after=2) == [(3, "e3"), (4, "e4")]
+    assert await collect(stream, after=4) == []
+
+
+async def test_resume_while_the_generation_is_still_running():
+    gate = asyncio.Queue()
+    stream = ResumableStream("s", events(4, gate), grace=5)
+    first = stream.subscribe()
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+    assert (await first.__anext__())[0] == 0
+    await first.aclose()
+
+    resumed = asyncio.create_task(collect(stream, after=0))
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+
+    assert await resumed == [(1, "e1"), (2, "e2"), (3, "e3")]
+
+
+async def test_events_outside_the_buffer_cannot_be_resumed():
+    stream = ResumableStream("s", events(5), capacity=2)
+    await asyncio.sleep(0.01)
+
+    assert stream.done
+    stream.check_resume(2)
+    with pytest.raises(StreamGapError):
+        stream.check_resume(1)
+    with pytest.raises(StreamGapError):
+        stream.check_resume(10)
+
+
+async def test_connected_subscriber_never_misses_events():
+    stream = ResumableStream("s", events(10), capacity=2)
+
+    assert [sequence for sequence, _ in await collect(stream)] == list(range(10))
+
+
+async def test_generation_is_cancelled_after_the_grace_period():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "message", "x"
+                await asyncio.sleep(0.001)
+        finally:
+            closed.set()
+
+    stream = ResumableStream("s", endless(), capacity=4, grace=0.01)
+    subscriber = stream.subscribe()
+    await subscriber.__anext__()
+    await subscriber.aclose()
+
+    await asyncio.wait_for(closed.wait(), 1)
+    await asyncio.sleep(0)
+    assert stream.done
+
+
+async def test_registry_forgets_finished_streams_after_the_ttl():
+    registry = StreamRegistry(ttl=0.01)
+    stream = registry.create(events(1))
+    await collect(stream)
+    assert registry.get(stream.id) is stream
+
+    await asyncio.sleep(0.02)
+
+    assert registry.get(stream.id) is None
+    assert len(registry) == 0
+
+
+async def test_stream_is_resumed_through_another_registry():
+    backend = MemoryReplayBackend()
+    gate = asyncio.Queue()
+    origin = StreamRegistry(grace=5, backend=backend)
+    other = StreamRegistry(grace=5, backend=backend)
+    stream = origin.create(events(4, gate))
+    first = stream.subscribe()
+    gate.put_nowait(None)
+    assert (await first.__anext__())[0] == 0
+    await first.aclose()
+
+    resumed = await other.resume(stream.id, 0)
+    assert other.get(stream.id) is None
+    reader = asyncio.create_task(collect(resumed, after=0))
+    for _ in range(3):
+        gate.put_nowait(None)
+
+    assert await asyncio.wait_for(reader, 1) == [(1, "e1"), (2, "e2"), (3, "e3")]
+    assert stream.done
+
+
+async def test_remote_resume_outside_the_buffer_is_a_gap():
+    backend = MemoryReplayBackend()
+    stream = StreamRegistry(capacity=2, backend=backend).create(events(5))
+    await collect(stream)
+    other = StreamRegistry(backend=backend)
+
+    await other.resume(stream.id, 2)
+    with pytest.raises(StreamGapError):
+        await other.resume(stream.id, 1)
+    with pytest.raises(StreamGapError):
+        await other.resume("missing", 0)
+    with pytest.raises(StreamGapError):
+        await StreamRegistry().resume(stream.id, 2)
+
+
+async def test_remote_client_keeps_the_generation_running_past_the_grace_period():
+    backend = MemoryReplayBackend()
+    gate = asyncio.Queue()
+    stream = StreamRegistry(grace=0.05, backend=backend).create(events(3, gate))
+    first = stream.subscribe()
+    gate.put_nowait(None)
+    await first.__anext__()
+    await first.aclose()
+
+    resumed = await StreamRegistry(grace=0.05, backend=backend).resume(stream.id, 0)
+    reader = asyncio.create_task(collect(resumed, after=0))
+    await asyncio.sleep(0.15)
+    gate.put_nowait(None)
+    gate.put_nowait(None)
+
+    assert await asyncio.wait_for(reader, 1) == [(1, "e1"), (2, "e2")]
+
+
+def test_resuming_an_unknown_stream_returns_410():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.routers import openai as openai_router
+
+    app = FastAPI()
+    app.include_router(openai_router.router, prefix="/openai")
+
+    response = TestClient(app).post(
+        "/openai/completions/stream",
+        json={"prompt": "hi", "stream": True},
+        headers={"Last-Event-ID": "missing:3"}
+    )
+
+    assert response.status_code == 410
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.utils.streaming import coalesce_chunks
+
+pytestmark = pytest.mark.anyio
+
+
+async def chunks(items, delay=0.0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+async def collect(stream):
+    return [frame async for frame in stream]
+
+
+async def test_first_chunk_is_sent_alone_and_the_rest_coalesced():
+    frames = await collect(coalesce_chunks(chunks(["a", "b", "c", "d"]), window=0.01))
+
+    assert frames[0] == "a"
+    assert "".join(frames) == "abcd"
+    assert len(frames) < 4
+
+
+async def test_zero_window_sends_every_chunk():
+    frames = await collect(coalesce_chunks(chunks(["a", "b", "c"]), window=0))
+
+    assert frames == ["a", "b", "c"]
+
+
+async def test_frames_flush_at_max_bytes():
+    frames = await collect(coalesce_chunks(chunks(["xx"] * 10), window=0.05, max_bytes=4))
+
+    assert "".join(frames) == "xx" * 10
+    assert all(len(frame) <= 4 for frame in frames[1:])
+
+
+async def test_chunks_further_apart_than_the_window_are_not_merged():
+    frames = await collect(coalesce_chunks(chunks(["a", "b", "c"], delay=0.03), window=0.001))
+
+    assert frames == ["a", "b", "c"]
+
+
+async def test_source_errors_are_raised_after_the_buffered_frames():
+    async def failing():
+        yield "a"
+        yield "b"
+        raise RuntimeError("upstream broke")
+
+    received = []
+    with pytest.raises(RuntimeError, match="upstream broke"):
+        async for frame in coalesce_chunks(failing(), window=0):
+            received.append(frame)
+    assert received == ["a", "b"]
+
+
+async def test_slow_consumer_pauses_the_source():
+    produced = 0
+
+    async def endless():
+        nonlocal produced
+        while True:
+            produced += 1
+            yield "x"
+
+    stream = coalesce_chunks(endless(), window=0, max_buffered=4)
+    await stream.__anext__()
+    await asyncio.sleep(0.01)
+
+    # The producer stops once the bounded buffer is full
+    assert produced <= 4 + 2
+    await stream.aclose()
+
+
+async def test_closing_the_stream_closes_the_source():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "x"
+                await asyncio.sleep(0)
+        finally:
+            closed.set()
+
+    stream = coalesce_chunks(endless(), window=0)
+    await stream.__anext__()
+    await stream.aclose()
+
+    assert closed.is_set()
+
+
+async def test_completion_events_end_with_done_or_error():
+    from app.routers.openai import completion_events
+
+    events = await collect(completion_events(chunks(["Hel", "lo"])))
+    assert events[-1] == ("done", "[DONE]")
+    assert all(event == "message" for event, _ in events[:-1])
+
+    async def failing():
+        yield "Hel"
+        raise RuntimeError("upstream broke")
+
+    events = await collect(completion_events(failing()))
+    assert events[0] == ("message", '{"content":"Hel"}')
+    assert events[-1] == ("error", '{"error":"upstream broke"}')
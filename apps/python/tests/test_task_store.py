@@ -0,0 +1,175 @@
+import pytest
+
+from app.services.task_store import (
+    COMPLETED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    InvalidTransitionError,
+    SQLiteTaskBackend,
+    TaskStore,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def finish(store, task_id, status=COMPLETED):
+    await store.update_status(task_id, RUNNING)
+    await store.update_status(task_id, status)
+
+
+def all_pages(store, **filters):
+    """Collect every page, checking that pages are in creation order and do not overlap."""
+    records, cursor = [], None
+    while True:
+        page, cursor = store.list_tasks(cursor=cursor, limit=3, **filters)
+        records.extend(page)
+        if cursor is None:
+            break
+        assert len(page) == 3
+    assert [record.seq for record in records] == sorted({record.seq for record in records})
+    return records
+
+
+async def test_create_and_get():
+    store = TaskStore()
+    record = await store.create("resize", {"width": 10}, task_id="t1")
+
+    assert store.get("t1") is record
+    assert record.status == QUEUED
+    assert record.to_dict()["data"] == {"width": 10}
+    assert store.get("missing") is None
+
+
+async def test_status_transitions_are_enforced():
+    store = TaskStore()
+    record = await store.create("resize", {})
+
+    await store.update_status(record.id, RUNNING)
+    await store.update_status(record.id, COMPLETED, result={"ok": True})
+
+    assert record.result == {"ok": True}
+    with pytest.raises(InvalidTransitionError):
+        await store.update_status(record.id, RUNNING)
+    with pytest.raises(KeyError):
+        await store.update_status("missing", RUNNING)
+
+
+async def test_listeners_see_every_status_change():
+    store = TaskStore()
+    seen = []
+
+    async def listener(record):
+        seen.append(record.status)
+
+    store.add_listener(listener)
+    record = await store.create("resize", {})
+    await finish(store, record.id)
+
+    assert seen == [QUEUED, RUNNING, COMPLETED]
+
+
+async def test_unfiltered_pages_follow_creation_order():
+    store = TaskStore()
+    created = [await store.create("resize", {}) for _ in range(10)]
+
+    assert all_pages(store) == created
+
+
+async def test_filtered_pages_walk_the_index_from_the_cursor():
+    store = TaskStore()
+    created = [await store.create("resize" if i % 2 else "email", {}) for i in range(20)]
+    for record in created[::3]:
+        await store.update_status(record.id, RUNNING)
+
+    running_resizes = [r for r in created if r.status == RUNNING and r.type == "resize"]
+    assert all_pages(store, status=RUNNING, task_type="resize") == running_resizes
+    assert all_pages(store, task_type="email") == [r for r in created if r.type == "email"]
+    assert all_pages(store, status=QUEUED) == [r for r in created if r.status == QUEUED]
+    assert store.list_tasks(status=FAILED) == ([], None)
+
+
+async def test_status_changes_keep_the_index_in_creation_order():
+    store = TaskStore()
+    created = [await store.create("resize", {}) for _ in range(6)]
+    # Tasks enter RUNNING out of creation order
+    for record in reversed(created[:4]):
+        await store.update_status(record.id, RUNNING)
+
+    page, cursor = store.list_tasks(status=RUNNING, limit=2)
+    assert page == created[:2]
+    page, cursor = store.list_tasks(status=RUNNING, cursor=cursor, limit=2)
+    assert page == created[2:4]
+    assert cursor is None
+
+
+async def test_count_by_status():
+    store = TaskStore()
+    created = [await store.create("resize", {}) for _ in range(3)]
+    await finish(store, created[0].id, FAILED)
+
+    assert store.count_by_status() == {QUEUED: 2, FAILED: 1}
+
+
+async def test_eviction_drops_tasks_in_the_order_they_finished():
+    store = TaskStore(max_records=4)
+    created = [await store.create("resize", {}) for _ in range(4)]
+    await finish(store, created[2].id)
+    await finish(store, created[0].id)
+
+    await store.create("resize", {})
+    assert store.get(created[2].id) is None
+    assert store.get(created[0].id) is not None
+
+    await store.create("resize", {})
+    assert store.get(created[0].id) is None
+    assert len(store) == 4
+
+
+async def test_eviction_keeps_unfinished_and_requeued_tasks():
+    store = TaskStore(max_records=2)
+    first = await store.create("resize", {})
+    await finish(store, first.id, FAILED)
+    await store.requeue(first.id)
+    second = await store.create("resize", {})
+
+    # Nothing is finished, so the store grows past its capacity rather than drop live tasks
+    third = await store.create("resize", {})
+    assert len(store) == 3
+
+    await finish(store, second.id)
+    await store.create("resize", {})
+    assert store.get(second.id) is None
+    assert store.get(first.id) is not None and store.get(third.id) is not None
+    assert store.count_by_status() == {QUEUED: 3}
+
+
+async def test_apply_update_creates_unknown_tasks_and_ignores_stale_updates():
+    store = TaskStore()
+    record = await store.apply_update("t1", RUNNING, task_type="resize", data={"a": 1})
+    assert record.status == RUNNING and store.list_tasks(status=RUNNING)[0] == [record]
+
+    await store.apply_update("t1", COMPLETED)
+    await store.apply_update("t1", RUNNING)
+    assert record.status == COMPLETED
+    assert await store.apply_update("t2", RUNNING) is None
+
+
+async def test_sqlite_backend_persists_records(tmp_path):
+    path = str(tmp_path / "tasks.db")
+    store = TaskStore(SQLiteTaskBackend(path))
+    first = await store.create("resize", {"width": 10})
+    await finish(store, first.id)
+    second = await store.create("email", {})
+    await store.close()
+
+    reloaded = TaskStore(SQLiteTaskBackend(path))
+    await reloaded.load()
+    try:
+        assert reloaded.get(first.id).status == COMPLETED
+        assert reloaded.get(first.id).data == {"width": 10}
+        assert all_pages(reloaded, task_type="email")[0].id == second.id
+        third = await reloaded.create("resize", {})
+        assert third.seq > second.seq
+    finally:
+        await reloaded.close()
@@ -0,0 +1,104 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import Settings, get_settings
+from app.routers import tasks
+from app.services.task_store import COMPLETED, FAILED, QUEUED, TaskStore
+
+
+class FakeRabbitMQService:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.published = []
+
+    def ensure_available(self):
+        pass
+
+    def task_routing_key(self, task_type, tenant=None):
+        return f"task.{tenant or 'default'}.{task_type}"
+
+    async def publish(self, routing_key, message_data, priority=None, tenant=None):
+        if self.fail:
+            raise RuntimeError("broker gone")
+        self.published.append((routing_key, message_data, priority, tenant))
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = TaskStore()
+    monkeypatch.setattr(tasks, "task_store", store)
+    return store
+
+
+def create_client(dispatch_mode: str, rabbitmq_service=None) -> TestClient:
+    app = FastAPI()
+    app.include_router(tasks.router, prefix="/tasks")
+    app.dependency_overrides[get_settings] = lambda: Settings(TASK_DISPATCH_MODE=dispatch_mode)
+    if rabbitmq_service is not None:
+        app.state.rabbitmq_service = rabbitmq_service
+    return TestClient(app)
+
+
+def test_in_process_mode_runs_the_handler(store):
+    client = create_client("inprocess")
+
+    response = client.post("/tasks/", json={"type": "echo", "data": {"n": 1}})
+
+    assert response.status_code == 202
+    task = client.get(f"/tasks/{response.json()['id']}").json()
+    assert task["status"] == COMPLETED
+    assert task["result"] == {"n": 1}
+
+
+def test_in_process_mode_fails_tasks_without_a_handler(store):
+    client = create_client("inprocess")
+
+    task_id = client.post("/tasks/", json={"type": "unknown"}).json()["id"]
+
+    assert store.get(task_id).status == FAILED
+    assert "No handler" in store.get(task_id).error
+
+
+def test_rabbitmq_mode_publishes_for_the_worker(store):
+    rabbitmq = FakeRabbitMQService()
+    client = create_client("rabbitmq", rabbitmq)
+
+    response = client.post("/tasks/", json={"type": "echo", "data": {"n": 1}, "priority": 5, "tenant": "acme"})
+
+    assert response.status_code == 202
+    task_id = response.json()["id"]
+    assert store.get(task_id).status == QUEUED
+    assert rabbitmq.published == [
+        ("task.acme.echo", {"id": task_id, "type": "echo", "data": {"n": 1}}, 5, "acme")
+    ]
+
+
+def test_rabbitmq_mode_fails_the_task_when_publishing_fails(store):
+    client = create_client("rabbitmq", FakeRabbitMQService(fail=True))
+
+    response = client.post("/tasks/", json={"type": "echo"})
+
+    assert response.status_code == 503
+    [record] = store.list_tasks()[0]
+    assert record.status == FAILED
+
+
+def test_rabbitmq_mode_without_a_broker_returns_503(store):
+    client = create_client("rabbitmq")
+
+    assert client.post("/tasks/", json={"type": "echo"}).status_code == 503
+    assert len(store) == 0
+
+
+def test_list_returns_the_next_cursor_in_a_header(store):
+    client = create_client("inprocess")
+    for _ in range(3):
+        client.post("/tasks/", json={"type": "echo"})
+
+    first = client.get("/tasks/", params={"limit": 2})
+    second = client.get("/tasks/", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+
+    assert len(first.json()) == 2
+    assert len(second.json()) == 1
+    assert "X-Next-Cursor" not in second.headers
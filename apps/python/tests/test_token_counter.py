@@ -0,0 +1,102 @@
+import pytest
+
+from app.services import token_counter
+from app.services.model_router import ModelRouter
+from app.services.openai_service import OpenAIService
+from app.services.token_counter import (
+    DEFAULT_CONTEXT_WINDOW,
+    TOKENS_PER_MESSAGE,
+    TOKENS_PER_REPLY,
+    ContextLengthError,
+    TokenCounter,
+    context_window,
+)
+
+
+@pytest.fixture(autouse=True)
+def estimated(monkeypatch):
+    """Count four characters per token, as without tiktoken's encoding files."""
+    monkeypatch.setattr(token_counter, "get_encoding", lambda model: None)
+
+
+@pytest.mark.parametrize("model, expected", [
+    ("gpt-4", 8192),
+    ("gpt-4-0613", 8192),
+    ("gpt-4-32k-0613", 32768),
+    ("gpt-4o-mini", 128000),
+    ("gpt-3.5-turbo", 16385),
+    ("gpt-3.5-turbo-instruct", 4096),
+    ("mock-model", DEFAULT_CONTEXT_WINDOW),
+])
+def test_context_window_uses_the_longest_matching_prefix(model, expected):
+    assert context_window(model) == expected
+
+
+def test_context_window_override():
+    assert context_window("gpt-4o", override=1000) == 1000
+
+
+def test_estimate_rounds_up():
+    counter = TokenCounter()
+    assert counter.count("", "gpt-4") == 0
+    assert counter.count("abcde", "gpt-4") == 2
+
+
+def test_messages_include_the_chat_format_overhead_and_cache_system_counts():
+    counter = TokenCounter(cache_size=8)
+    messages = [{"role": "system", "content": "x" * 40}, {"role": "user", "content": "y" * 8}]
+
+    assert counter.count_messages(messages, "gpt-4") == TOKENS_PER_REPLY + 2 * TOKENS_PER_MESSAGE + 10 + 2
+    counter.count_messages(messages, "gpt-4")
+    info = counter.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert TokenCounter(cache_size=0).cache_info() is None
+
+
+def test_truncate_keeps_the_start_of_the_text():
+    counter = TokenCounter()
+    assert counter.truncate("abcdefghij", 2, "gpt-4") == "abcdefgh"
+    assert counter.truncate("abc", 0, "gpt-4") == ""
+
+
+def create_service(window: int, truncate: bool) -> OpenAIService:
+    service = OpenAIService()
+    service.router = ModelRouter("gpt-4", context_window_override=window)
+    service.truncate_overflow = truncate
+    return service
+
+
+def test_request_that_fits_is_sent_unchanged():
+    service = create_service(window=100, truncate=False)
+    messages = [{"role": "user", "content": "x" * 40}]
+
+    assert service._fit_context(messages, max_tokens=50, model=None) == (messages, 16)
+
+
+def test_oversized_request_is_rejected():
+    service = create_service(window=100, truncate=False)
+    messages = [{"role": "user", "content": "x" * 400}]
+
+    with pytest.raises(ContextLengthError) as error:
+        service._fit_context(messages, max_tokens=50)
+    assert (error.value.prompt_tokens, error.value.context_window) == (106, 100)
+
+
+def test_oversized_prompt_is_truncated_but_not_the_system_message():
+    service = create_service(window=100, truncate=True)
+    system = {"role": "system", "content": "s" * 80}
+    messages = [system, {"role": "user", "content": "x" * 400}]
+
+    fitted, prompt_tokens = service._fit_context(messages, max_tokens=50)
+
+    assert fitted[0] == system
+    assert prompt_tokens == 50
+    assert fitted[1]["content"] == "x" * 84
+
+
+def test_prompt_is_not_truncated_when_nothing_would_be_left():
+    service = create_service(window=100, truncate=True)
+    messages = [{"role": "system", "content": "s" * 400}, {"role": "user", "content": "hello"}]
+
+    with pytest.raises(ContextLengthError):
+        service._fit_context(messages, max_tokens=50)